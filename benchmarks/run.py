@@ -0,0 +1,432 @@
+"""Benchmark passenv at scale
+
+Builds synthetic stores in a temporary directory, puts stub gpg and pass
+commands on PATH and records wall-clock time and peak memory for the
+in-process building blocks and for the CLI commands.
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+STUBS_DIR = BENCH_DIR / "stubs"
+
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from synthetic import entry_content, entry_variables, make_store, tree_output  # noqa: E402
+
+from passenv import __version__  # noqa: E402
+from passenv.backends import PassShowBackend  # noqa: E402
+from passenv.completion import complete_pass_entries  # noqa: E402
+from passenv.exporters import Exporter, ExportFormat  # noqa: E402
+from passenv.index import EntryIndex  # noqa: E402
+from passenv.interpolate import expand  # noqa: E402
+from passenv.parser import EnvParser, ParseError  # noqa: E402
+from passenv.store import iter_store_entries  # noqa: E402
+
+STORE_SIZES = [1_000, 10_000, 100_000]
+VARIABLE_COUNTS = [10, 100, 1_000, 10_000]
+QUICK_STORE_SIZES = [1_000]
+QUICK_VARIABLE_COUNTS = [10, 1_000]
+PARSE_LINE_COUNTS = [1_000, 10_000, 100_000]
+QUICK_PARSE_LINE_COUNTS = [1_000, 10_000]
+
+
+# Runs the CLI commands for the harness and reports how each went. A child's ru_maxrss
+# counts the memory of the process it was spawned from, so they are not spawned from
+# the harness, which grows to hold the stores and benchmark data
+LAUNCHER = """
+import json, os, subprocess, sys, time
+for line in sys.stdin:
+    request = json.loads(line)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        request["argv"], env=request["env"], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    errors = process.stderr.read().decode()
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    response = {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "errors": errors,
+        "wall_s": elapsed,
+        "peak_kb": rss,
+    }
+    print(json.dumps(response), flush=True)
+"""
+
+
+class Launcher:
+    """A small process that starts the CLI commands, before the harness grows"""
+
+    def __init__(self) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", LAUNCHER],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+
+    def run(self, argv: List[str], env: Dict[str, str]) -> Dict[str, Any]:
+        assert self.process.stdin is not None and self.process.stdout is not None
+        self.process.stdin.write(json.dumps({"argv": argv, "env": env}) + "\n")
+        self.process.stdin.flush()
+        response: Dict[str, Any] = json.loads(self.process.stdout.readline())
+        return response
+
+    def close(self) -> None:
+        assert self.process.stdin is not None
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class Suite:
+    def __init__(self, repeat: int, launcher: Optional[Launcher] = None) -> None:
+        self.repeat = repeat
+        self.launcher = launcher
+        self.results: List[Dict[str, Any]] = []
+
+    def record(self, name: str, params: Dict[str, Any], result: Dict[str, Any]) -> None:
+        result = {"name": name, "params": params, **result}
+        self.results.append(result)
+        label = " ".join(f"{key}={value}" for key, value in params.items())
+        print(
+            f"{name:<24} {label:<28} {result['wall_s'] * 1000:>10.2f} ms"
+            f" {result['peak_kb']:>10} KiB",
+            file=sys.stderr,
+        )
+
+    def run(self, name: str, params: Dict[str, Any], fn: Callable[[], Any]) -> None:
+        """Time fn in process; peak memory comes from a separate traced run"""
+        fn()
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.record(
+            name,
+            params,
+            {"wall_s": statistics.median(times), "min_s": min(times), "peak_kb": peak // 1024},
+        )
+
+    def run_command(
+        self, name: str, params: Dict[str, Any], argv: List[str], env: Dict[str, str]
+    ) -> None:
+        """Time a passenv CLI invocation; peak memory is the child's max RSS"""
+        assert self.launcher is not None, "CLI benchmarks need a Launcher"
+        command = [sys.executable, "-m", "passenv.cli", *argv]
+        times = []
+        peak_kb = 0
+        for _ in range(self.repeat + 1):
+            response = self.launcher.run(command, env)
+            if response["returncode"] != 0:
+                raise RuntimeError(f"{' '.join(argv)} failed: {response['errors']}")
+            times.append(response["wall_s"])
+            peak_kb = max(peak_kb, response["peak_kb"])
+
+        # The first run warms the page cache and writes bytecode
+        times = times[1:]
+        self.record(
+            name,
+            params,
+            {"wall_s": statistics.median(times), "min_s": min(times), "peak_kb": peak_kb},
+        )
+
+
+def bench_listing(suite: Suite, workdir: str, sizes: List[int]) -> None:
+    backend = PassShowBackend()
+    for size in sizes:
+        root = os.path.join(workdir, f"store-{size}")
+        paths = make_store(root, size)
+        tree = tree_output(paths)
+        params = {"entries": size}
+
+        suite.run("parse_pass_list", params, lambda: backend._parse_pass_list(tree))
+        suite.run("list_store", params, lambda: sorted(iter_store_entries(root)))
+        suite.run("index_build", params, lambda: EntryIndex.build(root))
+
+        os.environ["PASSWORD_STORE_DIR"] = root
+        prefix = paths[len(paths) // 2][:-2]
+        suite.run("complete", params, lambda: complete_pass_entries(prefix))
+        suite.run("complete_root", params, lambda: complete_pass_entries(""))
+        index = EntryIndex.load(root)
+        suite.run("complete_full_root", params, lambda: index.prefix(""))
+        suite.run("complete_fuzzy", params, lambda: index.fuzzy(prefix.replace("/", "")))
+
+
+def bench_entries(suite: Suite, counts: List[int]) -> None:
+    parser = EnvParser()
+    exporter = Exporter()
+    for count in counts:
+        content = entry_content(count)
+        variables = entry_variables(count)
+        params = {"variables": count}
+
+        suite.run("parse", params, lambda: parser.parse(content))
+        for format in ExportFormat:
+            suite.run(f"export_{format.value}", params, lambda: exporter.export(variables, format))
+            # Streamed, as export --output does: memory no longer grows with the document
+            with open(os.devnull, "wb") as devnull:
+                suite.run(
+                    f"export_to_{format.value}",
+                    params,
+                    lambda: exporter.export_to(variables, format, devnull),
+                )
+
+        # What the YAML and JSON exports cost with the pure Python dumper and the stdlib
+        # encoder, to compare export_yaml and export_json against
+        suite.run(
+            "yaml_dump_python",
+            params,
+            lambda: yaml.dump(
+                variables, Dumper=yaml.Dumper, default_flow_style=False, allow_unicode=True
+            ),
+        )
+        suite.run(
+            "json_dumps_stdlib",
+            params,
+            lambda: json.dumps(variables, indent=2, ensure_ascii=False),
+        )
+
+
+def bench_parser(suite: Suite, line_counts: List[int]) -> None:
+    parser = EnvParser()
+
+    def parse_all_errors(content: str) -> None:
+        try:
+            parser.parse(content)
+        except ParseError as e:
+            assert e.errors
+
+    for lines in line_counts:
+        # entry_content adds a comment every ten variables
+        content = entry_content(lines * 10 // 11)
+        params = {"lines": lines}
+        suite.run("parse_lines", params, lambda: parser.parse(content))
+        suite.run("iter_parse_lines", params, lambda: sum(1 for _ in parser.iter_parse(content)))
+
+        # One invalid line in a hundred, all of them reported
+        broken = "\n".join(
+            "broken line" if i % 100 == 99 else line for i, line in enumerate(content.split("\n"))
+        )
+        suite.run("parse_lines_errors", params, lambda: parse_all_errors(broken))
+
+
+def bench_interpolate(suite: Suite, counts: List[int]) -> None:
+    for count in counts:
+        params = {"variables": count}
+        # Each value references the next one, the deepest chain there can be
+        chain = {f"VAR_{i}": f"${{VAR_{i + 1}:-end}}" for i in range(count)}
+        suite.run("expand_chain", params, lambda: expand(chain, {}))
+        # Half the values reference the other half
+        fanout = {
+            f"VAR_{i}": f"${{VAR_{i - 1}}}-${{HOST:-x}}" if i % 2 else "v" for i in range(count)
+        }
+        suite.run("expand_fanout", params, lambda: expand(fanout, {}))
+
+
+def bench_cli(suite: Suite, workdir: str, sizes: List[int], counts: List[int]) -> None:
+    root = os.path.join(workdir, "cli-store")
+    make_store(root, 8)
+    for count in counts:
+        path = os.path.join(root, "vars", f"{count}.gpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(entry_content(count))
+
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(SRC_DIR),
+        PASSWORD_STORE_DIR=root,
+        XDG_CACHE_HOME=os.path.join(workdir, "cache"),
+        XDG_RUNTIME_DIR=os.path.join(workdir, "run"),
+    )
+    for key in [key for key in env if key.startswith("PASSENV_")]:
+        del env[key]
+
+    for count in counts:
+        entry = f"vars/{count}"
+        params = {"variables": count}
+        suite.run_command("cli_load", params, ["load", entry], env)
+        suite.run_command(
+            "cli_load_pass", params, ["load", entry], dict(env, PASSENV_BACKEND="pass")
+        )
+        for format in ExportFormat:
+            suite.run_command(
+                f"cli_export_{format.value}", params, ["export", entry, "-f", format.value], env
+            )
+
+    multi = [f"svc0000/entry{i:03d}" for i in range(8)]
+    suite.run_command("cli_load_multi", {"entries": len(multi)}, ["load", *multi], env)
+    suite.run_command("cli_status", {}, ["status"], env)
+
+    for size in sizes:
+        store_env = dict(env, PASSWORD_STORE_DIR=os.path.join(workdir, f"store-{size}"))
+        suite.run_command("cli_list", {"entries": size}, ["list"], store_env)
+
+
+HOOK_SCRIPT = """
+eval "$(command passenv hook bash)"
+measure() {
+    local start=$EPOCHREALTIME i
+    for ((i = 0; i < $1; i++)); do _passenv_hook; done
+    echo $(( (${EPOCHREALTIME/./} - ${start/./}) ))
+}
+cd "$OUTSIDE"; _passenv_hook; measure "$CALLS"
+cd "$PROJECT"; _passenv_hook
+[ -n "$PASSENV_SESSION" ] || { echo "the hook did not load the project entry" >&2; exit 1; }
+measure "$CALLS"
+"""
+
+
+def bench_hook(suite: Suite, workdir: str, calls: int = 1000) -> None:
+    """Time the prompt hook when nothing changed, per prompt"""
+    bash = shutil.which("bash")
+    if bash is None:
+        print("bash not found, skipping the hook benchmarks", file=sys.stderr)
+        return
+
+    root = os.path.join(workdir, "hook-store")
+    make_store(root, 8)
+    project = os.path.join(workdir, "hook-project", "src", "deep", "module")
+    os.makedirs(project)
+    with open(os.path.join(workdir, "hook-project", ".passenv"), "w") as f:
+        f.write("svc0000/entry000\n")
+
+    # The hook calls `passenv`, which is not necessarily installed
+    bin_dir = os.path.join(workdir, "hook-bin")
+    os.makedirs(bin_dir)
+    with open(os.path.join(bin_dir, "passenv"), "w") as f:
+        f.write(f'#!/bin/sh\nexec {sys.executable} -m passenv.cli "$@"\n')
+    os.chmod(os.path.join(bin_dir, "passenv"), 0o755)
+
+    env = dict(
+        os.environ,
+        PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+        PYTHONPATH=str(SRC_DIR),
+        PASSWORD_STORE_DIR=root,
+        XDG_RUNTIME_DIR=os.path.join(workdir, "run"),
+        PROJECT=project,
+        OUTSIDE=workdir,
+        CALLS=str(calls),
+    )
+    result = subprocess.run(
+        [bash, "-c", HOOK_SCRIPT], env=env, capture_output=True, text=True, check=True
+    )
+    outside_us, unchanged_us = (int(line) for line in result.stdout.split())
+    for case, total_us in (("no_marker", outside_us), ("unchanged", unchanged_us)):
+        per_call = total_us / calls / 1_000_000
+        suite.record(
+            "hook_prompt",
+            {"shell": "bash", "case": case},
+            {"wall_s": per_call, "min_s": per_call, "peak_kb": 0},
+        )
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> bool:
+    """Print the time ratio against a baseline; False when something regressed"""
+    with open(baseline_path) as f:
+        baseline = {
+            (r["name"], json.dumps(r["params"], sort_keys=True)): r
+            for r in json.load(f)["results"]
+        }
+
+    ok = True
+    print(f"\n{'benchmark':<52} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    for result in results:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        if key not in baseline:
+            continue
+        before, after = baseline[key]["wall_s"], result["wall_s"]
+        ratio = after / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        ok = ok and not flag
+        label = f"{result['name']} {' '.join(f'{k}={v}' for k, v in result['params'].items())}"
+        print(
+            f"{label:<52} {before * 1000:>8.2f}ms {after * 1000:>8.2f}ms {ratio:>7.2f}{flag}",
+            file=sys.stderr,
+        )
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Compare against a previous JSON result file")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--quick", action="store_true", help="Only run the smaller sizes")
+    parser.add_argument("--skip-cli", action="store_true", help="Skip the CLI benchmarks")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_STORE_SIZES if args.quick else STORE_SIZES
+    counts = QUICK_VARIABLE_COUNTS if args.quick else VARIABLE_COUNTS
+    line_counts = QUICK_PARSE_LINE_COUNTS if args.quick else PARSE_LINE_COUNTS
+    # Started first, while the harness is still small
+    launcher = None if args.skip_cli else Launcher()
+    suite = Suite(args.repeat, launcher)
+
+    # The stubs stand in for gpg and pass both in process and in the CLI runs
+    os.environ["PATH"] = f"{STUBS_DIR}{os.pathsep}{os.environ.get('PATH', '')}"
+
+    with tempfile.TemporaryDirectory(prefix="passenv-bench-") as workdir:
+        os.environ["XDG_CACHE_HOME"] = os.path.join(workdir, "cache")
+        bench_listing(suite, workdir, sizes)
+        bench_entries(suite, counts)
+        bench_parser(suite, line_counts)
+        bench_interpolate(suite, line_counts)
+        if not args.skip_cli:
+            bench_cli(suite, workdir, sizes, counts)
+            bench_hook(suite, workdir)
+    if launcher is not None:
+        launcher.close()
+
+    report = {
+        "passenv": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "repeat": args.repeat,
+        "results": suite.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare and not compare(suite.results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
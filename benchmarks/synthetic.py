@@ -0,0 +1,61 @@
+"""Synthetic password stores and entries for the benchmarks"""
+
+import os
+from typing import Dict, List
+
+# Entries per directory, so large stores also get a realistic number of directories
+FANOUT = 100
+
+
+def entry_content(variables: int, value_size: int = 32) -> str:
+    """Return an entry with the given number of KEY=VALUE lines and a few comments"""
+    lines = []
+    for i in range(variables):
+        if i % 10 == 0:
+            lines.append(f"# section {i // 10}")
+        lines.append(f"VAR_{i:05d}={'x' * (value_size - 6)}{i:06d}")
+    return "\n".join(lines) + "\n"
+
+
+def entry_variables(variables: int, value_size: int = 32) -> Dict[str, str]:
+    """Return the parsed form of entry_content"""
+    return {f"VAR_{i:05d}": f"{'x' * (value_size - 6)}{i:06d}" for i in range(variables)}
+
+
+def entry_paths(entries: int) -> List[str]:
+    return [f"svc{i // FANOUT:04d}/entry{i % FANOUT:03d}" for i in range(entries)]
+
+
+def make_store(root: str, entries: int, variables: int = 10) -> List[str]:
+    """Create a store of plain text *.gpg files, readable through the stub gpg and pass"""
+    paths = entry_paths(entries)
+    content = entry_content(variables)
+    for path in paths:
+        file = os.path.join(root, path + ".gpg")
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "w") as f:
+            f.write(content)
+    with open(os.path.join(root, ".gpg-id"), "w") as f:
+        f.write("bench@example.com\n")
+    return paths
+
+
+def tree_output(paths: List[str]) -> str:
+    """Render paths the way `pass ls` (tree) does"""
+    tree: dict = {}
+    for path in paths:
+        node = tree
+        for part in path.split("/"):
+            node = node.setdefault(part, {})
+
+    lines = ["Password Store"]
+
+    def render(node: dict, indent: str) -> None:
+        names = sorted(node)
+        for i, name in enumerate(names):
+            last = i == len(names) - 1
+            lines.append(f"{indent}{'└── ' if last else '├── '}{name}")
+            render(node[name], indent + ("    " if last else "│   "))
+
+    render(tree, "")
+    return "\n".join(lines) + "\n"
@@ -1 +1,25 @@
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .api import SecretProvider, get, inject
+    from .async_client import AsyncPassClient
+
 __version__ = "0.3.0"
+__all__ = ["AsyncPassClient", "SecretProvider", "get", "inject"]
+
+# The library API pulls in the core, which the shell hooks' fast path imports only
+# when it needs it, so it is loaded on first use rather than with the package
+_API = {
+    "AsyncPassClient": "async_client",
+    "SecretProvider": "api",
+    "get": "api",
+    "inject": "api",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _API:
+        import importlib
+
+        return getattr(importlib.import_module(f".{_API[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
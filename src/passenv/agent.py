@@ -0,0 +1,319 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from . import timings
+
+if TYPE_CHECKING:
+    from .pass_client import PassClient
+
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_ENTRIES = 256
+
+# Seconds a client waits on the agent before falling back to decrypting itself
+CLIENT_TIMEOUT = 30.0
+
+
+def runtime_dir() -> str:
+    """Return the per-user passenv runtime directory under $XDG_RUNTIME_DIR"""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        return os.path.join(base, "passenv")
+
+    import tempfile
+
+    return os.path.join(tempfile.gettempdir(), f"passenv-{os.getuid()}")
+
+
+def ensure_private_dir(path: str) -> str:
+    """Create path for our use alone, refusing one another user could have prepared
+
+    The fallback runtime directory lives in the shared temporary directory, where
+    anyone could have created it, or a symlink by its name, before we did.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not _is_private(path):
+        raise RuntimeError(
+            f"Refusing to use {path}: it must be a directory owned by you with mode 700"
+        )
+    return path
+
+
+def _is_private(path: str, is_type: Callable[[int], bool] = stat.S_ISDIR) -> bool:
+    """Whether path, itself and not what it links to, is ours and closed to others"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return is_type(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def _store_root() -> str:
+    """The store this process reads, as agents and clients compare it"""
+    from .store import store_dir
+
+    return os.path.realpath(store_dir())
+
+
+def socket_path() -> str:
+    """Return the path of the agent's Unix socket"""
+    return os.path.join(runtime_dir(), "agent.sock")
+
+
+def _entry_stamp(path: str) -> Optional[Tuple[int, int]]:
+    from .store import entry_file, store_dir
+
+    try:
+        stat = os.stat(entry_file(store_dir(), path))
+    except (OSError, RuntimeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _wipe(buffer: bytearray) -> None:
+    buffer[:] = bytes(len(buffer))
+
+
+def lock_memory() -> bool:
+    """Keep decrypted secrets out of swap and core dumps where the platform allows it"""
+    try:
+        import ctypes
+        import resource
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        if hasattr(libc, "prctl"):
+            # PR_SET_DUMPABLE: no core dumps, no ptrace from other processes of the user
+            libc.prctl(4, 0, 0, 0, 0)
+
+        # With MCL_FUTURE every later allocation must fit under RLIMIT_MEMLOCK, so only
+        # lock when the limit cannot make the agent run out of memory
+        soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        if soft != resource.RLIM_INFINITY:
+            return False
+        mcl_current, mcl_future = 1, 2
+        return bool(libc.mlockall(mcl_current | mcl_future) == 0)
+    except (ImportError, OSError, AttributeError):
+        return False
+
+
+class EntryCache:
+    """LRU cache of decrypted entries that expire after a fixed time to live
+
+    Contents are held in bytearrays so they can be overwritten in place when
+    an entry expires, is evicted or the cache is cleared.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, bytearray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stamp: Any = None) -> Optional[str]:
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is None:
+                return None
+            expires_at, cached_stamp, buffer = cached
+            if expires_at <= time.monotonic() or cached_stamp != stamp:
+                del self._entries[path]
+                _wipe(buffer)
+                return None
+            self._entries.move_to_end(path)
+            return buffer.decode()
+
+    def put(self, path: str, content: str, stamp: Any = None) -> None:
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                _wipe(previous[2])
+            expires_at = time.monotonic() + self.ttl
+            self._entries[path] = (expires_at, stamp, bytearray(content.encode()))
+            while len(self._entries) > self.max_entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                _wipe(evicted)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [path for path, cached in self._entries.items() if cached[0] <= now]
+            for path in expired:
+                _wipe(self._entries.pop(path)[2])
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, _, buffer in self._entries.values():
+                _wipe(buffer)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Agent:
+    """Serve decrypted pass entries from memory over a per-user Unix socket"""
+
+    def __init__(
+        self,
+        client: "PassClient",
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        path: Optional[str] = None,
+    ) -> None:
+        self.client = client
+        self.cache = EntryCache(ttl, max_entries)
+        self.path = path or socket_path()
+        self.store = _store_root()
+        self._stopped = threading.Event()
+        self._server: Any = None
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        store = request.get("store")
+        if op in ("get", "list") and store is not None and store != self.store:
+            # The client falls back to decrypting from its own store
+            return {"ok": False, "other_store": True, "error": f"Agent serves {self.store}"}
+        try:
+            if op == "get":
+                return {"ok": True, "content": self._get(request["path"])}
+            if op == "list":
+                return {"ok": True, "entries": self.client.list_entries()}
+            if op == "ping":
+                return {"ok": True, "entries": len(self.cache)}
+            if op == "clear":
+                self.cache.clear()
+                return {"ok": True}
+            if op == "stop":
+                self.shutdown()
+                return {"ok": True}
+            return {"ok": False, "error": f"Unknown agent request: {op}"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _get(self, path: str) -> str:
+        stamp = _entry_stamp(path)
+        content = self.cache.get(path, stamp)
+        if content is None:
+            content = self.client.get_entry(path)
+            self.cache.put(path, content, stamp)
+        return content
+
+    def serve_forever(self) -> None:
+        import json
+        import socketserver
+
+        agent = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    response = agent.handle(json.loads(line))
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+
+        ensure_private_dir(os.path.dirname(self.path))
+        if os.path.exists(self.path):
+            if AgentClient(self.path).request({"op": "ping"}) is not None:
+                raise RuntimeError(f"An agent is already listening on {self.path}")
+            os.unlink(self.path)
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon_threads = True
+
+        sweeper = threading.Thread(target=self._sweep, daemon=True)
+        sweeper.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+            self.cache.clear()
+            self._server.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _sweep(self) -> None:
+        interval = max(1.0, min(self.cache.ttl / 4, 60.0))
+        while not self._stopped.wait(interval):
+            self.cache.purge_expired()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        if self._server is not None:
+            # serve_forever must be stopped from outside the thread handling the request
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+class AgentClient:
+    """Talk to a running agent, returning None whenever it cannot be reached or
+    serves another password store than this process reads
+
+    json and socket are only imported once there is an agent to talk to, so the
+    common case of no agent adds nothing to CLI startup.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: float = CLIENT_TIMEOUT) -> None:
+        self.path = path or socket_path()
+        self.timeout = timeout
+        self.store = _store_root()
+
+    @classmethod
+    def find(cls) -> Optional["AgentClient"]:
+        """Return a client when an agent socket exists and the agent is not disabled"""
+        if os.environ.get("PASSENV_AGENT") == "0":
+            return None
+        path = socket_path()
+        return cls(path) if _trusted_socket(path) else None
+
+    def request(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with timings.phase(f"agent {message.get('op')}"):
+            return self._request(message)
+
+    def _request(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        import json
+        import socket
+
+        if not _trusted_socket(self.path):
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(json.dumps(message).encode() + b"\n")
+                with sock.makefile("rb") as reader:
+                    line = reader.readline()
+        except OSError:
+            return None
+        if not line:
+            return None
+        response: Dict[str, Any] = json.loads(line)
+        return response
+
+    def _call(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        response = self.request(message)
+        if response is not None and response.get("other_store"):
+            return None
+        if response is not None and not response.get("ok"):
+            raise RuntimeError(response.get("error", "Agent request failed"))
+        return response
+
+    def get_entry(self, path: str) -> Optional[str]:
+        response = self._call({"op": "get", "path": path, "store": self.store})
+        return None if response is None else str(response["content"])
+
+    def list_entries(self) -> Optional[List[str]]:
+        response = self._call({"op": "list", "store": self.store})
+        return None if response is None else list(response["entries"])
+
+
+def _trusted_socket(path: str) -> bool:
+    """Whether path is a socket of ours, in a directory no one else can replace it in"""
+    return _is_private(os.path.dirname(path)) and _is_private(path, stat.S_ISSOCK)
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, MutableMapping, Optional
+
+from .agent import DEFAULT_MAX_ENTRIES, DEFAULT_TTL
+from .core import PassEnv, _contents
+from .pass_client import PassClient
+
+# Called with the entry path, its previous variables and its new ones
+ChangeCallback = Callable[[str, Mapping[str, str], Mapping[str, str]], None]
+
+
+def get(*pass_paths: str, pass_client: Optional[PassClient] = None) -> Dict[str, str]:
+    """Return the merged variables of pass entries, as `passenv export` would"""
+    return PassEnv(pass_client).get_variables(*pass_paths)
+
+
+def inject(
+    *pass_paths: str,
+    environ: Optional[MutableMapping[str, str]] = None,
+    pass_client: Optional[PassClient] = None,
+) -> Dict[str, str]:
+    """Set the entries' variables in environ, os.environ by default, and return them"""
+    variables = get(*pass_paths, pass_client=pass_client)
+    (os.environ if environ is None else environ).update(variables)
+    return variables
+
+
+class _Entry:
+    """Variables of one entry as last decrypted; replaced whole, never modified"""
+
+    __slots__ = ("variables", "fingerprint", "includes", "ttl", "expires_at", "last_used")
+
+    def __init__(
+        self, variables: Mapping[str, str], fingerprint: str, includes: List[str], ttl: float
+    ) -> None:
+        self.variables = variables
+        self.fingerprint = fingerprint
+        self.includes = includes
+        self.ttl = ttl
+        self.expires_at = time.monotonic() + ttl
+        self.last_used = time.monotonic()
+
+
+class SecretProvider:
+    """Keep the variables of pass entries in memory for a long-running process
+
+    An entry is decrypted on first use and kept for its time to live. After that its
+    encrypted files, the entry's and those it includes, are compared with the ones it
+    was decrypted from and it is only decrypted again when they changed, calling the
+    on_change callbacks. With start() a background thread does this ahead of expiry,
+    so get() finds fresh entries. get() takes no lock unless it has to decrypt, and
+    the least recently used entry is dropped beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        pass_client: Optional[PassClient] = None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        refresh_interval: Optional[float] = None,
+    ) -> None:
+        self.passenv = PassEnv(pass_client)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval or max(1.0, min(ttl / 4, 60.0))
+        self._entries: Dict[str, _Entry] = {}
+        self._callbacks: List[ChangeCallback] = []
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, pass_path: str, ttl: Optional[float] = None) -> Mapping[str, str]:
+        """Return the entry's variables, read-only; ttl overrides the provider's for it"""
+        entry = self._entries.get(pass_path)
+        now = time.monotonic()
+        if entry is None or entry.expires_at <= now or (ttl is not None and ttl != entry.ttl):
+            entry = self._refresh(pass_path, ttl)
+        entry.last_used = now
+        return entry.variables
+
+    def __getitem__(self, pass_path: str) -> Mapping[str, str]:
+        return self.get(pass_path)
+
+    def on_change(self, callback: ChangeCallback) -> ChangeCallback:
+        """Call callback whenever an entry is decrypted again with different variables"""
+        self._callbacks.append(callback)
+        return callback
+
+    def refresh(self) -> List[str]:
+        """Check the entries that expire before the next refresh, returning the changed ones"""
+        deadline = time.monotonic() + self.refresh_interval
+        changed = []
+        for pass_path, entry in list(self._entries.items()):
+            if entry.expires_at > deadline:
+                continue
+            try:
+                self._refresh(pass_path, None, force=True)
+            except Exception:
+                # Keep serving what was decrypted last and try again next time; a
+                # failing callback does not keep the other entries from refreshing
+                pass
+            current = self._entries.get(pass_path)
+            if current is not None and current.variables is not entry.variables:
+                changed.append(pass_path)
+        return changed
+
+    def invalidate(self, pass_path: Optional[str] = None) -> None:
+        """Forget one entry, or all of them, so they are decrypted again on next use"""
+        with self._lock:
+            if pass_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(pass_path, None)
+
+    def _refresh(self, pass_path: str, ttl: Optional[float], force: bool = False) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(pass_path)
+            if ttl is None:
+                ttl = self.ttl if entry is None else entry.ttl
+            # Another thread may have refreshed it while this one waited for the lock
+            if (
+                not force
+                and entry is not None
+                and entry.expires_at > time.monotonic()
+                and entry.ttl == ttl
+            ):
+                return entry
+
+            if entry is not None:
+                fingerprint = self.passenv.fingerprint(pass_path, *entry.includes)
+                if _unchanged(entry.fingerprint, fingerprint):
+                    renewed = _Entry(entry.variables, fingerprint, entry.includes, ttl)
+                    renewed.last_used = entry.last_used
+                    self._entries[pass_path] = renewed
+                    return renewed
+
+            # Stat before decrypting, so a change made meanwhile is seen next time
+            fingerprint = self.passenv.fingerprint(pass_path)
+            variables = MappingProxyType(self.passenv.get_variables(pass_path))
+            includes = self.passenv.includes[pass_path]
+            if includes:
+                fingerprint = f"{fingerprint},{self.passenv.fingerprint(*includes)}"
+            new_entry = _Entry(variables, fingerprint, includes, ttl)
+            self._entries[pass_path] = new_entry
+            self._evict()
+
+        if entry is not None and entry.variables != variables:
+            for callback in list(self._callbacks):
+                callback(pass_path, entry.variables, variables)
+        return new_entry
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda path: self._entries[path].last_used)
+            del self._entries[oldest]
+
+    def start(self) -> "SecretProvider":
+        """Refresh entries in a background thread until stop()"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="passenv-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def __enter__(self) -> "SecretProvider":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def _unchanged(recorded: str, current: str) -> bool:
+    """Whether two fingerprints describe the same, known, file contents"""
+    if "-" in recorded.split(",") or "-" in current.split(","):
+        return False
+    return _contents(recorded) == _contents(current)
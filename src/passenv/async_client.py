@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from . import timings
+from .agent import AgentClient
+from .backends import (
+    BACKEND_ENV,
+    MAX_WORKERS,
+    Backend,
+    CommandBackend,
+    PassShowBackend,
+    get_backend,
+)
+
+
+class AsyncPassClient:
+    """PassClient for asyncio programs, decrypting entries in child processes
+
+    gpg and pass run through asyncio.create_subprocess_exec, at most concurrency of
+    them at a time, and their results are mapped to the same errors as PassClient's.
+    A process that outlives timeout, or whose task is cancelled, is killed. Backends
+    that run no command, and a running `passenv agent`, are used from a thread. A
+    client belongs to the event loop it is first used in.
+    """
+
+    def __init__(
+        self,
+        use_agent: bool = True,
+        backend: Optional[Backend] = None,
+        concurrency: int = MAX_WORKERS,
+        timeout: Optional[float] = None,
+    ) -> None:
+        explicit = backend is not None or os.environ.get(BACKEND_ENV, "auto") != "auto"
+        self.agent = AgentClient.find() if use_agent and not explicit else None
+        self.backend = backend or get_backend()
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_entry(self, path: str) -> str:
+        if self.agent is not None:
+            content = await asyncio.to_thread(self.agent.get_entry, path)
+            if content is not None:
+                return content
+
+        async with self._semaphore:
+            if not isinstance(self.backend, CommandBackend):
+                return await asyncio.to_thread(self.backend.get_entry, path)
+            backend = self.backend
+            returncode, stdout, stderr = await self._run(backend.command(path))
+            return backend.check_result(path, returncode, stdout, stderr)
+
+    async def get_many(self, paths: Sequence[str]) -> List[str]:
+        """Fetch entries concurrently, returning their contents in order
+
+        When one fails the others are cancelled, killing their processes, and its
+        error is raised.
+        """
+        tasks = [asyncio.ensure_future(self.get_entry(path)) for path in paths]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def list_entries(self) -> List[str]:
+        if self.agent is not None:
+            entries = await asyncio.to_thread(self.agent.list_entries)
+            if entries is not None:
+                return entries
+
+        backend = self.backend
+        if isinstance(backend, PassShowBackend) and not os.path.isdir(backend.root):
+            returncode, stdout, stderr = await self._run(backend.LIST_COMMAND)
+            return backend.check_list_result(returncode, stdout, stderr)
+        return await asyncio.to_thread(backend.list_entries)
+
+    async def _run(self, argv: List[str]) -> Tuple[int, str, str]:
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            await _kill(process)
+            raise RuntimeError(f"Pass command timed out after {self.timeout}s")
+        except BaseException:
+            # Cancelled: the child must not go on decrypting on its own
+            await _kill(process)
+            raise
+        finally:
+            timings.record_subprocess(argv, process.returncode, start)
+
+        assert process.returncode is not None
+        return process.returncode, stdout.decode(), stderr.decode()
+
+
+async def _kill(process: "asyncio.subprocess.Process") -> None:
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        # Shielded, so a second cancellation cannot leave a zombie behind
+        await asyncio.shield(process.wait())
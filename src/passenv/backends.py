@@ -0,0 +1,386 @@
+import os
+import re
+import shutil
+from abc import ABC, abstractmethod
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Union,
+    runtime_checkable,
+)
+
+from . import timings
+from .store import entry_file, is_initialized, iter_store_entries, store_dir
+
+# Upper bound on concurrent decryptions when fetching several entries
+MAX_WORKERS = 8
+
+BACKEND_ENV = "PASSENV_BACKEND"
+
+
+class EntryStat(NamedTuple):
+    """Metadata identifying one version of an entry, readable without decrypting it"""
+
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+class Backend(Protocol):
+    """Where PassClient gets entries from"""
+
+    def get_entry(self, path: str) -> str: ...
+
+    def get_entries(
+        self, paths: List[str], return_exceptions: bool = False
+    ) -> List[Union[str, Exception]]: ...
+
+    def iter_entries(self) -> Iterator[str]: ...
+
+    def list_entries(self) -> List[str]: ...
+
+    def stat_entry(self, path: str) -> Optional[EntryStat]: ...
+
+
+@runtime_checkable
+class CommandBackend(Protocol):
+    """A backend decrypting each entry with one external command, so it can be run
+    some other way than subprocess.run, as AsyncPassClient does"""
+
+    def command(self, path: str) -> List[str]: ...
+
+    def check_result(self, path: str, returncode: int, stdout: str, stderr: str) -> str: ...
+
+
+class BaseBackend(ABC):
+    """Shared behaviour: sorted listing and a bounded thread pool for batches"""
+
+    @abstractmethod
+    def get_entry(self, path: str) -> str: ...
+
+    @abstractmethod
+    def iter_entries(self) -> Iterator[str]: ...
+
+    def get_entries(
+        self, paths: List[str], return_exceptions: bool = False
+    ) -> List[Union[str, Exception]]:
+        """Fetch several entries concurrently, returning their contents in order
+
+        With return_exceptions, like asyncio.gather, an entry that fails is returned as
+        its exception instead of raising it, so the others are not lost.
+        """
+        get = entry_getter(self.get_entry, return_exceptions)
+        if len(paths) <= 1:
+            return [get(path) for path in paths]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(len(paths), MAX_WORKERS)) as executor:
+            return list(executor.map(get, paths))
+
+    def list_entries(self) -> List[str]:
+        return sorted(self.iter_entries())
+
+
+def entry_getter(
+    get_entry: Callable[[str], str], return_exceptions: bool
+) -> Callable[[str], Union[str, Exception]]:
+    """Return get_entry, or with return_exceptions a version returning what it raises"""
+    if not return_exceptions:
+        return get_entry
+
+    def get(path: str) -> Union[str, Exception]:
+        try:
+            return get_entry(path)
+        except Exception as e:
+            return e
+
+    return get
+
+
+def _stat_file(path: str) -> Optional[EntryStat]:
+    import hashlib
+
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return EntryStat(stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+
+
+class StoreBackend(BaseBackend):
+    """A backend reading the entries of a password store directory"""
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = root or store_dir()
+
+    def iter_entries(self) -> Iterator[str]:
+        if not is_initialized(self.root):
+            raise RuntimeError("Pass store not initialized.")
+        return iter_store_entries(self.root)
+
+    def stat_entry(self, path: str) -> Optional[EntryStat]:
+        """Describe the entry's encrypted file, so changes are detected without gpg"""
+        return _stat_file(entry_file(self.root, path))
+
+
+class PassShowBackend(StoreBackend):
+    """Decrypt entries through `pass show`, for setups that depend on the pass script"""
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        if not shutil.which("pass"):
+            raise RuntimeError("'pass' command not found. Please install pass.")
+        super().__init__(root)
+
+    LIST_COMMAND = ["pass", "ls"]
+
+    def command(self, path: str) -> List[str]:
+        return ["pass", "show", path]
+
+    def get_entry(self, path: str) -> str:
+        import subprocess
+
+        try:
+            result = timings.run(self.command(path), capture_output=True, text=True, check=True)
+            return result.stdout
+        except subprocess.CalledProcessError as e:
+            return self.check_result(path, e.returncode, e.stdout, e.stderr)
+
+    def check_result(self, path: str, returncode: int, stdout: str, stderr: str) -> str:
+        """Map a finished `pass show` run to the entry content or an error"""
+        if returncode == 1:
+            raise RuntimeError(f"Pass entry '{path}' not found.")
+        if returncode != 0:
+            raise RuntimeError(f"Pass command failed: {stderr}")
+        return stdout
+
+    def list_entries(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            # Setups without a local store directory can only be listed through pass itself
+            return self._list_entries_from_tree()
+        return super().list_entries()
+
+    def _list_entries_from_tree(self) -> List[str]:
+        import subprocess
+
+        try:
+            result = timings.run(self.LIST_COMMAND, capture_output=True, text=True, check=True)
+            return self._parse_pass_list(result.stdout)
+        except subprocess.CalledProcessError as e:
+            return self.check_list_result(e.returncode, e.stdout, e.stderr)
+
+    def check_list_result(self, returncode: int, stdout: str, stderr: str) -> List[str]:
+        """Map a finished `pass ls` run to the entries or an error"""
+        if returncode != 0:
+            if "not a git repository" in stderr or "not initialized" in stderr:
+                raise RuntimeError("Pass store not initialized.")
+            raise RuntimeError(f"Pass command failed: {stderr}")
+        return self._parse_pass_list(stdout)
+
+    def _parse_pass_list(self, output: str) -> List[str]:
+        entries = []
+        lines = output.split("\n")
+
+        # First pass: clean all lines and calculate depths
+        cleaned_lines = []
+        for line in lines:
+            if not line or line.strip().startswith("Password Store"):
+                continue
+
+            # Remove ANSI color codes
+            clean_line = re.sub(r"\x1b\[[0-9;]*m", "", line)
+
+            # Replace non-breaking spaces with regular spaces
+            clean_line = clean_line.replace("\xa0", " ")
+
+            # Calculate depth by counting leading tree characters
+            depth = 0
+            temp_line = clean_line
+
+            while temp_line:
+                if temp_line.startswith("├── ") or temp_line.startswith("└── "):
+                    depth += 1
+                    temp_line = temp_line[4:]
+                elif temp_line.startswith("│   "):
+                    depth += 1
+                    temp_line = temp_line[4:]
+                elif temp_line.startswith("    "):
+                    depth += 1
+                    temp_line = temp_line[4:]
+                else:
+                    break
+
+            item_name = temp_line.strip()
+            if item_name:
+                # Adjust depth to be 0-based (root items are depth 0)
+                cleaned_lines.append((depth - 1, item_name))
+
+        # Second pass: build the tree structure
+        path_stack: list = []
+
+        for i, (depth, item_name) in enumerate(cleaned_lines):
+            # Check if this is a directory by looking at the next line
+            is_directory = False
+            if i + 1 < len(cleaned_lines):
+                next_depth, _ = cleaned_lines[i + 1]
+                if next_depth > depth:
+                    is_directory = True
+
+            # Adjust path stack to current depth
+            # Remove items from stack that are at same or deeper level
+            path_stack = path_stack[:depth]
+
+            if is_directory:
+                # It's a directory, add to path stack
+                path_stack.append(item_name)
+            else:
+                # It's a password entry
+                if path_stack:
+                    full_path = "/".join(path_stack + [item_name])
+                else:
+                    full_path = item_name
+                entries.append(full_path)
+
+        return entries
+
+
+class GpgBackend(StoreBackend):
+    """Decrypt entries by running gpg on the store's .gpg files directly
+
+    This skips the pass script and its setup (extensions, git checks, .gpg-id
+    resolution), which only matter when writing to the store.
+    """
+
+    STATUS_PREFIX = "[GNUPG:] "
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        # pass prefers gpg2 where both are installed
+        gpg = shutil.which("gpg2") or shutil.which("gpg")
+        if not gpg:
+            raise RuntimeError("'gpg' command not found. Please install gnupg.")
+        self.gpg = gpg
+        super().__init__(root)
+        import shlex
+
+        self.options = shlex.split(os.environ.get("PASSWORD_STORE_GPG_OPTS", ""))
+
+    def command(self, path: str) -> List[str]:
+        """Return the gpg command decrypting the entry, raising when it has no file"""
+        if not os.path.isfile(entry_file(self.root, path)):
+            raise RuntimeError(f"Pass entry '{path}' not found.")
+        return [
+            self.gpg,
+            "--decrypt",
+            "--batch",
+            "--quiet",
+            "--yes",
+            "--status-fd",
+            "2",
+            *self.options,
+            entry_file(self.root, path),
+        ]
+
+    def get_entry(self, path: str) -> str:
+        result = timings.run(self.command(path), capture_output=True, text=True)
+        return self.check_result(path, result.returncode, result.stdout, result.stderr)
+
+    def check_result(self, path: str, returncode: int, stdout: str, stderr: str) -> str:
+        """Map a finished gpg run to the entry content or the error pass would report"""
+        status = []
+        messages = []
+        for line in stderr.splitlines():
+            if line.startswith(self.STATUS_PREFIX):
+                status.append(line.removeprefix(self.STATUS_PREFIX).split(" ", 1)[0])
+            else:
+                messages.append(line)
+
+        if returncode != 0 or "DECRYPTION_OKAY" not in status:
+            raise RuntimeError(f"Pass command failed: {os.linesep.join(messages)}")
+        return stdout
+
+
+class MemoryBackend(BaseBackend):
+    """Serve entries from a dict, for tests and benchmarks that must not touch gpg"""
+
+    def __init__(self, entries: Optional[Dict[str, str]] = None) -> None:
+        self.entries: Dict[str, str] = dict(entries or {})
+
+    def get_entry(self, path: str) -> str:
+        try:
+            return self.entries[path]
+        except KeyError:
+            raise RuntimeError(f"Pass entry '{path}' not found.")
+
+    def get_entries(
+        self, paths: List[str], return_exceptions: bool = False
+    ) -> List[Union[str, Exception]]:
+        # Nothing to wait on, so a thread pool would only add overhead
+        get = entry_getter(self.get_entry, return_exceptions)
+        return [get(path) for path in paths]
+
+    def iter_entries(self) -> Iterator[str]:
+        return iter(list(self.entries))
+
+    def stat_entry(self, path: str) -> Optional[EntryStat]:
+        content = self.entries.get(path)
+        if content is None:
+            return None
+        data = content.encode()
+        import hashlib
+
+        return EntryStat(0, len(data), hashlib.sha256(data).hexdigest())
+
+
+class DirectoryBackend(StoreBackend):
+    """Read plain text entries from a directory laid out like a password store
+
+    The *.gpg files hold the entry contents unencrypted, which makes a fixture
+    directory usable offline and deterministically, without gpg or a key.
+    """
+
+    def iter_entries(self) -> Iterator[str]:
+        return iter_store_entries(self.root)
+
+    def get_entry(self, path: str) -> str:
+        try:
+            with open(entry_file(self.root, path)) as f:
+                return f.read()
+        except FileNotFoundError:
+            raise RuntimeError(f"Pass entry '{path}' not found.")
+
+
+def default_backend(root: Optional[str] = None) -> Backend:
+    """Decrypt with gpg directly when the store is local, otherwise through pass"""
+    root = root or store_dir()
+    if is_initialized(root) and (shutil.which("gpg2") or shutil.which("gpg")):
+        return GpgBackend(root)
+    return PassShowBackend(root)
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """Create the backend named by name or $PASSENV_BACKEND
+
+    Names are "auto" (the default), "gpg", "pass" and "dir:<path>" for a
+    DirectoryBackend rooted at path.
+    """
+    name = name or os.environ.get(BACKEND_ENV) or "auto"
+    kind, _, argument = name.partition(":")
+
+    if kind == "auto":
+        return default_backend()
+    if kind == "gpg":
+        return GpgBackend()
+    if kind == "pass":
+        return PassShowBackend()
+    if kind == "dir" and argument:
+        return DirectoryBackend(os.path.expanduser(argument))
+    raise RuntimeError(f"Unknown backend '{name}'. Use auto, gpg, pass or dir:<path>.")
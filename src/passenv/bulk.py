@@ -0,0 +1,111 @@
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from . import timings
+from .backends import MAX_WORKERS
+from .exporters import Exporter, ExportFormat, stream_if_changed
+from .includes import IncludeResolver
+from .interpolate import expand
+from .pass_client import PassClient
+
+
+class EntryExport(NamedTuple):
+    """Outcome of exporting one entry: the file written, or why it was not"""
+
+    entry: str
+    output: str
+    variables: int
+    seconds: float
+    error: Optional[str] = None
+    # False when the file already held the same content and was left alone
+    changed: bool = True
+
+
+def subtree_entries(entries: List[str], prefix: str) -> List[str]:
+    """Return the entries under prefix, or prefix itself when it names an entry"""
+    prefix = prefix.strip("/")
+    if not prefix:
+        return entries
+    return [entry for entry in entries if entry == prefix or entry.startswith(prefix + "/")]
+
+
+def output_path(output_dir: str, prefix: str, entry: str, format: ExportFormat) -> str:
+    """Place entry below output_dir the way it sits below prefix in the store"""
+    prefix = prefix.strip("/")
+    if entry == prefix:
+        relative = os.path.basename(entry)
+    elif prefix:
+        relative_start = len(prefix) + 1
+        relative = entry[relative_start:]
+    else:
+        relative = entry
+    return os.path.join(output_dir, *relative.split("/")) + f".{format.value}"
+
+
+def export_tree(
+    pass_client: PassClient,
+    prefixes: List[str],
+    output_dir: str,
+    format: ExportFormat,
+    workers: int = MAX_WORKERS,
+    raw: bool = False,
+) -> List[EntryExport]:
+    """Export every entry under prefixes to its own file below output_dir
+
+    Entries are decrypted, rendered and written by a pool of workers. A failing
+    entry is recorded in its result and does not stop the others. Entries included
+    by several others are only decrypted once. References are expanded per entry,
+    unless raw. Entries that would be written to the same file, coming from different
+    prefixes, all fail rather than overwrite each other.
+    """
+    resolver = IncludeResolver(pass_client)
+    exporter = Exporter()
+
+    def export_entry(job: Tuple[str, str]) -> EntryExport:
+        entry, path = job
+        start = time.perf_counter()
+        try:
+            resolver.fetch([entry])
+            variables = resolver.variables(entry)
+            if not raw:
+                variables = expand(variables)
+            changed = stream_if_changed(
+                path, lambda stream: exporter.export_to(variables, format, stream)
+            )
+        except Exception as e:
+            return EntryExport(entry, path, 0, time.perf_counter() - start, str(e))
+        seconds = time.perf_counter() - start
+        return EntryExport(entry, path, len(variables), seconds, changed=changed)
+
+    with timings.phase("list"):
+        entries = pass_client.list_entries()
+        jobs = {}
+        for prefix in prefixes:
+            for entry in subtree_entries(entries, prefix):
+                jobs[entry] = output_path(output_dir, prefix, entry, format)
+    if not jobs:
+        raise RuntimeError(f"No pass entries found under {', '.join(repr(p) for p in prefixes)}.")
+
+    results: Dict[str, EntryExport] = {}
+    writers: Dict[str, List[str]] = {}
+    for entry, path in jobs.items():
+        writers.setdefault(path, []).append(entry)
+    for path, clashing in writers.items():
+        if len(clashing) > 1:
+            for entry in clashing:
+                others = ", ".join(repr(other) for other in clashing if other != entry)
+                error = f"Output {path} would also be written by {others}"
+                results[entry] = EntryExport(entry, path, 0, 0.0, error)
+    pending = [(entry, path) for entry, path in jobs.items() if entry not in results]
+
+    with timings.phase("export tree"):
+        if len(pending) <= 1 or workers <= 1:
+            exported = [export_entry(job) for job in pending]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(len(pending), workers)) as executor:
+                exported = list(executor.map(export_entry, pending))
+    results.update((result.entry, result) for result in exported)
+    return [results[entry] for entry in jobs]
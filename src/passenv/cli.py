@@ -0,0 +1,167 @@
+import os
+import sys
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from . import timings
+
+if TYPE_CHECKING:
+    from .core import PassEnv
+
+# Commands whose output is eval'd by the shell function on every call, with the
+# range of positional arguments they take. Plain invocations of these skip typer
+# (and rich, click, yaml...) entirely.
+FAST_COMMANDS = {
+    "load": (1, None),
+    "reload": (0, 0),
+    "push": (1, None),
+    "pop": (0, 0),
+    "unload": (0, 0),
+    "status": (0, 0),
+    "hook": (1, 1),
+}
+
+# Flags the fast path handles itself, for the commands prompt hooks run
+FAST_FLAGS = {"load": {"--if-changed"}}
+
+
+def split_exec_args(args: List[str]) -> Optional[Tuple[List[str], List[str], bool]]:
+    """Split `exec` arguments into entries, the command after -- and --clean-env"""
+    if "--" not in args:
+        return None
+    split = args.index("--")
+    command_start = split + 1
+    options, command = args[:split], args[command_start:]
+    entries = [arg for arg in options if arg != "--clean-env"]
+    if not entries or not command or any(arg.startswith("-") for arg in entries):
+        return None
+    return entries, command, "--clean-env" in options
+
+
+def split_marker_args(args: List[str]) -> Optional[str]:
+    """Return the marker of `load --marker FILE` arguments naming no entries themselves"""
+    split = args.index("--marker")
+    value = split + 1
+    after = value + 1
+    rest = args[:split] + args[after:]
+    if value == len(args) or args[value].startswith("-"):
+        return None
+    if any(arg != "--if-changed" for arg in rest):
+        return None
+    return args[value]
+
+
+def _is_fast_path(argv: List[str]) -> bool:
+    if not argv or (argv[0] not in FAST_COMMANDS and argv[0] != "exec"):
+        return False
+    # Shell completion is driven by typer through this environment variable
+    if "_PASSENV_COMPLETE" in os.environ:
+        return False
+    args = argv[1:]
+    # exec is run by supervisors and cron, so it is worth keeping fast as well
+    if argv[0] == "exec":
+        return split_exec_args(args) is not None
+    if argv[0] == "load" and "--marker" in args:
+        return split_marker_args(args) is not None
+    flags = FAST_FLAGS.get(argv[0], set())
+    args = [arg for arg in args if arg not in flags]
+    # Options such as --help are left to typer
+    if any(arg.startswith("-") for arg in args):
+        return False
+    minimum, maximum = FAST_COMMANDS[argv[0]]
+    return len(args) >= minimum and (maximum is None or len(args) <= maximum)
+
+
+def _run_fast(argv: List[str]) -> int:
+    with timings.phase("import core"):
+        from .core import PassEnv
+
+    command, args = argv[0], argv[1:]
+    with timings.phase(f"command {command}"):
+        return _run_command(PassEnv, command, args)
+
+
+def _run_command(passenv_class: type, command: str, args: List[str]) -> int:
+    try:
+        # Evaluated at every shell start, and needs no pass client
+        if command == "hook":
+            from .hook import hook_script
+
+            print(hook_script(args[0]))
+            return 0
+
+        passenv = passenv_class()
+        if command in ("load", "reload", "push", "pop"):
+            if command == "load":
+                marker = split_marker_args(args) if "--marker" in args else None
+                if marker is not None:
+                    from .hook import marker_entries
+
+                    paths = marker_entries(marker)
+                else:
+                    paths = [arg for arg in args if arg != "--if-changed"]
+                output = passenv.load(*paths, if_changed="--if-changed" in args)
+            elif command == "push":
+                output = passenv.push(*args)
+            elif command == "pop":
+                output = passenv.pop()
+            else:
+                output = passenv.reload()
+            for warning in passenv.conflict_warnings():
+                print(warning, file=sys.stderr)
+            # Nothing at all when unchanged, so prompt hooks have nothing to eval
+            if output:
+                print(output)
+        elif command == "exec":
+            return _run_exec(passenv, args)
+        elif command == "unload":
+            print(passenv.unload())
+        else:
+            print(passenv.status())
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _run_exec(passenv: "PassEnv", args: List[str]) -> int:
+    from .core import EXIT_NOT_EXECUTABLE, EXIT_NOT_FOUND
+
+    split = split_exec_args(args)
+    assert split is not None
+    entries, command, clean_env = split
+    env = passenv.environment(*entries, clean=clean_env)
+    for warning in passenv.conflict_warnings():
+        print(warning, file=sys.stderr)
+    try:
+        passenv.exec_command(command, env)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_NOT_FOUND if isinstance(e, FileNotFoundError) else EXIT_NOT_EXECUTABLE
+
+
+def main() -> None:
+    """Console entry point"""
+    argv = sys.argv[1:]
+    # --timings is a global option of the typer app, but tracing has to start
+    # before the app is even imported. It is accepted after the command too, so it is
+    # taken out of the arguments the app parses; those after -- belong to the exec'd
+    # command and are left alone.
+    end = argv.index("--") if "--" in argv else len(argv)
+    if "--timings" in argv[:end]:
+        timings.enable()
+        rest = argv[end:]
+        argv = [arg for arg in argv[:end] if arg != "--timings"] + rest
+        sys.argv[1:] = argv
+
+    if _is_fast_path(argv):
+        sys.exit(_run_fast(argv))
+
+    with timings.phase("import typer app"):
+        from .main import app
+
+    with timings.phase(f"command {argv[0] if argv else ''}".rstrip()):
+        app()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,35 @@
 import os
 from typing import List, Tuple
 
-from shellingham import detect_shell  # type: ignore
-
+from .index import EntryIndex
 from .pass_client import PassClient
+from .store import is_initialized, store_dir
+
+# "segments" (the default) completes one directory at a time, "fuzzy" falls back to
+# fuzzy matching when nothing starts with what was typed, "full" offers whole paths
+COMPLETION_ENV = "PASSENV_COMPLETION"
 
 
 def complete_pass_entries(incomplete: str) -> List[str]:
     """Auto-complete pass entries"""
     try:
-        client = PassClient()
-        entries = client.list_entries()
-
-        # Filter entries that start with the incomplete string
-        matches = [entry for entry in entries if entry.startswith(incomplete)]
+        root = store_dir()
+        if is_initialized(root):
+            index = EntryIndex.load(root)
+        else:
+            index = EntryIndex.from_entries(PassClient().list_entries())
+
+        mode = os.environ.get(COMPLETION_ENV, "segments")
+        if mode == "full":
+            return index.prefix(incomplete)
+
+        matches = index.segments(incomplete)
+        # Shells add a space after a lone match, so a lone directory is completed
+        # straight to what it holds
+        while len(matches) == 1 and matches[0].endswith("/"):
+            matches = index.segments(matches[0])
+        if not matches and mode == "fuzzy":
+            return index.fuzzy(incomplete)
         return matches
     except Exception:
         # If pass fails, return empty list
@@ -23,6 +39,8 @@ def complete_pass_entries(incomplete: str) -> List[str]:
 def _detect_shell_and_rc() -> Tuple[str, str | None]:
     """Detect shell using Typer's logic and return shell name and RC file path"""
     try:
+        from shellingham import detect_shell  # type: ignore
+
         shell, shell_path = detect_shell()
     except Exception:
         # Fallback if shellingham fails
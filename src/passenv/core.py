@@ -1,45 +1,219 @@
 import os
-from typing import List
+import sys
+from typing import Dict, List, NoReturn, Optional, Sequence, Tuple
 
+from . import timings
 from .parser import EnvParser
 from .pass_client import PassClient
+from .session import (
+    LEGACY_FINGERPRINT_KEY,
+    LEGACY_VARS_KEY,
+    SESSION_KEY,
+    Layer,
+    SessionState,
+)
+
+# Exit statuses shells use for a command that is missing or cannot be executed
+EXIT_NOT_FOUND = 127
+EXIT_NOT_EXECUTABLE = 126
 
 
 class PassEnv:
-    LOADED_VARS_KEY = "PASSENV_LOADED_VARS"
+    LOADED_VARS_KEY = LEGACY_VARS_KEY
+    FINGERPRINT_KEY = LEGACY_FINGERPRINT_KEY
+    # Tracking variables of earlier versions, still read and cleaned up on the next change
+    LEGACY_KEYS = (LOADED_VARS_KEY, FINGERPRINT_KEY)
+    # Kept in the environment for prompts; the session state is authoritative
     SOURCE_KEY = "PASSENV_SOURCE"
+    SOURCE_SEPARATOR = ","
 
-    def __init__(self) -> None:
-        self.pass_client = PassClient()
+    def __init__(self, pass_client: Optional[PassClient] = None) -> None:
+        self.pass_client = pass_client or PassClient()
         self.parser = EnvParser()
+        # (variable, overridden source, overriding source) from the last merge
+        self.conflicts: List[Tuple[str, str, str]] = []
+        # Entries each entry of the last merge included, directly or not
+        self.includes: Dict[str, List[str]] = {}
+        self._state: Optional[SessionState] = None
+        self._state_key: Tuple[Optional[str], ...] = ()
 
-    def load(self, pass_path: str) -> str:
-        commands = []
+    def get_variables(self, *pass_paths: str, raw: bool = False) -> Dict[str, str]:
+        """Fetch and merge pass entries, later entries taking precedence, then expand
+        ${VAR} references in the merged values unless raw"""
+        from .includes import IncludeResolver
+
+        resolver = IncludeResolver(self.pass_client, self.parser)
+        with timings.phase("fetch"):
+            resolver.fetch(pass_paths)
+
+        variables: Dict[str, str] = {}
+        origins: Dict[str, str] = {}
+        self.conflicts = []
+
+        with timings.phase("parse"):
+            for pass_path in pass_paths:
+                for key, value in resolver.variables(pass_path).items():
+                    if key in variables and variables[key] != value:
+                        self.conflicts.append((key, origins[key], pass_path))
+                    variables[key] = value
+                    origins[key] = pass_path
+        self.includes = {pass_path: resolver.included([pass_path]) for pass_path in pass_paths}
+
+        if not raw and any("${" in value for value in variables.values()):
+            from .interpolate import expand
+
+            with timings.phase("expand"):
+                variables = expand(variables, self.host_environment())
+        return variables
+
+    def host_environment(self) -> Dict[str, str]:
+        """The environment references fall back to, without the variables we loaded"""
+        loaded = set(self.loaded_vars())
+        return {key: value for key, value in os.environ.items() if key not in loaded}
+
+    def environment(self, *pass_paths: str, clean: bool = False) -> Dict[str, str]:
+        """Return the current environment, or an empty one, with the entries' variables"""
+        env = {} if clean else dict(os.environ)
+        env.update(self.get_variables(*pass_paths))
+        return env
+
+    def exec_command(self, command: List[str], env: Dict[str, str]) -> NoReturn:
+        """Replace this process with command, so its exit status and signals reach the caller
+
+        The command is looked up on the PATH it will run with, or on ours when the
+        environment has none. Raises FileNotFoundError or PermissionError when it cannot
+        be executed.
+        """
+        import shutil
+        import signal
+
+        executable = command[0]
+        if os.sep not in executable:
+            search_path = env.get("PATH", os.environ.get("PATH", os.defpath))
+            executable = shutil.which(executable, path=search_path) or ""
+            if not executable:
+                raise FileNotFoundError(f"Command '{command[0]}' not found")
+
+        timings.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        # Python ignores SIGPIPE and SIGXFSZ, and ignored signals survive exec
+        for name in ("SIGPIPE", "SIGXFSZ"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), signal.SIG_DFL)
+
+        os.execve(executable, command, env)
+
+    def fingerprint(self, *pass_paths: str) -> str:
+        """Describe the entries' encrypted files as mtime:size:digest, "-" where unknown"""
+        stats = [self.pass_client.stat_entry(path) for path in pass_paths]
+        return ",".join(
+            "-" if stat is None else f"{stat.mtime_ns}:{stat.size}:{stat.digest}" for stat in stats
+        )
+
+    def is_current(self, *pass_paths: str) -> bool:
+        """Whether exactly pass_paths are loaded and their files are unchanged, without gpg"""
+        layers = self.state.layers
+        if len(layers) != 1 or layers[0].sources != list(pass_paths):
+            return False
+        return self._unchanged(layers) is True
 
-        # If something is already loaded, unload it first
-        if self.is_loaded():
-            loaded_vars = os.environ.get(self.LOADED_VARS_KEY, "").split(",")
-            for var in loaded_vars:
-                if var.strip():
-                    commands.append(f"unset {var.strip()}")
+    def _unchanged(self, layers: Sequence[Layer]) -> Optional[bool]:
+        """Compare the recorded fingerprints with the files, None when either is unknown"""
+        for layer in layers:
+            if not layer.fingerprint:
+                return None
+            current = self.fingerprint(*layer.sources, *layer.includes)
+            if "-" in current.split(",") or "-" in layer.fingerprint.split(","):
+                return None
+            # A file that was only touched (git checkout, sync tools) still holds the same secrets
+            if _contents(layer.fingerprint) != _contents(current):
+                return False
+        return True
 
-        # Get content from pass
-        content = self.pass_client.get_entry(pass_path)
+    @property
+    def state(self) -> SessionState:
+        """The session's tracking state, read again whenever the tracking variables change"""
+        key = tuple(os.environ.get(name) for name in (SESSION_KEY, *self.LEGACY_KEYS))
+        if self._state is None or self._state_key != key:
+            self._state = SessionState.load()
+            self._state_key = key
+        return self._state
 
-        # Parse environment variables
-        variables = self.parser.parse(content)
+    def loaded_vars(self) -> List[str]:
+        return list(self.state.variables)
 
-        # Generate shell export commands
+    def loaded_paths(self) -> List[str]:
+        return self.state.sources
+
+    def load(self, *pass_paths: str, if_changed: bool = False) -> str:
+        """Return shell commands loading the entries; nothing with if_changed when they
+        are already loaded and unchanged"""
+        if if_changed and self.is_current(*pass_paths):
+            self.state.touch()
+            return ""
+        return self._switch([Layer(list(pass_paths))])
+
+    def push(self, *pass_paths: str) -> str:
+        """Load the entries on top of what is loaded, to be undone by pop"""
+        return self._switch([*self.state.layers, Layer(list(pass_paths))])
+
+    def pop(self) -> str:
+        """Undo the last push, restoring the variables of the layers below"""
+        layers = self.state.layers
+        if not layers:
+            raise RuntimeError("No environment currently loaded")
+        if len(layers) == 1:
+            return self.unload()
+        return self._switch(layers[:-1])
+
+    def reload(self) -> str:
+        """Load the current entries again if any of them changed since they were loaded"""
+        if not self.is_loaded():
+            raise RuntimeError("No environment currently loaded")
+        layers = self.state.layers
+        if self._unchanged(layers) is True:
+            self.state.touch()
+            return ""
+        return self._switch(layers)
+
+    def _switch(self, layers: List[Layer]) -> str:
+        """Return the commands turning what is loaded into the merge of layers"""
+        # Stat before decrypting, so a change made meanwhile is seen by the next load
+        layers = [layer._replace(fingerprint=self.fingerprint(*layer.sources)) for layer in layers]
+
+        # Get and parse environment variables from pass
+        variables = self.get_variables(*(path for layer in layers for path in layer.sources))
+
+        # Included entries are only known once decrypted, so they are stat'ed afterwards
+        for index, layer in enumerate(layers):
+            included = {path for source in layer.sources for path in self.includes[source]}
+            includes = sorted(included - set(layer.sources))
+            if includes:
+                fingerprint = f"{layer.fingerprint},{self.fingerprint(*includes)}"
+                layers[index] = layer._replace(includes=includes, fingerprint=fingerprint)
+
+        # Only emit the difference to what is loaded: the shell that will eval the
+        # output is our parent, so os.environ holds its current values
         commands = []
-        var_names = []
+        with timings.phase("emit"):
+            for var in self.loaded_vars():
+                if var not in variables:
+                    commands.append(f"unset {var}")
+            for key, value in variables.items():
+                if os.environ.get(key) != value:
+                    commands.append(f'export {key}="{self._escape_value(value)}"')
 
-        for key, value in variables.items():
-            commands.append(f'export {key}="{self._escape_value(value)}"')
-            var_names.append(key)
+        state = self.state
+        state.layers = layers
+        state.variables = list(variables)
+        session_id = state.save()
 
         # Add tracking variables
-        commands.append(f'export {self.LOADED_VARS_KEY}="{",".join(var_names)}"')
-        commands.append(f'export {self.SOURCE_KEY}="{pass_path}"')
+        commands.extend(self._unset_legacy())
+        commands.append(f'export {SESSION_KEY}="{session_id}"')
+        commands.append(f'export {self.SOURCE_KEY}="{self.SOURCE_SEPARATOR.join(state.sources)}"')
 
         return "\n".join(commands)
 
@@ -47,36 +221,52 @@ class PassEnv:
         if not self.is_loaded():
             raise RuntimeError("No environment currently loaded")
 
-        loaded_vars = os.environ.get(self.LOADED_VARS_KEY, "").split(",")
-        commands = []
-
         # Unset all loaded variables
-        for var in loaded_vars:
-            if var.strip():
-                commands.append(f"unset {var.strip()}")
+        commands = [f"unset {var}" for var in self.loaded_vars()]
+        self.state.delete()
 
         # Unset tracking variables
-        commands.append(f"unset {self.LOADED_VARS_KEY}")
+        commands.extend(self._unset_legacy())
+        commands.append(f"unset {SESSION_KEY}")
         commands.append(f"unset {self.SOURCE_KEY}")
 
         return "\n".join(commands)
 
+    def _unset_legacy(self) -> List[str]:
+        return [f"unset {key}" for key in self.LEGACY_KEYS if key in os.environ]
+
     def status(self) -> str:
         if not self.is_loaded():
             return "No environment currently loaded"
 
-        source = os.environ.get(self.SOURCE_KEY, "unknown")
-        loaded_vars = os.environ.get(self.LOADED_VARS_KEY, "").split(",")
-        var_count = len([v for v in loaded_vars if v.strip()])
+        layers = self.state.layers
+        source = " + ".join(f"'{self.SOURCE_SEPARATOR.join(layer.sources)}'" for layer in layers)
+        var_count = len(self.state.variables)
 
-        return f"Environment loaded from '{source}' ({var_count} variables)"
+        stale = self._unchanged(layers) is False
+        details = f"{var_count} variables, stale" if stale else f"{var_count} variables"
+        return f"Environment loaded from {source} ({details})"
 
     def list_entries(self) -> List[str]:
         return self.pass_client.list_entries()
 
+    def conflict_warnings(self) -> List[str]:
+        """Describe the overridden variables of the last merge"""
+        return [
+            f"Warning: {key} from '{source}' overrides the value from '{previous}'"
+            for key, previous, source in self.conflicts
+        ]
+
     def is_loaded(self) -> bool:
-        return self.LOADED_VARS_KEY in os.environ
+        return bool(self.state.layers)
 
     def _escape_value(self, value: str) -> str:
-        # Escape double quotes and backslashes for shell
-        return value.replace("\\", "\\\\").replace('"', '\\"')
+        # Escape backslashes, double quotes, dollar signs and backticks for shell
+        return (
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$").replace("`", "\\`")
+        )
+
+
+def _contents(fingerprint: str) -> List[str]:
+    """Drop the mtimes from a fingerprint, leaving size and digest per entry"""
+    return [part.partition(":")[2] for part in fingerprint.split(",")]
@@ -1,10 +1,25 @@
-import csv
-import json
+import os
+import re
+from contextlib import contextmanager
 from enum import Enum
-from io import StringIO
-from typing import Dict
+from io import StringIO, TextIOBase
+from typing import IO, Callable, Dict, Iterator, List, Optional, Union, cast
 
-import yaml
+from . import timings
+
+# Characters collected before a streaming export writes them out
+WRITE_CHUNK_SIZE = 64 * 1024
+
+# Variables per YAML document or JSON chunk streamed out
+YAML_BATCH_SIZE = 256
+JSON_BATCH_SIZE = 1024
+
+# Text libyaml emits exactly like PyYAML. It escapes NEL and characters outside the
+# BMP, and folds escaped strings differently, so anything else uses the Python dumper.
+LIBYAML_SAFE = re.compile("[\x20-\x7e\xa0-\ud7ff\ue000-\ufffd]*")
+
+# Bytes compared at a time when checking an existing output file
+COMPARE_CHUNK_SIZE = 64 * 1024
 
 
 class ExportFormat(str, Enum):
@@ -19,7 +34,7 @@ class Exporter:
     """Handle exporting environment variables to different formats"""
 
     def __init__(self) -> None:
-        self.formatters = {
+        self.formatters: Dict[ExportFormat, Callable[[Dict[str, str], Writer], None]] = {
             ExportFormat.ENV: self._format_env,
             ExportFormat.YAML: self._format_yaml,
             ExportFormat.JSON: self._format_json,
@@ -29,59 +44,240 @@ class Exporter:
 
     def export(self, variables: Dict[str, str], format: ExportFormat) -> str:
         """Export variables to the specified format"""
+        output = StringIO()
+        self.export_to(variables, format, output)
+        return output.getvalue()
+
+    def export_to(
+        self, variables: Dict[str, str], format: ExportFormat, stream: Union[IO[str], IO[bytes]]
+    ) -> None:
+        """Write variables in the specified format to a text or binary stream, in chunks,
+        without building the whole document in memory"""
         if format not in self.formatters:
             raise ValueError(f"Unsupported export format: {format}")
 
-        return self.formatters[format](variables)
+        with timings.phase(f"export {format.value}"):
+            writer = Writer(stream)
+            self.formatters[format](variables, writer)
+            writer.flush()
 
-    def _format_env(self, variables: Dict[str, str]) -> str:
+    def _format_env(self, variables: Dict[str, str], writer: "Writer") -> None:
         """Export as .env format"""
-        lines = []
+        separator = ""
         for key, value in variables.items():
             # Quote values that contain spaces or special characters
             if " " in value or '"' in value or "'" in value or "\n" in value:
                 # Escape quotes and wrap in double quotes
                 escaped_value = value.replace("\\", "\\\\").replace('"', '\\"')
-                lines.append(f'{key}="{escaped_value}"')
+                writer.write(f'{separator}{key}="{escaped_value}"')
             else:
-                lines.append(f"{key}={value}")
-        return "\n".join(lines)
+                writer.write(f"{separator}{key}={value}")
+            separator = "\n"
 
-    def _format_yaml(self, variables: Dict[str, str]) -> str:
+    def _format_yaml(self, variables: Dict[str, str], writer: "Writer") -> None:
         """Export as YAML format"""
         try:
-            return yaml.dump(variables, default_flow_style=False, allow_unicode=True)
-        except NameError:
+            import yaml
+        except ImportError:
             # Fallback if PyYAML not installed
-            lines = []
+            separator = ""
             for key, value in variables.items():
                 # Simple YAML formatting
                 if isinstance(value, str) and (
                     ":" in value or "#" in value or value.startswith(" ") or value.endswith(" ")
                 ):
-                    lines.append(f'{key}: "{value}"')
+                    writer.write(f'{separator}{key}: "{value}"')
                 else:
-                    lines.append(f"{key}: {value}")
-            return "\n".join(lines)
+                    writer.write(f"{separator}{key}: {value}")
+                separator = "\n"
+            return
+
+        # A document for the whole mapping would be built as one node tree first; strings
+        # never get anchors, so dumping sorted batches of keys yields the same text
+        c_dumper = getattr(yaml, "CSafeDumper", None)
+        items = sorted(variables.items())
+        for start in range(0, len(items), YAML_BATCH_SIZE):
+            end = start + YAML_BATCH_SIZE
+            batch = dict(items[start:end])
+            dumper = yaml.Dumper
+            if c_dumper is not None and all(
+                LIBYAML_SAFE.fullmatch(key) and LIBYAML_SAFE.fullmatch(value)
+                for key, value in batch.items()
+            ):
+                dumper = c_dumper
+            yaml.dump(batch, writer, Dumper=dumper, default_flow_style=False, allow_unicode=True)
+        if not items:
+            yaml.dump({}, writer, default_flow_style=False, allow_unicode=True)
 
-    def _format_json(self, variables: Dict[str, str]) -> str:
+    def _format_json(self, variables: Dict[str, str], writer: "Writer") -> None:
         """Export as JSON format"""
-        return json.dumps(variables, indent=2, ensure_ascii=False)
+        import json
+
+        try:
+            import orjson
+        except ImportError:
+            json.dump(variables, writer, indent=2, ensure_ascii=False)
+            return
 
-    def _format_csv(self, variables: Dict[str, str]) -> str:
+        if not variables:
+            writer.write("{}")
+            return
+        items = list(variables.items())
+        writer.write("{\n")
+        for start in range(0, len(items), JSON_BATCH_SIZE):
+            end = start + JSON_BATCH_SIZE
+            batch = dict(items[start:end])
+            try:
+                chunk = orjson.dumps(batch, option=orjson.OPT_INDENT_2).decode()
+            except TypeError:
+                # orjson rejects strings json accepts, such as lone surrogates
+                chunk = json.dumps(batch, indent=2, ensure_ascii=False)
+            # Both render {\n  "KEY": "value",\n ...\n}; keep the members only
+            writer.write((",\n" if start else "") + chunk[2:-2])
+        writer.write("\n}")
+
+    def _format_csv(self, variables: Dict[str, str], writer: "Writer") -> None:
         """Export as CSV format with KEY,VALUE columns"""
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["KEY", "VALUE"])
+        import csv
+
+        csv_writer = csv.writer(writer)
+        csv_writer.writerow(["KEY", "VALUE"])
         for key, value in variables.items():
-            writer.writerow([key, value])
-        return output.getvalue()
+            csv_writer.writerow([key, value])
 
-    def _format_docker(self, variables: Dict[str, str]) -> str:
+    def _format_docker(self, variables: Dict[str, str], writer: "Writer") -> None:
         """Export as Docker environment arguments"""
-        args = []
+        separator = ""
         for key, value in variables.items():
             # Escape quotes for shell
             escaped_value = value.replace("\\", "\\\\").replace('"', '\\"')
-            args.append(f'-e {key}="{escaped_value}"')
-        return " ".join(args)
+            writer.write(f'{separator}-e {key}="{escaped_value}"')
+            separator = " "
+
+
+class Writer:
+    """Collect small writes into chunks for a text or binary stream
+
+    Formatters write one record at a time; passing each straight to an unbuffered
+    stream such as a pipe would cost a system call per variable.
+    """
+
+    def __init__(self, stream: Union[IO[str], IO[bytes]]) -> None:
+        self.stream = stream
+        self.binary = not (isinstance(stream, TextIOBase) or hasattr(stream, "encoding"))
+        self.pending: List[str] = []
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        self.pending.append(text)
+        self.size += len(text)
+        if self.size >= WRITE_CHUNK_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        chunk = "".join(self.pending)
+        self.pending = []
+        self.size = 0
+        if self.binary:
+            cast(IO[bytes], self.stream).write(chunk.encode())
+        else:
+            cast(IO[str], self.stream).write(chunk)
+
+
+def stream_if_changed(path: str, render: Callable[[IO[bytes]], object]) -> bool:
+    """Write what render writes to a binary stream to path, unless the file already
+    holds exactly that; returns whether it was written
+
+    Leaving an unchanged file alone keeps its mtime, so file watchers and config
+    reloaders are not triggered when no secret changed. The content goes to a temporary
+    file next to path and is compared with the existing file from there, so it is
+    never held in memory as a whole.
+    """
+    with open_output(path) as output:
+        render(output.file)
+        return output.commit()
+
+
+class AtomicOutput:
+    """A temporary file that replaces path on commit() when its content differs
+
+    New files are only readable by their owner; an existing file keeps its
+    permissions. The content is synced before the rename, so readers never see a
+    partial file.
+    """
+
+    def __init__(self, path: str) -> None:
+        import tempfile
+
+        self.path = path
+        self.directory = os.path.dirname(path) or "."
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=self.directory, prefix=f".{os.path.basename(path)}."
+        )
+        self.file: IO[bytes] = os.fdopen(fd, "wb")
+
+    def commit(self) -> bool:
+        """Replace path with the temporary file unless they match; returns whether it did"""
+        self.file.flush()
+        try:
+            with open(self.path, "rb") as existing:
+                mode: Optional[int] = os.fstat(existing.fileno()).st_mode & 0o777
+                with open(self.tmp_path, "rb") as new:
+                    if _same_files(existing, new):
+                        return False
+        except FileNotFoundError:
+            mode = None
+
+        if mode is not None:
+            os.fchmod(self.file.fileno(), mode)
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        _fsync_directory(self.directory)
+        return True
+
+    def close(self) -> None:
+        """Remove the temporary file unless it was committed"""
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[AtomicOutput]:
+    output = AtomicOutput(path)
+    try:
+        yield output
+    finally:
+        output.close()
+
+
+def _same_files(first: IO[bytes], second: IO[bytes]) -> bool:
+    if os.fstat(first.fileno()).st_size != os.fstat(second.fileno()).st_size:
+        return False
+    while True:
+        chunk = first.read(COMPARE_CHUNK_SIZE)
+        if chunk != second.read(COMPARE_CHUNK_SIZE):
+            return False
+        if not chunk:
+            return True
+
+
+def _fsync_directory(directory: str) -> None:
+    # Makes the rename itself durable; not every platform can open a directory
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
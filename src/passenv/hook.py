@@ -0,0 +1,297 @@
+import hashlib
+import os
+import shlex
+from typing import List, Optional
+
+from .agent import ensure_private_dir, runtime_dir
+
+# Directory marker naming the entries to load, separated by whitespace
+MARKER = ".passenv"
+
+SHELLS = ("bash", "zsh", "fish")
+
+# Commands whose output the shell function evals
+EVAL_COMMANDS = ("load", "reload", "push", "pop", "unload")
+
+POSIX_FUNCTION = """
+passenv() {
+    case "$1" in
+        @COMMANDS@)
+            eval "$(command passenv "$@")"
+            ;;
+        allow|deny)
+            command passenv "$@" || return
+            if [ "$1" = deny ] && [ -n "$_passenv_hook_dir" ]; then
+                eval "$(command passenv unload 2>/dev/null)"
+            fi
+            # Let the prompt hook look at the marker again
+            _passenv_hook_dir=
+            _passenv_hook_failed=
+            ;;
+        *)
+            command passenv "$@"
+            ;;
+    esac
+}
+"""
+
+# fish has no special backticks, so it drops the backslash escaping them for POSIX shells
+FISH_FUNCTION = """
+function passenv
+    switch $argv[1]
+        case @COMMANDS@
+            command passenv $argv | string replace -r '^unset ' 'set -e ' \\
+                | string replace -a '\\`' '`' | source
+        case allow deny
+            command passenv $argv; or return
+            if test "$argv[1]" = deny; and test -n "$_passenv_hook_dir"
+                command passenv unload 2>/dev/null | string replace -r '^unset ' 'set -e ' | source
+            end
+            # Let the prompt hook look at the marker again
+            set -g _passenv_hook_dir
+            set -g _passenv_hook_failed
+        case '*'
+            command passenv $argv
+    end
+end
+"""
+
+# Line install writes above the function, so a later install can find and update it
+INSTALL_COMMENT = "# Added by passenv"
+
+# Runs before every prompt. Everything up to the call to passenv is shell builtins:
+# walk up to the nearest marker, and unless the marker or one of its entries' .gpg
+# files is newer than the session state file, return without starting Python.
+# load --marker then checks the marker was allowed, and --if-changed the fingerprints,
+# and refreshes the state file's mtime. The entries the -nt checks use are read
+# without glob-expanding them.
+POSIX_HOOK = """
+_passenv_hook() {
+    local ret=$? dir=$PWD entry output
+    while [ -n "$dir" ] && [ ! -f "$dir/@MARKER@" ]; do
+        dir=${dir%/*}
+    done
+
+    if [ -z "$dir" ]; then
+        if [ -n "$_passenv_hook_dir" ]; then
+            _passenv_hook_dir=
+            _passenv_hook_failed=
+            eval "$(command passenv unload 2>/dev/null)"
+        fi
+        return $ret
+    fi
+
+    if [ "$dir" = "$_passenv_hook_dir" ]; then
+        [ "$dir" = "$_passenv_hook_failed" ] && return $ret
+        if [ ! "$dir/@MARKER@" -nt @RUNTIME@/session-"$PASSENV_SESSION" ]; then
+            for entry in @ENTRIES@; do
+                [ "${PASSWORD_STORE_DIR:-$HOME/.password-store}/$entry.gpg" \\
+                    -nt @RUNTIME@/session-"$PASSENV_SESSION" ] && break
+                entry=
+            done
+            [ -z "$entry" ] && return $ret
+        fi
+    fi
+
+    _passenv_hook_dir=$dir
+    _passenv_hook_failed=
+    @READ_ENTRIES@
+    if output=$(command passenv load --if-changed --marker "$dir/@MARKER@"); then
+        eval "$output"
+    else
+        _passenv_hook_failed=$dir
+    fi
+    return $ret
+}
+"""
+
+BASH_REGISTER = """
+case ";${PROMPT_COMMAND:-};" in
+    *";_passenv_hook;"*) ;;
+    *) PROMPT_COMMAND="_passenv_hook${PROMPT_COMMAND:+;$PROMPT_COMMAND}" ;;
+esac
+"""
+
+ZSH_REGISTER = """
+autoload -Uz add-zsh-hook
+add-zsh-hook precmd _passenv_hook
+"""
+
+# fish has no -nt test, so the comparison uses `path mtime` (fish 3.5+) in seconds, and
+# treats a file changed in the same second as the state file as changed
+FISH_HOOK = """
+function _passenv_hook --on-event fish_prompt
+    set -l dir $PWD
+    while test -n "$dir"; and not test -f "$dir/@MARKER@"
+        set dir (string replace -r '/[^/]*$' '' -- $dir)
+    end
+
+    if test -z "$dir"
+        if test -n "$_passenv_hook_dir"
+            set -g _passenv_hook_dir
+            set -g _passenv_hook_failed
+            command passenv unload 2>/dev/null | string replace -r '^unset ' 'set -e ' | source
+        end
+        return
+    end
+
+    if test "$dir" = "$_passenv_hook_dir"
+        test "$dir" = "$_passenv_hook_failed"; and return
+        set -l store $PASSWORD_STORE_DIR
+        test -n "$store"; or set store ~/.password-store
+        set -l state (path mtime -- @RUNTIME@/session-$PASSENV_SESSION)
+        set -l changed
+        if test -n "$state"
+            for time in (path mtime -- $dir/@MARKER@ $store/$_passenv_hook_entries.gpg)
+                if test $time -ge $state
+                    set changed 1
+                    break
+                end
+            end
+            test -z "$changed"; and return
+        end
+    end
+
+    set -g _passenv_hook_dir $dir
+    set -g _passenv_hook_failed
+    set -g _passenv_hook_entries (string split -n ' ' < $dir/@MARKER@)
+    set -l output (command passenv load --if-changed --marker $dir/@MARKER@)
+    or begin
+        set -g _passenv_hook_failed $dir
+        return
+    end
+    printf '%s\\n' $output | string replace -r '^unset ' 'set -e ' \\
+        | string replace -a '\\`' '`' | source
+end
+"""
+
+
+def shell_function(shell: Optional[str] = None) -> str:
+    """Return the passenv function that evals the output of the environment commands"""
+    if shell == "fish":
+        return FISH_FUNCTION.replace("@COMMANDS@", " ".join(EVAL_COMMANDS))
+    return POSIX_FUNCTION.replace("@COMMANDS@", "|".join(EVAL_COMMANDS))
+
+
+def replace_shell_function(content: str, function: str) -> Optional[str]:
+    """Return rc file content with the passenv function install added replaced by
+    function, or None when it holds no function install added"""
+    lines = content.splitlines(keepends=True)
+    for comment, line in enumerate(lines):
+        if line.rstrip() != INSTALL_COMMENT:
+            continue
+        start = comment + 1
+        while start < len(lines) and not lines[start].strip():
+            start += 1
+        if start == len(lines):
+            break
+        if lines[start].startswith("passenv() {"):
+            closing = "}"
+        elif lines[start].startswith("function passenv"):
+            closing = "end"
+        else:
+            continue
+        for end in range(start + 1, len(lines)):
+            if lines[end].rstrip() == closing:
+                after = end + 1
+                return "".join(
+                    lines[:comment] + [f"{INSTALL_COMMENT}\n{function}"] + lines[after:]
+                )
+    return None
+
+
+def hook_script(shell: str) -> str:
+    """Return the shell function plus a prompt hook loading the entries named by .passenv"""
+    if shell not in SHELLS:
+        raise RuntimeError(f"Unsupported shell '{shell}'. Use bash, zsh or fish.")
+
+    if shell == "fish":
+        hook = FISH_HOOK
+    else:
+        # zsh does not split unquoted parameters into words by itself, nor glob-expand
+        # them; bash does both, so it reads the entries into an array instead
+        if shell == "zsh":
+            read = '_passenv_hook_entries=$(<"$dir/@MARKER@")'
+            entries = "${=_passenv_hook_entries}"
+            register = ZSH_REGISTER
+        else:
+            read = "read -rd '' -a _passenv_hook_entries < \"$dir/@MARKER@\""
+            entries = '"${_passenv_hook_entries[@]}"'
+            register = BASH_REGISTER
+        hook = POSIX_HOOK.replace("@READ_ENTRIES@", read).replace("@ENTRIES@", entries) + register
+
+    hook = hook.replace("@MARKER@", MARKER).replace("@RUNTIME@", shlex.quote(runtime_dir()))
+    return shell_function(shell) + hook
+
+
+def data_dir() -> str:
+    """Return the passenv data directory under $XDG_DATA_HOME"""
+    base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "passenv")
+
+
+def find_marker(path: str) -> str:
+    """Return the marker at path, or the nearest one in the directories above it"""
+    if os.path.isfile(path):
+        return os.path.realpath(path)
+    directory = os.path.realpath(path)
+    while True:
+        marker = os.path.join(directory, MARKER)
+        if os.path.isfile(marker):
+            return marker
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise RuntimeError(f"No {MARKER} file in {path} or the directories above it")
+        directory = parent
+
+
+def _allow_path(marker: str) -> str:
+    digest = hashlib.sha256(os.path.realpath(marker).encode()).hexdigest()
+    return os.path.join(data_dir(), "allow", digest)
+
+
+def _read_marker(marker: str) -> bytes:
+    try:
+        with open(marker, "rb") as f:
+            return f.read()
+    except OSError as e:
+        raise RuntimeError(f"Cannot read {marker}: {e.strerror}")
+
+
+def allow(marker: str) -> List[str]:
+    """Let the prompt hook load the entries the marker names now, which it returns
+
+    Like `direnv allow`, the record holds the marker's content hash, so a marker that
+    is changed afterwards has to be allowed again.
+    """
+    content = _read_marker(marker)
+    path = _allow_path(marker)
+    ensure_private_dir(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(f"{hashlib.sha256(content).hexdigest()} {os.path.realpath(marker)}\n")
+    return content.decode().split()
+
+
+def deny(marker: str) -> bool:
+    """Forget that the marker was allowed, returning whether it was"""
+    try:
+        os.unlink(_allow_path(marker))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def marker_entries(marker: str) -> List[str]:
+    """Return the entries the marker names, if it was allowed with this content"""
+    content = _read_marker(marker)
+    try:
+        with open(_allow_path(marker)) as f:
+            allowed = f.read().split(" ", 1)[0]
+    except OSError:
+        allowed = ""
+    if allowed != hashlib.sha256(content).hexdigest():
+        directory = os.path.dirname(os.path.abspath(marker))
+        raise RuntimeError(
+            f"{marker} is not allowed; run 'passenv allow' in {directory} to load its entries"
+        )
+    return content.decode().split()
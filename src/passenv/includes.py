@@ -0,0 +1,114 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from .parser import EnvParser, ParseError
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .pass_client import PassClient
+
+
+class IncludeResolver:
+    """Resolve entries and the entries they @include, decrypting each one only once
+
+    Includes form a graph that is fetched a level at a time, every entry of a level
+    through one PassClient.get_entries call so independent includes are decrypted
+    concurrently. Entries are then merged depth first, which finds cycles, and the
+    variables of each entry are kept so an entry included from several places (a
+    diamond) is only parsed once. A resolver holds decrypted secrets, so it is meant
+    to live for one command. It can be shared between threads.
+    """
+
+    def __init__(self, pass_client: "PassClient", parser: Optional[EnvParser] = None) -> None:
+        import threading
+
+        self.pass_client = pass_client
+        self.parser = parser or EnvParser()
+        self._contents: Dict[str, "Future[str]"] = {}
+        self._variables: Dict[str, Dict[str, str]] = {}
+        self._includes: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, pass_paths: Sequence[str]) -> None:
+        """Decrypt pass_paths and everything they include, transitively"""
+        level = list(dict.fromkeys(pass_paths))
+        seen = set(level)
+        while level:
+            self._fetch_level(level)
+            next_level = []
+            for parent in level:
+                for path in self._includes_of(parent):
+                    if path not in seen:
+                        seen.add(path)
+                        next_level.append(path)
+            level = next_level
+
+    def _fetch_level(self, pass_paths: List[str]) -> None:
+        from concurrent.futures import Future
+
+        # Claim the entries nobody is fetching yet; the others are waited for below
+        with self._lock:
+            claimed = [path for path in pass_paths if path not in self._contents]
+            for path in claimed:
+                self._contents[path] = Future()
+
+        if claimed:
+            try:
+                # Failed entries come back as their exception, the others stay usable
+                contents = self.pass_client.get_entries(claimed, return_exceptions=True)
+            except Exception as error:
+                contents = [error] * len(claimed)
+            for path, content in zip(claimed, contents):
+                if isinstance(content, Exception):
+                    self._contents[path].set_exception(content)
+                else:
+                    self._contents[path].set_result(content)
+
+        for path in pass_paths:
+            self._contents[path].exception()
+
+    def content(self, pass_path: str) -> str:
+        """Return the decrypted entry, fetching it if needed"""
+        if pass_path not in self._contents:
+            self._fetch_level([pass_path])
+        return self._contents[pass_path].result()
+
+    def _includes_of(self, pass_path: str) -> List[str]:
+        future = self._contents[pass_path]
+        if future.exception() is not None:
+            return []
+        if pass_path not in self._includes:
+            self._includes[pass_path] = self.parser.includes(future.result())
+        return self._includes[pass_path]
+
+    def variables(self, pass_path: str, _chain: Tuple[str, ...] = ()) -> Dict[str, str]:
+        """Return the entry's variables with its includes merged in"""
+        if pass_path in _chain:
+            cycle = " -> ".join(f"'{path}'" for path in (*_chain, pass_path))
+            raise ValueError(f"Include cycle: {cycle}")
+
+        variables = self._variables.get(pass_path)
+        if variables is None:
+            chain = (*_chain, pass_path)
+            content = self.content(pass_path)
+            try:
+                variables = self.parser.parse(content, lambda path: self.variables(path, chain))
+            except ParseError as e:
+                # Errors in the included entry itself; the ones of entries it includes
+                # have already been given their own context
+                if not _chain:
+                    raise
+                raise ValueError(f"In '{pass_path}' included from '{_chain[-1]}': {e}") from e
+            self._variables[pass_path] = variables
+        return variables
+
+    def included(self, pass_paths: Sequence[str]) -> List[str]:
+        """Return the entries pass_paths include, directly or not, excluding pass_paths"""
+        found = set()
+        pending = list(pass_paths)
+        while pending:
+            for path in self._includes_of(pending.pop()):
+                if path not in found and path not in pass_paths:
+                    found.add(path)
+                    pending.append(path)
+        return sorted(found)
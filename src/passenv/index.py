@@ -0,0 +1,263 @@
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from .store import iter_store_entries
+
+INDEX_MAGIC = b"PENVIDX1"
+
+# magic, validator length, entry count, blob length
+_HEADER = struct.Struct("<8sIII")
+
+# Most fuzzy matches worth offering at once
+FUZZY_LIMIT = 50
+
+# Characters after which a matched character starts a word of the path
+_WORD_SEPARATORS = "/-_. "
+
+
+def cache_dir() -> str:
+    """Return the passenv cache directory under $XDG_CACHE_HOME"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "passenv")
+
+
+def index_path(root: str) -> str:
+    """Return the index file used for the store at root"""
+    digest = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"index-{digest}")
+
+
+def _git_head(root: str) -> Optional[str]:
+    """Return the commit the store's git HEAD points to, if the store is a git repository"""
+    git_dir = os.path.join(root, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+
+    if not head.startswith("ref: "):
+        return head
+
+    ref = head[5:]
+    try:
+        with open(os.path.join(git_dir, ref)) as f:
+            return f.read().strip()
+    except OSError:
+        pass
+
+    try:
+        with open(os.path.join(git_dir, "packed-refs")) as f:
+            for line in f:
+                sha, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+
+    # Unborn branch: no commit to key the index on
+    return None
+
+
+def _scan(root: str) -> Tuple[List[bytes], List[str]]:
+    """Walk the store once, returning sorted encoded entries and directory stamps"""
+    stamps: List[str] = []
+
+    def stamp(relative: str, st: os.stat_result) -> None:
+        stamps.append(f"{st.st_mtime_ns} {relative}")
+
+    entries = [path.encode() for path in iter_store_entries(root, stamp)]
+    entries.sort()
+    return entries, stamps
+
+
+def _is_current(root: str, validator: str) -> bool:
+    """Check a stored validator against the store without listing any directory"""
+    kind, _, rest = validator.partition("\n")
+    if kind.startswith("git "):
+        return kind[4:] == _git_head(root)
+
+    for stamp in rest.splitlines():
+        mtime_ns, _, relative = stamp.partition(" ")
+        try:
+            if os.stat(os.path.join(root, relative)).st_mtime_ns != int(mtime_ns):
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class EntryIndex:
+    """Sorted, mmap-backed index of the entry paths in a password store
+
+    The file holds a header, a validator describing the store state it was built
+    from, an array of offsets and the concatenated UTF-8 entry paths in byte order,
+    so prefix lookups are a binary search over the mapped file.
+    """
+
+    def __init__(self, data: Union[bytes, mmap.mmap]) -> None:
+        magic, validator_len, count, blob_len = _HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a passenv index file")
+
+        view = memoryview(data)
+        validator_start = _HEADER.size
+        offsets_start = validator_start + validator_len + (-validator_len % 4)
+        blob_start = offsets_start + 4 * (count + 1)
+
+        self.validator = bytes(view[validator_start:offsets_start]).decode().rstrip("\0")
+        self._offsets = view[offsets_start:blob_start].cast("I")
+        blob_end = blob_start + blob_len
+        self._blob = view[blob_start:blob_end]
+        self._count = count
+
+    @classmethod
+    def build(cls, root: str) -> bytes:
+        """Scan the store at root and return the serialized index"""
+        entries, stamps = _scan(root)
+        head = _git_head(root) if os.path.isdir(os.path.join(root, ".git")) else None
+        validator = (f"git {head}" if head else "dirs\n" + "\n".join(stamps)).encode()
+
+        return _serialize(entries, validator)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[str]) -> "EntryIndex":
+        """Index entries listed some other way than scanning a store, such as `pass ls`"""
+        return cls(_serialize(sorted(entry.encode() for entry in entries), b""))
+
+    @classmethod
+    def load(cls, root: str) -> "EntryIndex":
+        """Open the cached index for root, rebuilding it when the store has changed"""
+        path = index_path(root)
+        try:
+            with open(path, "rb") as f:
+                index = cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            if _is_current(root, index.validator):
+                return index
+        except (OSError, ValueError, struct.error):
+            pass
+
+        data = cls.build(root)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # A read-only cache only costs the rebuild on the next lookup
+            pass
+        return cls(data)
+
+    def __len__(self) -> int:
+        return int(self._count)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._entry(i).decode()
+
+    def _entry(self, i: int) -> bytes:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._blob[start:end])
+
+    def _bisect(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix(self, prefix: str) -> List[str]:
+        """Return all entries starting with prefix, in sorted order"""
+        key = prefix.encode()
+        matches = []
+        for i in range(self._bisect(key), self._count):
+            entry = self._entry(i)
+            if not entry.startswith(key):
+                break
+            matches.append(entry.decode())
+        return matches
+
+    def segments(self, prefix: str) -> List[str]:
+        """Complete prefix by one path segment: the entries it is the start of, and the
+        directories it is the start of with a trailing slash, in sorted order
+
+        The sorted paths form an implicit trie, every directory being one run of them,
+        so each directory is skipped with a binary search. The cost grows with the
+        number of results rather than with the size of the store.
+        """
+        key = prefix.encode()
+        segment_start = len(key)
+        matches = []
+        i = self._bisect(key)
+        while i < self._count:
+            entry = self._entry(i)
+            if not entry.startswith(key):
+                break
+            slash = entry.find(b"/", segment_start)
+            if slash == -1:
+                matches.append(entry.decode())
+                i += 1
+                continue
+            directory_end = slash + 1
+            matches.append(entry[:directory_end].decode())
+            # "0" follows "/", so this is where the entries below the directory end
+            i = self._bisect(entry[:slash] + b"0")
+        return matches
+
+    def fuzzy(self, query: str, limit: int = FUZZY_LIMIT) -> List[str]:
+        """Return up to limit entries holding the characters of query in order, best first
+
+        Unlike the other lookups this reads every entry, so it is meant as a fallback
+        when nothing starts with query.
+        """
+        query = query.lower()
+        scored = []
+        for i in range(self._count):
+            entry = self._entry(i).decode()
+            score = fuzzy_score(query, entry.lower())
+            if score is not None:
+                scored.append((-score, len(entry), entry))
+        return [entry for _, _, entry in heapq.nsmallest(limit, scored)]
+
+
+def fuzzy_score(query: str, candidate: str) -> Optional[int]:
+    """Score candidate as a match of the characters of query in order, None when it is not
+
+    Characters that follow the previous match or start a word of the path score
+    higher, characters skipped in between lower.
+    """
+    score = 0
+    position = 0
+    previous = -2
+    for char in query:
+        found = candidate.find(char, position)
+        if found == -1:
+            return None
+        if found == previous + 1:
+            score += 3
+        if found == 0 or candidate[found - 1] in _WORD_SEPARATORS:
+            score += 2
+        score -= min(found - position, 3)
+        previous = found
+        position = found + 1
+    return score
+
+
+def _serialize(entries: List[bytes], validator: bytes) -> bytes:
+    offsets = array("I", [0])
+    for entry in entries:
+        offsets.append(offsets[-1] + len(entry))
+
+    header = _HEADER.pack(INDEX_MAGIC, len(validator), len(entries), offsets[-1])
+    padding = b"\0" * (-len(validator) % 4)
+    return header + validator + padding + offsets.tobytes() + b"".join(entries)
@@ -0,0 +1,105 @@
+import os
+import re
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# ${NAME}, the start of ${NAME:-default} and the "}" ending it; $${ is an escaped,
+# literal ${, whose "}" is literal too. Defaults can hold references of their own.
+TOKEN_PATTERN = re.compile(r"\$\$\{|\$\{([A-Za-z_][A-Za-z0-9_]*)(\}|:-)|\}")
+
+
+class InterpolationError(ValueError):
+    """Raised when variables reference each other in a cycle"""
+
+
+def references(value: str) -> List[str]:
+    """Return the names value references, in order"""
+    return [match.group(1) for match in TOKEN_PATTERN.finditer(value) if match.group(1)]
+
+
+def expand(
+    variables: Mapping[str, str], environ: Optional[Mapping[str, str]] = None
+) -> Dict[str, str]:
+    """Expand ${NAME} and ${NAME:-default} in the values of variables
+
+    A name refers to another of the variables, or else to environ (os.environ by
+    default); a variable referencing itself, as in PATH=${PATH}:/opt/bin, refers to
+    environ. Unset names expand to nothing, and ${NAME:-default} to default when NAME
+    is unset or empty; defaults can reference other names, as in ${A:-${B:-none}}.
+    Values are expanded once each, dependencies first, so long chains of references
+    take linear time.
+    """
+    if environ is None:
+        environ = os.environ
+
+    templates = {name: value for name, value in variables.items() if "${" in value}
+    resolved = {name: value for name, value in variables.items() if name not in templates}
+    dependencies = {
+        name: [ref for ref in references(value) if ref in templates and ref != name]
+        for name, value in templates.items()
+    }
+
+    def lookup(name: str, referrer: str) -> Optional[str]:
+        if name == referrer or name not in variables:
+            return environ.get(name)
+        return resolved[name]
+
+    def substitute(name: str) -> str:
+        return _substitute(templates[name], lambda ref: lookup(ref, name))
+
+    # Depth first over the reference graph, without recursion so deep chains are fine
+    for root in templates:
+        if root in resolved:
+            continue
+        stack: List[Tuple[str, Iterator[str]]] = [(root, iter(dependencies[root]))]
+        on_stack = {root}
+        while stack:
+            name, pending = stack[-1]
+            for dependency in pending:
+                if dependency in resolved:
+                    continue
+                if dependency in on_stack:
+                    names = [frame[0] for frame in stack]
+                    cycle_start = names.index(dependency)
+                    cycle = names[cycle_start:] + [dependency]
+                    raise InterpolationError(f"Reference cycle: {' -> '.join(cycle)}")
+                stack.append((dependency, iter(dependencies[dependency])))
+                on_stack.add(dependency)
+                break
+            else:
+                resolved[name] = substitute(name)
+                stack.pop()
+                on_stack.discard(name)
+
+    # Keep the order of the entries
+    return {name: resolved[name] for name in variables}
+
+
+def _substitute(value: str, lookup: Callable[[str], Optional[str]]) -> str:
+    """Expand the references in value, those in defaults included, without recursion"""
+    # The reference whose default is being read, None for an escaped ${, and the
+    # text read so far; the first frame is value itself
+    frames: List[Tuple[Optional[str], List[str]]] = [(None, [])]
+    position = 0
+    for match in TOKEN_PATTERN.finditer(value):
+        start = match.start()
+        frames[-1][1].append(value[position:start])
+        position = match.end()
+        name, end = match.group(1), match.group(2)
+        if end == "}":
+            frames[-1][1].append(lookup(name) or "")
+        elif name is not None or match.group(0) == "$${":
+            frames.append((name, []))
+        elif len(frames) == 1:
+            frames[-1][1].append("}")
+        else:
+            name, parts = frames.pop()
+            text = "".join(parts)
+            frames[-1][1].append("${" + text + "}" if name is None else (lookup(name) or text))
+    frames[-1][1].append(value[position:])
+
+    # Unterminated, so kept as written, with the references inside expanded
+    while len(frames) > 1:
+        name, parts = frames.pop()
+        opening = "${" if name is None else f"${{{name}:-"
+        frames[-1][1].append(opening + "".join(parts))
+    return "".join(frames[0][1])
@@ -1,13 +1,39 @@
 import os
-from pathlib import Path
+import sys
+import time
+from typing import IO, Any, List, Optional
 
 import typer
 from typer._completion_classes import completion_init
 from typer._completion_shared import install as install_completion
-
+from typer.core import TyperCommand
+
+from .agent import (
+    DEFAULT_MAX_ENTRIES,
+    DEFAULT_TTL,
+    Agent,
+    AgentClient,
+    lock_memory,
+    socket_path,
+)
+from .backends import MAX_WORKERS
+from .bulk import export_tree
 from .completion import _detect_shell_and_rc, complete_pass_entries
-from .core import PassEnv
-from .exporters import Exporter, ExportFormat
+from .core import EXIT_NOT_EXECUTABLE, EXIT_NOT_FOUND, PassEnv
+from .exporters import Exporter, ExportFormat, stream_if_changed
+from .hook import (
+    INSTALL_COMMENT,
+    allow,
+    deny,
+    find_marker,
+    hook_script,
+    marker_entries,
+    replace_shell_function,
+    shell_function,
+)
+from .pass_client import PassClient
+from .timings import TRACE_ENV
+from .timings import enable as enable_timings
 
 app = typer.Typer(
     help="Load environment variables from pass entries",
@@ -19,22 +45,99 @@ app = typer.Typer(
 completion_init()
 
 
+@app.callback()
+def main(
+    timings: bool = typer.Option(
+        False, "--timings", help=f"Print per-phase timings to stderr (see also ${TRACE_ENV})"
+    )
+) -> None:
+    if timings:
+        enable_timings()
+
+
+def _report_conflicts(passenv: PassEnv) -> None:
+    for warning in passenv.conflict_warnings():
+        typer.echo(warning, err=True)
+
+
 @app.command()
 def load(
-    pass_path: str = typer.Argument(
-        ..., help="Pass entry path to load", autocompletion=complete_pass_entries
-    )
+    pass_paths: Optional[List[str]] = typer.Argument(
+        None,
+        help="Pass entry paths to load, later entries overriding earlier ones",
+        autocompletion=complete_pass_entries,
+    ),
+    if_changed: bool = typer.Option(
+        False,
+        "--if-changed",
+        help="Print nothing when these entries are loaded and their files are unchanged",
+    ),
+    marker: Optional[str] = typer.Option(
+        None, "--marker", help="Load the entries named by this allowed .passenv file"
+    ),
 ) -> None:
     """Load secrets to the environment"""
+    try:
+        if marker is not None:
+            if pass_paths:
+                raise ValueError("Name either entries or --marker, not both")
+            pass_paths = marker_entries(marker)
+        elif not pass_paths:
+            raise ValueError("Name the entries to load")
+        passenv = PassEnv()
+        output = passenv.load(*pass_paths, if_changed=if_changed)
+        _report_conflicts(passenv)
+        if output:
+            print(output)
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def reload() -> None:
+    """Load the current entries again if their files changed"""
+    try:
+        passenv = PassEnv()
+        output = passenv.reload()
+        _report_conflicts(passenv)
+        if output:
+            print(output)
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def push(
+    pass_paths: List[str] = typer.Argument(
+        ...,
+        help="Pass entry paths to load on top of the current environment",
+        autocompletion=complete_pass_entries,
+    )
+) -> None:
+    """Load secrets on top of the loaded ones, until pop"""
     try:
         passenv = PassEnv()
-        output = passenv.load(pass_path)
+        output = passenv.push(*pass_paths)
+        _report_conflicts(passenv)
         print(output)
     except Exception as e:
         typer.echo(f"Error: {e}", err=True)
         raise typer.Exit(1)
 
 
+@app.command()
+def pop() -> None:
+    """Unload the secrets of the last push"""
+    try:
+        passenv = PassEnv()
+        print(passenv.pop())
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
 @app.command()
 def unload() -> None:
     """Unload all secrets"""
@@ -77,36 +180,244 @@ def list() -> None:
 
 @app.command()
 def export(
-    pass_path: str = typer.Argument(
-        ..., help="Pass entry path to export", autocompletion=complete_pass_entries
+    pass_paths: List[str] = typer.Argument(
+        ...,
+        help="Pass entry paths to export, later entries overriding earlier ones",
+        autocompletion=complete_pass_entries,
     ),
     format: ExportFormat = typer.Option(ExportFormat.ENV, "--format", "-f", help="Export format"),
     output: str = typer.Option(
         None, "--output", "-o", help="Output file path (prints to stdout if not specified)"
     ),
+    recursive: bool = typer.Option(
+        False,
+        "--recursive",
+        "-r",
+        help="Export every entry under the given paths to its own file in --output-dir",
+    ),
+    output_dir: Optional[str] = typer.Option(
+        None, "--output-dir", "-d", help="Directory to mirror the store layout into"
+    ),
+    raw: bool = typer.Option(
+        False, "--raw", help="Export values as written, without expanding ${VAR} references"
+    ),
 ) -> None:
     """Export secrets from a pass entry to various formats"""
+    if recursive:
+        if output_dir is None or output:
+            typer.echo("Error: --recursive writes to --output-dir, not --output", err=True)
+            raise typer.Exit(1)
+        _export_tree(pass_paths, format, output_dir, raw)
+        return
+    if output_dir is not None:
+        typer.echo("Error: --output-dir requires --recursive", err=True)
+        raise typer.Exit(1)
+
     try:
         passenv = PassEnv()
         exporter = Exporter()
 
-        # Get the pass entry content and parse it
-        content = passenv.pass_client.get_entry(pass_path)
-        variables = passenv.parser.parse(content)
+        # Get the pass entries and merge their variables
+        variables = passenv.get_variables(*pass_paths, raw=raw)
+        _report_conflicts(passenv)
 
-        # Export to the specified format
-        exported_content = exporter.export(variables, format)
+        # Stream to the specified format rather than building the whole document
+        def render(stream: IO[bytes]) -> None:
+            exporter.export_to(variables, format, stream)
 
         if output:
-            # Write to file
-            output_path = Path(output)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_text(exported_content)
-            typer.echo(f"Exported {len(variables)} variables to {output_path}")
+            # Write to file, leaving it untouched when nothing changed
+            if stream_if_changed(output, render):
+                typer.echo(f"Exported {len(variables)} variables to {output}")
+            else:
+                typer.echo(f"{output} is unchanged ({len(variables)} variables)")
         else:
             # Print to stdout
-            print(exported_content)
+            exporter.export_to(variables, format, sys.stdout)
+            print()
+
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+def _export_tree(
+    prefixes: List[str], format: ExportFormat, output_dir: str, raw: bool = False
+) -> None:
+    start = time.perf_counter()
+    try:
+        results = export_tree(PassClient(), prefixes, output_dir, format, raw=raw)
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    failed = [result for result in results if result.error is not None]
+    unchanged = [result for result in results if result.error is None and not result.changed]
+    for result in results:
+        if result.error is None:
+            typer.echo(
+                f"{result.seconds * 1000:8.1f}ms  {result.entry} -> {result.output} "
+                f"({result.variables} variables{'' if result.changed else ', unchanged'})"
+            )
+    for result in failed:
+        typer.echo(f"Failed: {result.entry}: {result.error}", err=True)
+
+    summary = (
+        f"Exported {len(results) - len(failed)} of {len(results)} entries to {output_dir} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    if unchanged:
+        summary += f", {len(unchanged)} unchanged"
+    if failed:
+        typer.echo(f"{summary}, {len(failed)} failed", err=True)
+        raise typer.Exit(1)
+    typer.echo(summary)
+
+
+class ExecCommand(TyperCommand):
+    """Keep the arguments after -- for the command to run instead of parsing them"""
+
+    def parse_args(self, ctx: Any, args: List[str]) -> List[str]:
+        if "--" in args:
+            split = args.index("--")
+            command_start = split + 1
+            args, ctx.meta["command"] = args[:split], args[command_start:]
+        return super().parse_args(ctx, args)
+
+
+@app.command("exec", cls=ExecCommand)
+def exec_(
+    ctx: typer.Context,
+    pass_paths: List[str] = typer.Argument(
+        ...,
+        help="Pass entry paths, later entries overriding earlier ones, then -- and the command",
+        autocompletion=complete_pass_entries,
+    ),
+    clean_env: bool = typer.Option(
+        False, "--clean-env", help="Run the command with only the entries' variables"
+    ),
+) -> None:
+    """Run a command with secrets in its environment"""
+    command = ctx.meta.get("command")
+    if not command:
+        typer.echo("Error: Missing command. Usage: passenv exec ENTRY... -- COMMAND", err=True)
+        raise typer.Exit(2)
+
+    try:
+        passenv = PassEnv()
+        env = passenv.environment(*pass_paths, clean=clean_env)
+        _report_conflicts(passenv)
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    try:
+        passenv.exec_command(command, env)
+    except OSError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(
+            EXIT_NOT_FOUND if isinstance(e, FileNotFoundError) else EXIT_NOT_EXECUTABLE
+        )
+
+
+@app.command()
+def agent(
+    ttl: float = typer.Option(
+        DEFAULT_TTL, "--ttl", help="Seconds a decrypted entry is kept in memory"
+    ),
+    max_entries: int = typer.Option(
+        DEFAULT_MAX_ENTRIES, "--max-entries", help="Maximum number of entries kept in memory"
+    ),
+    stop: bool = typer.Option(False, "--stop", help="Stop the running agent"),
+) -> None:
+    """Run an agent that keeps decrypted entries in memory"""
+    try:
+        if stop:
+            if AgentClient().request({"op": "stop"}) is None:
+                raise RuntimeError("No agent is running")
+            typer.echo("Agent stopped")
+            return
+
+        if not lock_memory():
+            typer.echo("Warning: could not lock agent memory, secrets may be swapped", err=True)
+
+        typer.echo(f"Agent listening on {socket_path()}", err=True)
+        Agent(PassClient(use_agent=False), ttl=ttl, max_entries=max_entries).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def serve(
+    stdio: bool = typer.Option(False, "--stdio", help="Read requests from stdin"),
+    socket: Optional[str] = typer.Option(
+        None, "--socket", help="Listen for connections on a Unix socket at this path instead"
+    ),
+    workers: int = typer.Option(
+        MAX_WORKERS, "--workers", help="Maximum number of requests handled at once"
+    ),
+) -> None:
+    """Answer JSON-lines get, list and export requests, for jobs calling passenv many times"""
+    if stdio == bool(socket):
+        typer.echo("Error: serve needs either --stdio or --socket", err=True)
+        raise typer.Exit(1)
 
+    from .serve import Server
+
+    try:
+        server = Server(workers=workers)
+        if socket:
+            typer.echo(f"Serving on {socket}", err=True)
+            server.serve_socket(socket)
+        else:
+            server.serve_stdio()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def hook(
+    shell: str = typer.Argument(..., help="Shell to print the hook for: bash, zsh or fish")
+) -> None:
+    """Print the shell function plus a prompt hook loading the entries named in .passenv"""
+    try:
+        print(hook_script(shell))
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command("allow")
+def allow_marker(
+    path: str = typer.Argument(".", help=".passenv file, or a directory in its project")
+) -> None:
+    """Let the prompt hook load the entries a .passenv file names"""
+    try:
+        marker = find_marker(path)
+        entries = allow(marker)
+        typer.echo(f"Allowed {marker}: {' '.join(entries) or 'no entries'}")
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+@app.command("deny")
+def deny_marker(
+    path: str = typer.Argument(".", help=".passenv file, or a directory in its project")
+) -> None:
+    """Stop the prompt hook loading the entries a .passenv file names"""
+    try:
+        marker = find_marker(path)
+        if deny(marker):
+            typer.echo(f"Denied {marker}")
+        else:
+            typer.echo(f"{marker} was not allowed")
     except Exception as e:
         typer.echo(f"Error: {e}", err=True)
         raise typer.Exit(1)
@@ -129,36 +440,40 @@ def install(
     typer.echo(f"🔍 Detected shell: {detected_shell}")
 
     # Install shell function so we can export env vars
-    shell_function = """
-passenv() {
-    case "$1" in
-        load|unload)
-            eval $(command passenv "$@")
-            ;;
-        *)
-            command passenv "$@"
-            ;;
-    esac
-}
-"""
+    function = shell_function(detected_shell)
 
     if not rc_file:
         typer.echo(f"⚠️  Unsupported shell: {detected_shell}")
         typer.echo("Add this function to your shell RC file:")
-        typer.echo(shell_function)
+        typer.echo(function)
         if not skip_completion:
             typer.echo("\nFor shell completion, try:")
             typer.echo("passenv install --shell bash  # or zsh, fish, powershell")
         return
 
-    # Check if shell function already exists
+    # Check if shell function already exists, and whether it is the current one
     function_exists = False
     if os.path.exists(rc_file):
         with open(rc_file, "r") as f:
             content = f.read()
-        if "passenv() {" in content:
+        if function.strip() in content:
             typer.echo(f"✅ passenv function already exists in {rc_file}")
             function_exists = True
+        elif "passenv() {" in content or "function passenv" in content:
+            function_exists = True
+            updated = replace_shell_function(content, function)
+            if updated is not None:
+                with open(rc_file, "w") as f:
+                    f.write(updated)
+                typer.echo(f"✅ passenv function updated in {rc_file}")
+            else:
+                typer.secho(
+                    f"⚠️  {rc_file} defines its own passenv function, which may not handle"
+                    f" every command. Replace it with the function `passenv hook {detected_shell}`"
+                    " prints, or load that whole output from the rc file to also load"
+                    " entries on cd.",
+                    fg=typer.colors.YELLOW,
+                )
 
     # Add function to rc file if it doesn't exist
     if not function_exists:
@@ -166,7 +481,7 @@ passenv() {
         os.makedirs(os.path.dirname(rc_file), exist_ok=True)
 
         with open(rc_file, "a") as f:
-            f.write(f"\n# Added by passenv\n{shell_function}")
+            f.write(f"\n{INSTALL_COMMENT}\n{function}")
         typer.echo(f"✅ Shell function added to {rc_file}")
 
     # Install shell completion unless skipped
@@ -1,46 +1,127 @@
 import re
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
+# Matches once per line: an assignment to a valid name (key, value), an @include of
+# another entry (include), a comment, or anything else (other), which is either blank
+# or an error. Leading whitespace other than newlines is skipped; trailing whitespace
+# is left on value, include and other.
+LINE_PATTERN = re.compile(
+    r"^[^\S\n]*(?:"
+    r"([A-Za-z_][A-Za-z0-9_]*)[^\S\n]*=[^\S\n]*([^\n]*)"
+    r"|@include(?=\s|$)[^\S\n]*([^\n]*)"
+    r"|#[^\n]*"
+    r"|([^\n]*)"
+    r")",
+    re.MULTILINE,
+)
 
-class EnvParser:
-    VAR_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+INCLUDE_PATTERN = re.compile(r"^[^\S\n]*@include(?=\s|$)[^\S\n]*([^\n]*)", re.MULTILINE)
 
-    def parse(self, content: str) -> Dict[str, str]:
-        variables = {}
-        lines = content.split("\n")
+# Returns the variables of an included entry
+IncludeHandler = Callable[[str], Dict[str, str]]
 
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
+QUOTES = ('"', "'")
 
-            # Skip empty lines and comments
-            if not line or line.startswith("#"):
-                continue
 
-            # Check for key=value format
-            if "=" not in line:
-                raise ValueError(f"Invalid line {line_num}: '{line}' - missing '='")
+class LineError(NamedTuple):
+    """A line that is not a comment or a KEY=VALUE assignment, with 1-based positions"""
 
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip()
+    line: int
+    column: int
+    message: str
 
-            # Validate variable name
-            if not self.VAR_NAME_PATTERN.match(key):
-                raise ValueError(f"Invalid variable name '{key}' on line {line_num}")
 
-            # Remove quotes if present
-            if value.startswith('"') and value.endswith('"'):
-                value = value[1:-1]
-            elif value.startswith("'") and value.endswith("'"):
-                value = value[1:-1]
+class ParseError(ValueError):
+    """Raised with every invalid line of an entry, not only the first"""
 
-            variables[key] = value
+    def __init__(self, errors: List[LineError]) -> None:
+        super().__init__("\n".join(error.message for error in errors))
+        self.errors = errors
+
+
+class EnvParser:
+    VAR_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+    def parse(self, content: str, include: Optional[IncludeHandler] = None) -> Dict[str, str]:
+        """Parse KEY=VALUE lines; @include lines merge in include(path) at that point"""
+        variables = {}
+
+        # The common case in a single pass and without tracking line numbers; only
+        # an invalid line sends us back over the content to report every error
+        for key, value, path, other in map(re.Match.groups, LINE_PATTERN.finditer(content)):
+            if key:
+                value = value.rstrip()
+                # Remove quotes if present
+                if value[:1] in QUOTES and value.endswith(value[0]):
+                    value = value[1:-1]
+                variables[key] = value
+            elif other or (path is not None and (include is None or not path.strip())):
+                errors: List[LineError] = []
+                for _ in self.iter_parse(content, errors, include):
+                    pass
+                raise ParseError(errors)
+            elif path is not None:
+                assert include is not None
+                variables.update(include(path.rstrip()))
 
         if not variables:
             raise ValueError("Pass entry contains no valid environment variables")
 
         return variables
 
+    def iter_parse(
+        self,
+        content: str,
+        errors: Optional[List[LineError]] = None,
+        include: Optional[IncludeHandler] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """Yield each (key, value) assignment in order as the content is scanned
+
+        Invalid lines raise ParseError, unless an errors list is given to collect
+        them in, in which case parsing carries on with the next line. Included
+        entries' variables are yielded where their @include line is.
+        """
+        for line_num, match in enumerate(LINE_PATTERN.finditer(content), 1):
+            key, value, path, other = match.groups()
+            if key:
+                value = value.rstrip()
+                if value[:1] in QUOTES and value.endswith(value[0]):
+                    value = value[1:-1]
+                yield key, value
+                continue
+
+            error = None
+            line = match.group()
+            column = len(line) - len(line.lstrip()) + 1
+            if other:
+                error = self._line_error(other.rstrip(), line_num, column)
+            elif path is not None and not path.strip():
+                message = f"Missing entry path after @include on line {line_num}"
+                error = LineError(line_num, column, message)
+            elif path is not None and include is None:
+                message = f"@include is not supported here, on line {line_num}"
+                error = LineError(line_num, column, message)
+            elif path is not None:
+                assert include is not None
+                yield from include(path.rstrip()).items()
+
+            if error is not None:
+                if errors is None:
+                    raise ParseError([error])
+                errors.append(error)
+
+    def includes(self, content: str) -> List[str]:
+        """Return the entries content includes, in order, without parsing the rest"""
+        return [path.rstrip() for path in INCLUDE_PATTERN.findall(content) if path.strip()]
+
+    def _line_error(self, line: str, line_num: int, column: int) -> LineError:
+        if "=" not in line:
+            message = f"Invalid line {line_num}: '{line}' - missing '='"
+        else:
+            key = line.split("=", 1)[0].rstrip()
+            message = f"Invalid variable name '{key}' on line {line_num}"
+        return LineError(line_num, column, message)
+
     def validate_variables(self, variables: Dict[str, str]) -> None:
         for key, value in variables.items():
             if not self.VAR_NAME_PATTERN.match(key):
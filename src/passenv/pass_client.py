@@ -1,97 +1,61 @@
-import shutil
-import subprocess
-from typing import List
+import os
+from typing import Iterator, List, Optional, Union
+
+from .agent import AgentClient
+from .backends import (
+    BACKEND_ENV,
+    MAX_WORKERS,
+    Backend,
+    EntryStat,
+    entry_getter,
+    get_backend,
+)
 
 
 class PassClient:
-    def __init__(self) -> None:
-        if not shutil.which("pass"):
-            raise RuntimeError("'pass' command not found. Please install pass.")
+    def __init__(self, use_agent: bool = True, backend: Optional[Backend] = None) -> None:
+        # Served from a running `passenv agent` when there is one, unless a
+        # specific backend was asked for
+        explicit = backend is not None or os.environ.get(BACKEND_ENV, "auto") != "auto"
+        self.agent = AgentClient.find() if use_agent and not explicit else None
+        self.backend = backend or get_backend()
 
     def get_entry(self, path: str) -> str:
-        try:
-            result = subprocess.run(
-                ["pass", "show", path], capture_output=True, text=True, check=True
-            )
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            if e.returncode == 1:
-                raise RuntimeError(f"Pass entry '{path}' not found.")
-            raise RuntimeError(f"Pass command failed: {e.stderr}")
-
-    def list_entries(self) -> List[str]:
-        try:
-            result = subprocess.run(["pass", "ls"], capture_output=True, text=True, check=True)
-            return self._parse_pass_list(result.stdout)
-        except subprocess.CalledProcessError as e:
-            if "not a git repository" in e.stderr or "not initialized" in e.stderr:
-                raise RuntimeError("Pass store not initialized.")
-            raise RuntimeError(f"Pass command failed: {e.stderr}")
-
-    def _parse_pass_list(self, output: str) -> List[str]:
-        entries = []
-        lines = output.split("\n")
+        if self.agent is not None:
+            content = self.agent.get_entry(path)
+            if content is not None:
+                return content
 
-        # First pass: clean all lines and calculate depths
-        cleaned_lines = []
-        for line in lines:
-            if not line or line.strip().startswith("Password Store"):
-                continue
+        return self.backend.get_entry(path)
 
-            # Remove ANSI color codes
-            import re
+    def get_entries(
+        self, paths: List[str], return_exceptions: bool = False
+    ) -> List[Union[str, Exception]]:
+        """Fetch several entries concurrently, returning their contents in order
 
-            clean_line = re.sub(r"\x1b\[[0-9;]*m", "", line)
+        With return_exceptions, an entry that fails is returned as its exception.
+        """
+        if self.agent is None:
+            return self.backend.get_entries(paths, return_exceptions=return_exceptions)
+        get = entry_getter(self.get_entry, return_exceptions)
+        if len(paths) <= 1:
+            return [get(path) for path in paths]
 
-            # Replace non-breaking spaces with regular spaces
-            clean_line = clean_line.replace("\xa0", " ")
+        from concurrent.futures import ThreadPoolExecutor
 
-            # Calculate depth by counting leading tree characters
-            depth = 0
-            temp_line = clean_line
+        with ThreadPoolExecutor(max_workers=min(len(paths), MAX_WORKERS)) as executor:
+            return list(executor.map(get, paths))
 
-            while temp_line:
-                if temp_line.startswith("├── ") or temp_line.startswith("└── "):
-                    depth += 1
-                    temp_line = temp_line[4:]
-                elif temp_line.startswith("│   "):
-                    depth += 1
-                    temp_line = temp_line[4:]
-                elif temp_line.startswith("    "):
-                    depth += 1
-                    temp_line = temp_line[4:]
-                else:
-                    break
-
-            item_name = temp_line.strip()
-            if item_name:
-                # Adjust depth to be 0-based (root items are depth 0)
-                cleaned_lines.append((depth - 1, item_name))
-
-        # Second pass: build the tree structure
-        path_stack: list = []
-
-        for i, (depth, item_name) in enumerate(cleaned_lines):
-            # Check if this is a directory by looking at the next line
-            is_directory = False
-            if i + 1 < len(cleaned_lines):
-                next_depth, _ = cleaned_lines[i + 1]
-                if next_depth > depth:
-                    is_directory = True
+    def list_entries(self) -> List[str]:
+        if self.agent is not None:
+            entries = self.agent.list_entries()
+            if entries is not None:
+                return entries
 
-            # Adjust path stack to current depth
-            # Remove items from stack that are at same or deeper level
-            path_stack = path_stack[:depth]
+        return self.backend.list_entries()
 
-            if is_directory:
-                # It's a directory, add to path stack
-                path_stack.append(item_name)
-            else:
-                # It's a password entry
-                if path_stack:
-                    full_path = "/".join(path_stack + [item_name])
-                else:
-                    full_path = item_name
-                entries.append(full_path)
+    def iter_entries(self) -> Iterator[str]:
+        return self.backend.iter_entries()
 
-        return entries
+    def stat_entry(self, path: str) -> Optional[EntryStat]:
+        return self.backend.stat_entry(path)
@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .backends import MAX_WORKERS
+from .core import PassEnv
+from .exporters import Exporter, ExportFormat, stream_if_changed
+from .pass_client import PassClient
+
+
+class Server:
+    """Answer JSON-lines requests with the CLI's machinery, for jobs that would
+    otherwise run passenv hundreds of times
+
+    Each request is an object with an "op" (get, list, export or ping) and an optional
+    "id" that is copied into its response, as requests are handled concurrently and
+    answered in the order they finish. Responses carry "ok" and either the result or
+    an "error", the same way the agent's do.
+    """
+
+    def __init__(
+        self, pass_client: Optional[PassClient] = None, workers: int = MAX_WORKERS
+    ) -> None:
+        self.pass_client = pass_client or PassClient()
+        self.exporter = Exporter()
+        self.workers = workers
+        self._server: Any = None
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        try:
+            if op == "get":
+                passenv = PassEnv(self.pass_client)
+                variables = self._variables(passenv, request)
+                return {"ok": True, "variables": variables, **self._warnings(passenv)}
+            if op == "export":
+                return self._export(request)
+            if op == "list":
+                return {"ok": True, "entries": self.pass_client.list_entries()}
+            if op == "ping":
+                return {"ok": True}
+            return {"ok": False, "error": f"Unknown request: {op}"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _variables(self, passenv: PassEnv, request: Dict[str, Any]) -> Dict[str, str]:
+        paths = request.get("paths")
+        if not isinstance(paths, list) or not paths:
+            raise ValueError("Request needs a non-empty list of entry paths in 'paths'")
+        return passenv.get_variables(*paths, raw=bool(request.get("raw", False)))
+
+    def _export(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            format = ExportFormat(request.get("format", ExportFormat.ENV.value))
+        except ValueError:
+            formats = ", ".join(f.value for f in ExportFormat)
+            raise ValueError(f"Unsupported format '{request.get('format')}'. Use {formats}.")
+
+        passenv = PassEnv(self.pass_client)
+        variables = self._variables(passenv, request)
+        output = request.get("output")
+        if output:
+            changed = stream_if_changed(
+                output, lambda stream: self.exporter.export_to(variables, format, stream)
+            )
+            return {"ok": True, "output": output, "changed": changed, **self._warnings(passenv)}
+        content = self.exporter.export(variables, format)
+        return {"ok": True, "content": content, **self._warnings(passenv)}
+
+    def _warnings(self, passenv: PassEnv) -> Dict[str, List[str]]:
+        warnings = passenv.conflict_warnings()
+        return {"warnings": warnings} if warnings else {}
+
+    def respond(self, line: str) -> str:
+        """Answer one request line with one response line"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get("id")
+            response = self.handle(request)
+        except ValueError as e:
+            response = {"ok": False, "error": f"Invalid request: {e}"}
+        return json.dumps({"id": request_id, **response}) + "\n"
+
+    def serve_lines(
+        self, lines: Iterable[str], write: Callable[[str], None], executor: ThreadPoolExecutor
+    ) -> None:
+        """Handle lines concurrently on executor, returning once all of them are answered
+
+        At most workers requests are in flight: the next line is only read once one
+        of them is answered, so a client sending faster than we answer is held back
+        instead of queueing without bound.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        lock = threading.Lock()
+
+        def answer(line: str) -> None:
+            response = self.respond(line)
+            with lock:
+                write(response)
+
+        pending: Set["Future[None]"] = set()
+        for line in lines:
+            if not line.strip():
+                continue
+            if len(pending) >= self.workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(answer, line))
+        for future in pending:
+            future.result()
+
+    def serve_stdio(
+        self, stdin: Optional[IO[str]] = None, stdout: Optional[IO[str]] = None
+    ) -> None:
+        """Serve requests from stdin until it is closed"""
+        output = stdout or sys.stdout
+
+        def write(response: str) -> None:
+            output.write(response)
+            output.flush()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            self.serve_lines(stdin or sys.stdin, write, executor)
+
+    def serve_socket(self, path: str) -> None:
+        """Serve every connection to a Unix socket at path until shutdown()"""
+        import socketserver
+
+        server = self
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                lines = (line.decode() for line in self.rfile)
+
+                def write(response: str) -> None:
+                    self.wfile.write(response.encode())
+
+                server.serve_lines(lines, write, executor)
+
+        if os.path.lexists(path):
+            import socket
+            import stat
+
+            st = os.lstat(path)
+            # Only ever replace a stale socket of ours, never a file the path named by mistake
+            if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+                raise RuntimeError(f"{path} exists and is not a socket of yours")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                if sock.connect_ex(path) == 0:
+                    raise RuntimeError(f"Something is already listening on {path}")
+            os.unlink(path)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon_threads = True
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            executor.shutdown(wait=False, cancel_futures=True)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
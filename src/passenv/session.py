@@ -0,0 +1,171 @@
+import os
+from typing import List, NamedTuple, Optional
+
+from .agent import _is_private, ensure_private_dir, runtime_dir
+from .parser import EnvParser
+
+SESSION_KEY = "PASSENV_SESSION"
+
+# Tracking variables written by versions that kept the state in the environment
+LEGACY_VARS_KEY = "PASSENV_LOADED_VARS"
+LEGACY_SOURCE_KEY = "PASSENV_SOURCE"
+LEGACY_FINGERPRINT_KEY = "PASSENV_FINGERPRINT"
+
+STATE_VERSION = 1
+
+# Every change writes a new state file, and shells that exit leave theirs behind; those
+# not written or touched for this long are removed
+STATE_MAX_AGE = 7 * 24 * 3600
+
+
+class Layer(NamedTuple):
+    """Entries loaded together, with the fingerprint of their files at load time
+
+    The fingerprint covers the entries they @include as well, listed in includes.
+    """
+
+    sources: List[str]
+    fingerprint: str = ""
+    includes: List[str] = []
+
+
+class SessionState:
+    """What passenv has loaded into one shell session
+
+    The state lives in a small JSON file in the runtime directory, named after the
+    session id the shell carries in $PASSENV_SESSION, so the environment only grows by
+    that one variable however much is loaded. Secrets are never written to it.
+    """
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        layers: Optional[List[Layer]] = None,
+        variables: Optional[List[str]] = None,
+    ) -> None:
+        self.session_id = session_id
+        self.layers = layers or []
+        self.variables = variables or []
+
+    @classmethod
+    def load(cls) -> "SessionState":
+        """Read the current session's state, falling back to the legacy variables
+
+        The names end up in commands the shell evaluates, so a state naming anything
+        but variables, or one in a runtime directory others can write to, is treated
+        as missing.
+        """
+        session_id = os.environ.get(SESSION_KEY, "")
+        if _valid_id(session_id):
+            if _is_private(runtime_dir()):
+                return cls._read(session_id)
+            return cls(session_id)
+
+        if LEGACY_VARS_KEY in os.environ:
+            variables = [var.strip() for var in os.environ[LEGACY_VARS_KEY].split(",")]
+            sources = os.environ.get(LEGACY_SOURCE_KEY, "").split(",")
+            layer = Layer(
+                [source for source in sources if source],
+                os.environ.get(LEGACY_FINGERPRINT_KEY, ""),
+            )
+            variables = [var for var in variables if var]
+            if _valid_names(variables):
+                return cls(None, [layer], variables)
+        return cls()
+
+    @classmethod
+    def _read(cls, session_id: str) -> "SessionState":
+        import json
+
+        try:
+            with open(state_path(session_id)) as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                layers = [
+                    Layer(layer["sources"], layer["fingerprint"], layer.get("includes", []))
+                    for layer in data["layers"]
+                ]
+                if _valid_names(data["variables"]):
+                    return cls(session_id, layers, data["variables"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return cls(session_id)
+
+    def save(self) -> str:
+        """Write the state atomically under a new session id, which it returns
+
+        A child shell inherits $PASSENV_SESSION, so the file it was read from may still
+        be the state of the parent; writing elsewhere leaves the parent's untouched.
+        """
+        import json
+        import tempfile
+
+        self.session_id = os.urandom(8).hex()
+
+        path = state_path(self.session_id)
+        ensure_private_dir(os.path.dirname(path))
+        data = {
+            "version": STATE_VERSION,
+            "layers": [layer._asdict() for layer in self.layers],
+            "variables": self.variables,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".session-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        _remove_stale(os.path.dirname(path))
+        return self.session_id
+
+    def touch(self) -> None:
+        """Mark the state as checked now, for shell hooks comparing file times against it"""
+        if self.session_id is not None:
+            try:
+                os.utime(state_path(self.session_id))
+            except OSError:
+                pass
+
+    def delete(self) -> None:
+        """Forget the state, keeping its file for any other shell still pointing to it"""
+        self.layers = []
+        self.variables = []
+
+    @property
+    def sources(self) -> List[str]:
+        return [source for layer in self.layers for source in layer.sources]
+
+
+def _remove_stale(directory: str) -> None:
+    """Remove the state files of sessions unused for STATE_MAX_AGE"""
+    import time
+
+    deadline = time.time() - STATE_MAX_AGE
+    with os.scandir(directory) as it:
+        for dirent in it:
+            if not dirent.name.startswith("session-"):
+                continue
+            try:
+                if dirent.stat().st_mtime < deadline:
+                    os.unlink(dirent.path)
+            except OSError:
+                # Removed by another passenv meanwhile
+                pass
+
+
+def state_path(session_id: str) -> str:
+    """Return the state file of a session"""
+    return os.path.join(runtime_dir(), f"session-{session_id}")
+
+
+def _valid_id(session_id: str) -> bool:
+    # The id ends up in a path, so only accept what save() generates
+    return len(session_id) == 16 and all(c in "0123456789abcdef" for c in session_id)
+
+
+def _valid_names(variables: List[str]) -> bool:
+    return isinstance(variables, list) and all(
+        isinstance(var, str) and EnvParser.VAR_NAME_PATTERN.match(var) for var in variables
+    )
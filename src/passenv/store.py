@@ -0,0 +1,64 @@
+import os
+from typing import Callable, Iterator, Optional
+
+ENTRY_SUFFIX = ".gpg"
+
+
+def store_dir() -> str:
+    """Return the password store directory, resolved the same way pass does"""
+    return os.environ.get("PASSWORD_STORE_DIR") or os.path.expanduser("~/.password-store")
+
+
+def is_initialized(root: str) -> bool:
+    """Check whether root is a store set up with `pass init`"""
+    return os.path.isfile(os.path.join(root, ".gpg-id"))
+
+
+def entry_file(root: str, path: str) -> str:
+    """Return the .gpg file holding the entry at path"""
+    if path.startswith("/") or ".." in path.split("/"):
+        raise RuntimeError(f"Invalid pass entry path '{path}'.")
+    return os.path.join(root, path + ENTRY_SUFFIX)
+
+
+def iter_store_entries(
+    root: str, on_directory: Optional[Callable[[str, os.stat_result], None]] = None
+) -> Iterator[str]:
+    """Lazily yield the entry paths of every *.gpg file below root
+
+    Symlinked directories are followed, but every directory is listed once, so a link
+    back up the tree neither repeats entries nor recurses until ELOOP. on_directory is
+    called with the path of each directory relative to root, ending in "/" and empty
+    for root itself, and its stat.
+    """
+    root_stat = os.stat(root)
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    if on_directory is not None:
+        on_directory("", root_stat)
+
+    pending = [("", root)]
+    while pending:
+        prefix, directory = pending.pop()
+        with os.scandir(directory) as it:
+            for dirent in it:
+                name = dirent.name
+                # Hidden files hold store metadata (.git, .gpg-id, .extensions)
+                if name.startswith("."):
+                    continue
+                try:
+                    if dirent.is_dir():
+                        st = dirent.stat()
+                        if (st.st_dev, st.st_ino) in visited:
+                            continue
+                        visited.add((st.st_dev, st.st_ino))
+                        relative = f"{prefix}{name}/"
+                        if on_directory is not None:
+                            on_directory(relative, st)
+                        pending.append((relative, dirent.path))
+                        continue
+                    is_entry = name.endswith(ENTRY_SUFFIX) and dirent.is_file()
+                except OSError:
+                    # A symlink pointing at itself, or something removed meanwhile
+                    continue
+                if is_entry:
+                    yield prefix + name[: -len(ENTRY_SUFFIX)]
@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, Iterator, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from subprocess import CompletedProcess
+
+TRACE_ENV = "PASSENV_TRACE"
+
+# Options whose value must never end up in a trace (PASSWORD_STORE_GPG_OPTS can hold them)
+SECRET_OPTIONS = {"--passphrase", "--passphrase-fd", "--passphrase-file", "--override-session-key"}
+
+_DISABLED = nullcontext()
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process was started, where the platform exposes it"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which may itself contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        return float(
+            time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        )
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _redact(argv: Sequence[str]) -> List[str]:
+    redacted = []
+    hide_next = False
+    for arg in argv:
+        if hide_next:
+            redacted.append("***")
+            hide_next = False
+        elif arg.split("=", 1)[0] in SECRET_OPTIONS:
+            hide_next = "=" not in arg
+            redacted.append(arg if hide_next else arg.split("=", 1)[0] + "=***")
+        else:
+            redacted.append(arg)
+    return redacted
+
+
+class Tracer:
+    """Collect phase and subprocess timings and write them out at exit
+
+    target is "stderr" for a human readable summary, or the path of a file
+    to append JSON lines to.
+    """
+
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self.records: List[Dict[str, Any]] = []
+        now = time.monotonic()
+        age = _process_age()
+        self.origin = now - age if age is not None else now
+        if age is not None:
+            self._add({"type": "phase", "name": "startup"}, self.origin, now)
+
+    def _add(self, record: Dict[str, Any], start: float, end: float) -> None:
+        record["start_ms"] = round((start - self.origin) * 1000, 3)
+        record["duration_ms"] = round((end - start) * 1000, 3)
+        self.records.append(record)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._add({"type": "phase", "name": name}, start, time.monotonic())
+
+    def subprocess(self, argv: Sequence[str], returncode: Optional[int], start: float) -> None:
+        record = {"type": "subprocess", "argv": _redact(argv), "returncode": returncode}
+        self._add(record, start, time.monotonic())
+
+    def flush(self) -> None:
+        records, self.records = self.records, []
+        if not records:
+            return
+
+        if self.target == "stderr":
+            for record in records:
+                if record["type"] == "phase":
+                    label = record["name"]
+                else:
+                    label = f"$ {' '.join(record['argv'])} (exit {record['returncode']})"
+                print(
+                    f"[passenv] {record['start_ms']:>9.2f} ms  {record['duration_ms']:>9.2f} ms"
+                    f"  {label}",
+                    file=sys.stderr,
+                )
+            return
+
+        import json
+
+        with open(self.target, "a") as f:
+            for record in records:
+                f.write(json.dumps({"pid": os.getpid(), **record}) + "\n")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(target: str = "stderr") -> Tracer:
+    """Start tracing to target, flushing the collected timings when the process exits"""
+    global _tracer
+    if _tracer is None:
+        import atexit
+
+        _tracer = Tracer(target)
+        atexit.register(_tracer.flush)
+    else:
+        _tracer.target = target
+    return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def flush() -> None:
+    """Write out what was recorded so far, for callers about to exec another program"""
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Time the enclosed block; a shared no-op context when tracing is off"""
+    if _tracer is None:
+        return _DISABLED
+    return _tracer.phase(name)
+
+
+def run(argv: List[str], **kwargs: Any) -> "CompletedProcess[str]":
+    """subprocess.run, recording argv, exit code and duration when tracing is on"""
+    import subprocess
+
+    if _tracer is None:
+        return subprocess.run(argv, **kwargs)
+
+    start = time.monotonic()
+    returncode = None
+    try:
+        result = subprocess.run(argv, **kwargs)
+        returncode = result.returncode
+        return result
+    except subprocess.CalledProcessError as e:
+        returncode = e.returncode
+        raise
+    finally:
+        _tracer.subprocess(argv, returncode, start)
+
+
+def record_subprocess(argv: Sequence[str], returncode: Optional[int], start: float) -> None:
+    """Record a process started at time.monotonic() start some other way than run()"""
+    if _tracer is not None:
+        _tracer.subprocess(argv, returncode, start)
+
+
+def _enable_from_environment() -> None:
+    target = os.environ.get(TRACE_ENV, "")
+    if target and target != "0":
+        enable("stderr" if target in ("1", "stderr") else target)
+
+
+_enable_from_environment()
@@ -14,6 +14,70 @@ def temp_dir():
     shutil.rmtree(temp_dir)
 
 
+@pytest.fixture(autouse=True)
+def isolated_store(tmp_path, monkeypatch):
+    """Point pass at a store that does not exist unless a test creates it"""
+    monkeypatch.setenv("PASSWORD_STORE_DIR", str(tmp_path / "password-store"))
+    return tmp_path / "password-store"
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep the completion index out of the user's cache directory"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture(autouse=True)
+def isolated_runtime(tmp_path, monkeypatch):
+    """Keep agent sockets and session state out of the user's runtime directory"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    return tmp_path / "run" / "passenv"
+
+
+@pytest.fixture(autouse=True)
+def isolated_data(tmp_path, monkeypatch):
+    """Keep the .passenv files allowed by tests out of the user's data directory"""
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    return tmp_path / "data" / "passenv"
+
+
+@pytest.fixture
+def password_store(isolated_store):
+    """Create an initialized password store with a few entries"""
+    for entry in ["database/staging", "database/production", "api/keys", "root"]:
+        path = isolated_store / f"{entry}.gpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"encrypted")
+    (isolated_store / ".gpg-id").write_text("test@example.com\n")
+    return isolated_store
+
+
+STUB_GPG = """#!/bin/sh
+# Stand-in for gpg: entries are stored in plain text, "FAIL" marks a bad one
+for last; do :; done
+if [ "$(cat "$last")" = "FAIL" ]; then
+    echo "gpg: decryption failed: No secret key" >&2
+    echo "[GNUPG:] NO_SECKEY 0123456789ABCDEF" >&2
+    exit 2
+fi
+echo "[GNUPG:] DECRYPTION_OKAY" >&2
+cat "$last"
+"""
+
+
+@pytest.fixture
+def stub_gpg(tmp_path, monkeypatch):
+    """Put a gpg stand-in that prints the plain text .gpg files on PATH"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gpg = bin_dir / "gpg"
+    gpg.write_text(STUB_GPG)
+    gpg.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return gpg
+
+
 @pytest.fixture
 def mock_pass_client():
     """Mock PassClient for testing"""
@@ -24,7 +88,14 @@ def mock_pass_client():
 @pytest.fixture
 def clean_env():
     """Clean environment for testing"""
-    env_vars = ["PASSENV_LOADED_VARS", "PASSENV_SOURCE", "TEST_VAR", "DATABASE_URL"]
+    env_vars = [
+        "PASSENV_LOADED_VARS",
+        "PASSENV_SOURCE",
+        "PASSENV_FINGERPRINT",
+        "PASSENV_SESSION",
+        "TEST_VAR",
+        "DATABASE_URL",
+    ]
     original_values = {}
 
     # Save original values
@@ -0,0 +1,190 @@
+import os
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from passenv.agent import Agent, AgentClient, EntryCache, ensure_private_dir, socket_path
+from passenv.pass_client import PassClient
+
+
+@pytest.fixture
+def running_agent():
+    """Run an agent backed by a mock client on the isolated runtime directory"""
+    client = Mock()
+    client.get_entry.side_effect = lambda path: f"ENTRY={path}"
+    client.list_entries.return_value = ["api/keys", "database/staging"]
+
+    agent = Agent(client, ttl=60)
+    server = threading.Thread(target=agent.serve_forever, daemon=True)
+    server.start()
+    # The socket exists once the agent answers a ping
+    while AgentClient().request({"op": "ping"}) is None:
+        pass
+
+    yield agent
+
+    AgentClient().request({"op": "stop"})
+    server.join(timeout=5)
+
+
+class TestEntryCache:
+    def test_get_and_put(self):
+        cache = EntryCache(ttl=60, max_entries=2)
+        cache.put("a", "A=1")
+
+        assert cache.get("a") == "A=1"
+        assert cache.get("missing") is None
+
+    def test_expiry_wipes_content(self):
+        cache = EntryCache(ttl=10)
+        with patch("passenv.agent.time.monotonic", return_value=100.0):
+            cache.put("a", "A=secret")
+        buffer = cache._entries["a"][2]
+
+        with patch("passenv.agent.time.monotonic", return_value=110.0):
+            assert cache.get("a") is None
+
+        assert buffer == bytearray(len("A=secret"))
+
+    def test_purge_expired(self):
+        cache = EntryCache(ttl=10)
+        with patch("passenv.agent.time.monotonic", return_value=100.0):
+            cache.put("old", "A=1")
+        with patch("passenv.agent.time.monotonic", return_value=105.0):
+            cache.put("new", "B=2")
+
+        with patch("passenv.agent.time.monotonic", return_value=112.0):
+            assert cache.purge_expired() == 1
+
+        assert len(cache) == 1
+
+    def test_lru_eviction(self):
+        cache = EntryCache(ttl=60, max_entries=2)
+        cache.put("a", "A=1")
+        cache.put("b", "B=2")
+        cache.get("a")
+        cache.put("c", "C=3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "A=1"
+        assert cache.get("c") == "C=3"
+
+    def test_stamp_mismatch_invalidates(self):
+        cache = EntryCache(ttl=60)
+        cache.put("a", "A=1", stamp=(1, 2))
+
+        assert cache.get("a", stamp=(1, 3)) is None
+
+
+class TestAgent:
+    def test_get_is_cached(self, running_agent):
+        client = AgentClient()
+
+        assert client.get_entry("api/keys") == "ENTRY=api/keys"
+        assert client.get_entry("api/keys") == "ENTRY=api/keys"
+
+        running_agent.client.get_entry.assert_called_once_with("api/keys")
+
+    def test_list_entries(self, running_agent):
+        assert AgentClient().list_entries() == ["api/keys", "database/staging"]
+
+    def test_errors_are_forwarded(self, running_agent):
+        running_agent.client.get_entry.side_effect = RuntimeError(
+            "Pass entry 'missing' not found."
+        )
+
+        with pytest.raises(RuntimeError, match="Pass entry 'missing' not found"):
+            AgentClient().get_entry("missing")
+
+    def test_pass_client_uses_agent(self, running_agent):
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            with patch("subprocess.run") as mock_run:
+                assert client.get_entry("db") == "ENTRY=db"
+                assert client.list_entries() == ["api/keys", "database/staging"]
+
+                mock_run.assert_not_called()
+
+    def test_other_store_falls_back(self, running_agent, tmp_path, monkeypatch):
+        monkeypatch.setenv("PASSWORD_STORE_DIR", str(tmp_path / "other-store"))
+
+        assert AgentClient().get_entry("db") is None
+        assert AgentClient().list_entries() is None
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            with patch("subprocess.run", return_value=Mock(stdout="A=1")) as mock_run:
+                assert client.get_entry("db") == "A=1"
+
+                mock_run.assert_called_once()
+        running_agent.client.get_entry.assert_not_called()
+
+    def test_agent_disabled(self, running_agent, monkeypatch):
+        monkeypatch.setenv("PASSENV_AGENT", "0")
+
+        assert AgentClient.find() is None
+
+
+class TestAgentClient:
+    def test_find_without_agent(self):
+        assert AgentClient.find() is None
+
+    def test_stale_socket_falls_back(self, isolated_runtime):
+        isolated_runtime.mkdir(parents=True, mode=0o700)
+        with open(socket_path(), "w"):
+            pass
+
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            with patch("subprocess.run", return_value=Mock(stdout="A=1")) as mock_run:
+                assert client.get_entry("db") == "A=1"
+
+                mock_run.assert_called_once()
+
+
+class TestRuntimeDir:
+    def test_created_private(self, isolated_runtime):
+        ensure_private_dir(str(isolated_runtime))
+
+        assert isolated_runtime.stat().st_mode & 0o777 == 0o700
+
+    def test_shared_directory_is_refused(self, isolated_runtime):
+        isolated_runtime.mkdir(parents=True)
+        isolated_runtime.chmod(0o777)
+
+        with pytest.raises(RuntimeError, match="Refusing to use"):
+            ensure_private_dir(str(isolated_runtime))
+        with pytest.raises(RuntimeError, match="Refusing to use"):
+            Agent(Mock()).serve_forever()
+
+    def test_symlink_is_refused(self, isolated_runtime, tmp_path):
+        target = tmp_path / "elsewhere"
+        target.mkdir(mode=0o700)
+        isolated_runtime.parent.mkdir()
+        isolated_runtime.symlink_to(target)
+
+        with pytest.raises(RuntimeError, match="Refusing to use"):
+            ensure_private_dir(str(isolated_runtime))
+
+    def test_directory_of_another_user_is_refused(self, isolated_runtime):
+        isolated_runtime.mkdir(parents=True, mode=0o700)
+
+        with patch("os.getuid", return_value=os.getuid() + 1):
+            with pytest.raises(RuntimeError, match="Refusing to use"):
+                ensure_private_dir(str(isolated_runtime))
+
+    def test_socket_of_another_user_is_ignored(self, running_agent):
+        with patch("os.getuid", return_value=os.getuid() + 1):
+            assert AgentClient.find() is None
+            assert AgentClient().request({"op": "ping"}) is None
+
+    def test_socket_in_shared_directory_is_ignored(self, running_agent, isolated_runtime):
+        isolated_runtime.chmod(0o755)
+        try:
+            assert AgentClient.find() is None
+            assert AgentClient().request({"op": "ping"}) is None
+        finally:
+            isolated_runtime.chmod(0o700)
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+
+import pytest
+
+import passenv
+from passenv.api import SecretProvider, get, inject
+from passenv.backends import DirectoryBackend
+from passenv.pass_client import PassClient
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = tmp_path / "store"
+    (store / "app").mkdir(parents=True)
+    (store / "app" / "prod.gpg").write_text("API_KEY=prod\nURL=https://${HOST:-example.com}/\n")
+    (store / "app" / "staging.gpg").write_text("API_KEY=staging\n")
+    return store
+
+
+@pytest.fixture
+def client(store):
+    return PassClient(use_agent=False, backend=DirectoryBackend(str(store)))
+
+
+def rewrite(path, content):
+    """Change an entry the way pass would, with a new mtime"""
+    path.write_text(content)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestFunctions:
+    def test_get(self, client):
+        assert get("app/prod", pass_client=client) == {
+            "API_KEY": "prod",
+            "URL": "https://example.com/",
+        }
+
+    def test_get_merges_entries(self, client):
+        assert get("app/prod", "app/staging", pass_client=client)["API_KEY"] == "staging"
+
+    def test_inject(self, client):
+        environ = {"API_KEY": "old", "OTHER": "kept"}
+
+        variables = inject("app/staging", environ=environ, pass_client=client)
+
+        assert variables == {"API_KEY": "staging"}
+        assert environ == {"API_KEY": "staging", "OTHER": "kept"}
+
+    def test_inject_os_environ(self, client, monkeypatch):
+        monkeypatch.delenv("API_KEY", raising=False)
+
+        inject("app/staging", pass_client=client)
+
+        assert os.environ["API_KEY"] == "staging"
+        monkeypatch.delenv("API_KEY")
+
+    def test_package_exports(self):
+        assert passenv.get is get
+        assert passenv.SecretProvider is SecretProvider
+        assert passenv.AsyncPassClient.__module__ == "passenv.async_client"
+        with pytest.raises(AttributeError):
+            passenv.missing
+
+
+class TestSecretProvider:
+    def test_get(self, client):
+        provider = SecretProvider(client)
+
+        variables = provider.get("app/prod")
+
+        assert variables["API_KEY"] == "prod"
+        assert provider["app/prod"] is variables
+        with pytest.raises(TypeError):
+            variables["API_KEY"] = "changed"
+
+    def test_cached_until_ttl(self, client, store):
+        provider = SecretProvider(client, ttl=60)
+        provider.get("app/prod")
+
+        rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+
+        assert provider.get("app/prod")["API_KEY"] == "prod"
+
+    def test_expired_and_changed(self, client, store):
+        provider = SecretProvider(client, ttl=0)
+        provider.get("app/prod")
+
+        rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+
+        assert provider.get("app/prod") == {"API_KEY": "rotated"}
+
+    def test_expired_unchanged_is_not_decrypted(self, client, store, monkeypatch):
+        provider = SecretProvider(client, ttl=0)
+        variables = provider.get("app/prod")
+        os.utime(store / "app" / "prod.gpg", ns=(0, 0))
+        calls = []
+        monkeypatch.setattr(client.backend, "get_entries", lambda paths: calls.append(paths))
+
+        assert provider.get("app/prod") is variables
+        assert calls == []
+
+    def test_per_entry_ttl(self, client, store):
+        provider = SecretProvider(client, ttl=60)
+        provider.get("app/prod", ttl=0)
+        provider.get("app/staging")
+
+        rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+        rewrite(store / "app" / "staging.gpg", "API_KEY=rotated\n")
+
+        assert provider.get("app/prod")["API_KEY"] == "rotated"
+        assert provider.get("app/staging")["API_KEY"] == "staging"
+
+    def test_included_entry_changes(self, client, store):
+        (store / "common.gpg").write_text("REGION=eu\n")
+        rewrite(store / "app" / "staging.gpg", "@include common\nAPI_KEY=staging\n")
+        provider = SecretProvider(client, ttl=0)
+        assert provider.get("app/staging")["REGION"] == "eu"
+
+        rewrite(store / "common.gpg", "REGION=us\n")
+
+        assert provider.get("app/staging")["REGION"] == "us"
+
+    def test_lru_eviction(self, client):
+        provider = SecretProvider(client, max_entries=1)
+        provider.get("app/prod")
+        provider.get("app/staging")
+
+        assert list(provider._entries) == ["app/staging"]
+
+    def test_invalidate(self, client, store):
+        provider = SecretProvider(client, ttl=60)
+        provider.get("app/prod")
+        rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+
+        provider.invalidate("app/prod")
+
+        assert provider.get("app/prod") == {"API_KEY": "rotated"}
+
+    def test_refresh_calls_callbacks(self, client, store):
+        provider = SecretProvider(client, ttl=0)
+        changes = []
+        provider.on_change(lambda path, old, new: changes.append((path, old["API_KEY"], new)))
+        provider.get("app/prod")
+        provider.get("app/staging")
+
+        rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+
+        assert provider.refresh() == ["app/prod"]
+        assert changes == [("app/prod", "prod", {"API_KEY": "rotated"})]
+        assert provider.refresh() == []
+
+    def test_refresh_keeps_values_on_error(self, client, store):
+        provider = SecretProvider(client, ttl=0)
+        provider.get("app/prod")
+
+        rewrite(store / "app" / "prod.gpg", "not a variable\n")
+
+        assert provider.refresh() == []
+        assert provider._entries["app/prod"].variables["API_KEY"] == "prod"
+
+    def test_background_refresh(self, client, store):
+        changed = threading.Event()
+        provider = SecretProvider(client, ttl=0, refresh_interval=0.01)
+        provider.on_change(lambda path, old, new: changed.set())
+        provider.get("app/prod")
+
+        with provider:
+            rewrite(store / "app" / "prod.gpg", "API_KEY=rotated\n")
+            assert changed.wait(5)
+
+        assert provider._thread is None
+        assert provider._entries["app/prod"].variables == {"API_KEY": "rotated"}
+
+    def test_concurrent_reads(self, client):
+        provider = SecretProvider(client, ttl=0.001)
+        results = []
+
+        def read():
+            for _ in range(50):
+                results.append(provider.get("app/prod")["API_KEY"])
+                time.sleep(0.0005)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["prod"] * 400
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+import pytest
+
+from passenv.async_client import AsyncPassClient
+from passenv.backends import GpgBackend, MemoryBackend, PassShowBackend
+
+STUB_PASS = """#!/bin/sh
+# Stand-in for pass: "show slow/..." hangs, "show missing" is not found
+if [ "$1" = "ls" ]; then
+    printf 'Password Store\\n├── app\\n│   └── prod\\n└── root\\n'
+    exit 0
+fi
+case "$2" in
+    slow*) echo $$ > "$PASS_PIDS/$(basename "$2")"; exec sleep 30 ;;
+    missing) echo "Error: missing is not in the password store." >&2; exit 1 ;;
+    broken) echo "gpg: decryption failed" >&2; exit 2 ;;
+esac
+echo "NAME=$2"
+"""
+
+
+@pytest.fixture
+def stub_pass(tmp_path, monkeypatch):
+    """Put a pass stand-in on PATH, recording the pids of the processes that hang"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    pass_script = bin_dir / "pass"
+    pass_script.write_text(STUB_PASS)
+    pass_script.chmod(0o755)
+    pids = tmp_path / "pids"
+    pids.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PASS_PIDS", str(pids))
+    return pids
+
+
+@pytest.fixture
+def client(stub_pass):
+    return AsyncPassClient(backend=PassShowBackend())
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestAsyncPassClient:
+    def test_get_entry(self, client):
+        assert asyncio.run(client.get_entry("app/prod")) == "NAME=app/prod\n"
+
+    def test_get_entry_not_found(self, client):
+        with pytest.raises(RuntimeError, match="Pass entry 'missing' not found"):
+            asyncio.run(client.get_entry("missing"))
+
+    def test_get_entry_failure(self, client):
+        with pytest.raises(RuntimeError, match="Pass command failed: gpg: decryption failed"):
+            asyncio.run(client.get_entry("broken"))
+
+    def test_gpg_backend(self, password_store, stub_gpg):
+        (password_store / "api" / "keys.gpg").write_text("API_KEY=secret123\n")
+        (password_store / "root.gpg").write_text("FAIL")
+        client = AsyncPassClient(backend=GpgBackend())
+
+        assert asyncio.run(client.get_entry("api/keys")) == "API_KEY=secret123\n"
+        with pytest.raises(RuntimeError, match="Pass entry 'api/missing' not found"):
+            asyncio.run(client.get_entry("api/missing"))
+        with pytest.raises(RuntimeError, match="Pass command failed: gpg: decryption failed"):
+            asyncio.run(client.get_entry("root"))
+
+    def test_get_many_preserves_order(self, client):
+        paths = [f"app/{i}" for i in range(20)]
+
+        assert asyncio.run(client.get_many(paths)) == [f"NAME={path}\n" for path in paths]
+
+    def test_concurrency_limit(self, stub_pass):
+        client = AsyncPassClient(backend=PassShowBackend(), concurrency=2)
+        running = 0
+        peak = 0
+        run = client._run
+
+        async def counting_run(argv):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                return await run(argv)
+            finally:
+                running -= 1
+
+        with patch.object(client, "_run", counting_run):
+            asyncio.run(client.get_many([f"app/{i}" for i in range(8)]))
+
+        assert peak == 2
+
+    def test_timeout_kills_process(self, stub_pass):
+        client = AsyncPassClient(backend=PassShowBackend(), timeout=0.5)
+
+        with pytest.raises(RuntimeError, match="timed out after 0.5s"):
+            asyncio.run(client.get_entry("slow"))
+
+        assert not is_running(int((stub_pass / "slow").read_text()))
+
+    def test_cancellation_kills_process(self, client, stub_pass):
+        async def cancel():
+            task = asyncio.ensure_future(client.get_entry("slow"))
+            while not (stub_pass / "slow").exists():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel())
+
+        assert not is_running(int((stub_pass / "slow").read_text()))
+
+    def test_get_many_cancels_the_others_on_error(self, client, stub_pass):
+        async def fetch():
+            await client.get_many(["slow1", "slow2", "missing"])
+
+        with pytest.raises(RuntimeError, match="Pass entry 'missing' not found"):
+            asyncio.run(fetch())
+
+        for pid_file in stub_pass.iterdir():
+            assert not is_running(int(pid_file.read_text()))
+
+    def test_list_entries_from_pass(self, client):
+        assert asyncio.run(client.list_entries()) == ["app/prod", "root"]
+
+    def test_list_entries_from_backend(self):
+        client = AsyncPassClient(backend=MemoryBackend({"b": "B=1", "a": "A=1"}))
+
+        assert asyncio.run(client.list_entries()) == ["a", "b"]
+
+    def test_backend_without_command(self):
+        client = AsyncPassClient(backend=MemoryBackend({"a": "A=1"}))
+
+        assert asyncio.run(client.get_many(["a", "a"])) == ["A=1", "A=1"]
+        with pytest.raises(RuntimeError, match="Pass entry 'b' not found"):
+            asyncio.run(client.get_entry("b"))
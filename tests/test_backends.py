@@ -0,0 +1,171 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+
+from passenv.backends import (
+    BaseBackend,
+    DirectoryBackend,
+    GpgBackend,
+    MemoryBackend,
+    PassShowBackend,
+    default_backend,
+    get_backend,
+)
+from passenv.core import PassEnv
+from passenv.pass_client import PassClient
+
+
+class TestGpgBackend:
+    def test_get_entry(self, password_store, stub_gpg):
+        (password_store / "api" / "keys.gpg").write_text("API_KEY=secret123\n")
+
+        backend = GpgBackend()
+
+        assert backend.get_entry("api/keys") == "API_KEY=secret123\n"
+
+    def test_get_entry_not_found(self, password_store, stub_gpg):
+        backend = GpgBackend()
+
+        with pytest.raises(RuntimeError, match="Pass entry 'api/missing' not found"):
+            backend.get_entry("api/missing")
+
+    def test_get_entry_decryption_failure(self, password_store, stub_gpg):
+        (password_store / "api" / "keys.gpg").write_text("FAIL")
+
+        backend = GpgBackend()
+
+        with pytest.raises(RuntimeError, match="Pass command failed: gpg: decryption failed"):
+            backend.get_entry("api/keys")
+
+    def test_rejects_paths_outside_store(self, password_store, stub_gpg):
+        backend = GpgBackend()
+
+        with pytest.raises(RuntimeError, match="Invalid pass entry path"):
+            backend.get_entry("../outside")
+
+    def test_command_uses_store_options(self, password_store, stub_gpg, monkeypatch):
+        monkeypatch.setenv("PASSWORD_STORE_GPG_OPTS", "--pinentry-mode loopback")
+
+        command = GpgBackend().command("api/keys")
+
+        assert command[1:] == [
+            "--decrypt",
+            "--batch",
+            "--quiet",
+            "--yes",
+            "--status-fd",
+            "2",
+            "--pinentry-mode",
+            "loopback",
+            str(password_store / "api" / "keys.gpg"),
+        ]
+
+    def test_gpg_not_found(self):
+        with patch("shutil.which", return_value=None):
+            with pytest.raises(RuntimeError, match="'gpg' command not found"):
+                GpgBackend()
+
+
+class TestDefaultBackend:
+    def test_local_store_uses_gpg(self, password_store, stub_gpg):
+        assert isinstance(default_backend(), GpgBackend)
+
+    def test_missing_store_uses_pass(self):
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            assert isinstance(default_backend(), PassShowBackend)
+
+    def test_pass_client_decrypts_with_gpg(self, password_store, stub_gpg):
+        (password_store / "root.gpg").write_text("ROOT=1\n")
+
+        with patch("subprocess.run", wraps=__import__("subprocess").run) as mock_run:
+            assert PassClient().get_entry("root") == "ROOT=1\n"
+
+            assert mock_run.call_args[0][0][0] == str(stub_gpg)
+
+
+class TestBaseBackend:
+    def test_requires_get_entry_and_iter_entries(self):
+        class Incomplete(BaseBackend):
+            def get_entry(self, path):
+                return ""
+
+        with pytest.raises(TypeError, match="iter_entries"):
+            Incomplete()
+
+
+class TestMemoryBackend:
+    def test_get_and_list(self):
+        backend = MemoryBackend({"b/entry": "B=2", "a/entry": "A=1"})
+
+        assert backend.get_entry("a/entry") == "A=1"
+        assert backend.get_entries(["b/entry", "a/entry"]) == ["B=2", "A=1"]
+        assert backend.list_entries() == ["a/entry", "b/entry"]
+
+    def test_missing_entry(self):
+        with pytest.raises(RuntimeError, match="Pass entry 'missing' not found"):
+            MemoryBackend().get_entry("missing")
+
+    def test_stat_entry(self):
+        backend = MemoryBackend({"a": "A=1"})
+        before = backend.stat_entry("a")
+        backend.entries["a"] = "A=2"
+
+        assert backend.stat_entry("a") != before
+        assert backend.stat_entry("missing") is None
+
+    def test_pass_env_runs_offline(self, clean_env):
+        backend = MemoryBackend({"db": "DATABASE_URL=postgres://localhost", "api": "API_KEY=k"})
+
+        passenv = PassEnv(PassClient(backend=backend))
+
+        assert passenv.get_variables("db", "api") == {
+            "DATABASE_URL": "postgres://localhost",
+            "API_KEY": "k",
+        }
+
+
+class TestDirectoryBackend:
+    def test_reads_plain_text_entries(self, tmp_path):
+        (tmp_path / "svc").mkdir()
+        (tmp_path / "svc" / "api.gpg").write_text("API_KEY=plain\n")
+
+        backend = DirectoryBackend(str(tmp_path))
+
+        assert backend.get_entry("svc/api") == "API_KEY=plain\n"
+        assert backend.list_entries() == ["svc/api"]
+        with pytest.raises(RuntimeError, match="Pass entry 'svc/none' not found"):
+            backend.get_entry("svc/none")
+
+    def test_stat_entry(self, tmp_path):
+        (tmp_path / "api.gpg").write_text("API_KEY=plain\n")
+
+        stat = DirectoryBackend(str(tmp_path)).stat_entry("api")
+
+        assert stat.size == len("API_KEY=plain\n")
+        assert stat.digest == hashlib.sha256(b"API_KEY=plain\n").hexdigest()
+        assert DirectoryBackend(str(tmp_path)).stat_entry("none") is None
+
+
+class TestGetBackend:
+    def test_from_environment(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PASSENV_BACKEND", f"dir:{tmp_path}")
+
+        backend = get_backend()
+
+        assert isinstance(backend, DirectoryBackend)
+        assert backend.root == str(tmp_path)
+
+    def test_by_name(self, password_store, stub_gpg):
+        assert isinstance(get_backend("gpg"), GpgBackend)
+        assert isinstance(get_backend("auto"), GpgBackend)
+
+    def test_unknown_backend(self):
+        with pytest.raises(RuntimeError, match="Unknown backend 'nope'"):
+            get_backend("nope")
+
+    def test_explicit_backend_skips_agent(self, monkeypatch):
+        with patch("passenv.pass_client.AgentClient.find") as mock_find:
+            PassClient(backend=MemoryBackend())
+
+            mock_find.assert_not_called()
@@ -0,0 +1,124 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from passenv.backends import DirectoryBackend
+from passenv.bulk import export_tree, output_path, subtree_entries
+from passenv.exporters import ExportFormat
+from passenv.pass_client import PassClient
+
+
+@pytest.fixture
+def client(tmp_path):
+    store = tmp_path / "store"
+    (store / "services" / "api").mkdir(parents=True)
+    (store / "services" / "api" / "prod.gpg").write_text("API_KEY=prod\nDEBUG=0\n")
+    (store / "services" / "worker.gpg").write_text("QUEUE=jobs\n")
+    (store / "services" / "broken.gpg").write_text("not a variable\n")
+    (store / "other.gpg").write_text("OTHER=1\n")
+    return PassClient(use_agent=False, backend=DirectoryBackend(str(store)))
+
+
+class TestBulkExport:
+    def test_subtree_entries(self):
+        entries = ["services/api/prod", "services/worker", "servicesx", "other"]
+
+        assert subtree_entries(entries, "services/") == ["services/api/prod", "services/worker"]
+        assert subtree_entries(entries, "other") == ["other"]
+        assert subtree_entries(entries, "/") == entries
+
+    def test_output_path_mirrors_layout(self):
+        assert output_path("out", "services/", "services/api/prod", ExportFormat.ENV) == (
+            os.path.join("out", "api", "prod.env")
+        )
+        assert output_path("out", "services/api/prod", "services/api/prod", ExportFormat.JSON) == (
+            os.path.join("out", "prod.json")
+        )
+
+    def test_export_tree(self, client, tmp_path):
+        out = tmp_path / "out"
+
+        results = export_tree(client, ["services/"], str(out), ExportFormat.ENV)
+
+        by_entry = {result.entry: result for result in results}
+        assert set(by_entry) == {"services/api/prod", "services/worker", "services/broken"}
+        assert (out / "api" / "prod.env").read_text() == "API_KEY=prod\nDEBUG=0"
+        assert (out / "worker.env").read_text() == "QUEUE=jobs"
+        assert by_entry["services/api/prod"].variables == 2
+        assert by_entry["services/api/prod"].error is None
+        assert by_entry["services/api/prod"].seconds >= 0
+        assert by_entry["services/api/prod"].changed
+
+    def test_export_tree_skips_unchanged_files(self, client, tmp_path):
+        out = tmp_path / "out"
+        export_tree(client, ["services/"], str(out), ExportFormat.ENV)
+        os.utime(out / "worker.env", ns=(1_000_000_000, 1_000_000_000))
+
+        results = export_tree(client, ["services/"], str(out), ExportFormat.ENV)
+
+        by_entry = {result.entry: result for result in results}
+        assert not by_entry["services/worker"].changed
+        assert (out / "worker.env").stat().st_mtime_ns == 1_000_000_000
+
+    def test_export_tree_continues_after_errors(self, client, tmp_path):
+        out = tmp_path / "out"
+
+        results = export_tree(client, ["services"], str(out), ExportFormat.JSON, workers=1)
+
+        failed = [result for result in results if result.error is not None]
+        assert [result.entry for result in failed] == ["services/broken"]
+        assert "missing '='" in failed[0].error
+        assert not (out / "broken.json").exists()
+        assert (out / "worker.json").exists()
+
+    def test_export_tree_reports_clashing_outputs(self, client, tmp_path):
+        (tmp_path / "store" / "services" / "other.gpg").write_text("OTHER=2\n")
+        out = tmp_path / "out"
+
+        results = export_tree(client, ["other", "services"], str(out), ExportFormat.ENV)
+
+        by_entry = {result.entry: result for result in results}
+        assert [result.entry for result in results][0] == "other"
+        assert "also be written by 'services/other'" in by_entry["other"].error
+        assert "also be written by 'other'" in by_entry["services/other"].error
+        assert not (out / "other.env").exists()
+        assert by_entry["services/worker"].error is None
+        assert (out / "worker.env").exists()
+
+    def test_export_tree_no_entries(self, client, tmp_path):
+        with pytest.raises(RuntimeError, match="No pass entries found under 'missing'"):
+            export_tree(client, ["missing"], str(tmp_path / "out"), ExportFormat.ENV)
+
+    def test_export_tree_write_error(self, client, tmp_path):
+        with patch("passenv.bulk.stream_if_changed", side_effect=OSError("disk full")):
+            results = export_tree(client, ["other"], str(tmp_path / "out"), ExportFormat.ENV)
+
+        assert results[0].error == "disk full"
+
+    def test_export_tree_decrypts_includes_once(self, client, tmp_path):
+        store = tmp_path / "store"
+        (store / "common.gpg").write_text("REGION=eu\n")
+        (store / "services" / "api" / "prod.gpg").write_text("@include common\nAPI_KEY=prod\n")
+        (store / "services" / "worker.gpg").write_text("@include common\nQUEUE=jobs\n")
+        out = tmp_path / "out"
+
+        with patch.object(
+            client.backend, "get_entry", wraps=client.backend.get_entry
+        ) as mock_get_entry:
+            export_tree(client, ["services/"], str(out), ExportFormat.ENV)
+
+        decrypted = [call.args[0] for call in mock_get_entry.call_args_list]
+        assert decrypted.count("common") == 1
+        assert (out / "worker.env").read_text() == "REGION=eu\nQUEUE=jobs"
+
+    def test_export_tree_expands_references(self, client, tmp_path):
+        store = tmp_path / "store"
+        (store / "services" / "worker.gpg").write_text("QUEUE=jobs\nURL=amqp://${QUEUE}\n")
+        out = tmp_path / "out"
+
+        export_tree(client, ["services/worker"], str(out), ExportFormat.ENV)
+        assert (out / "worker.env").read_text() == "QUEUE=jobs\nURL=amqp://jobs"
+
+        export_tree(client, ["services/worker"], str(out), ExportFormat.ENV, raw=True)
+        assert (out / "worker.env").read_text() == "QUEUE=jobs\nURL=amqp://${QUEUE}"
@@ -0,0 +1,186 @@
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from passenv.cli import _is_fast_path, main
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent / "src")
+
+# Modules the eval'd commands must never pay for
+HEAVY_MODULES = {"typer", "click", "rich", "yaml", "csv", "shellingham", "passenv.main"}
+
+# Cumulative import time of passenv for `passenv status`, in microseconds
+IMPORT_BUDGET_US = 60_000
+
+
+def _run_main(argv):
+    with patch.object(sys, "argv", ["passenv"] + argv):
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+    return exc_info.value.code
+
+
+class TestFastPath:
+    def test_is_fast_path(self):
+        assert _is_fast_path(["load", "test/path"])
+        assert _is_fast_path(["load", "db", "api", "queue"])
+        assert _is_fast_path(["unload"])
+        assert _is_fast_path(["status"])
+        assert _is_fast_path(["load", "--if-changed", "test/path"])
+        assert _is_fast_path(["reload"])
+        assert _is_fast_path(["push", "test/debug"])
+        assert _is_fast_path(["pop"])
+        assert _is_fast_path(["load", "--if-changed", "--marker", "proj/.passenv"])
+
+        assert not _is_fast_path([])
+        assert not _is_fast_path(["list"])
+        assert not _is_fast_path(["load"])
+        assert not _is_fast_path(["load", "--help"])
+        assert not _is_fast_path(["status", "extra"])
+        assert not _is_fast_path(["load", "--if-changed"])
+        assert not _is_fast_path(["status", "--if-changed"])
+        assert not _is_fast_path(["push"])
+        assert not _is_fast_path(["pop", "extra"])
+        assert not _is_fast_path(["load", "--marker"])
+        assert not _is_fast_path(["load", "--marker", "proj/.passenv", "app/env"])
+
+    def test_is_fast_path_exec(self):
+        assert _is_fast_path(["exec", "api/keys", "--", "env"])
+        assert _is_fast_path(["exec", "--clean-env", "db", "api", "--", "sh", "-c", "env"])
+
+        assert not _is_fast_path(["exec", "api/keys"])
+        assert not _is_fast_path(["exec", "api/keys", "--"])
+        assert not _is_fast_path(["exec", "--", "env"])
+        assert not _is_fast_path(["exec", "--help", "--", "env"])
+
+    def test_is_fast_path_completion(self, monkeypatch):
+        monkeypatch.setenv("_PASSENV_COMPLETE", "bash_complete")
+
+        assert not _is_fast_path(["load", "test/path"])
+
+    def test_load(self, capsys):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            mock_instance = Mock()
+            mock_instance.load.return_value = 'export TEST_VAR="value"'
+            mock_instance.conflict_warnings.return_value = []
+            mock_passenv.return_value = mock_instance
+
+            assert _run_main(["load", "test/path"]) == 0
+
+            mock_instance.load.assert_called_once_with("test/path", if_changed=False)
+            assert capsys.readouterr().out == 'export TEST_VAR="value"\n'
+
+    def test_load_if_changed_unchanged(self, capsys):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.load.return_value = ""
+            mock_instance.conflict_warnings.return_value = []
+
+            assert _run_main(["load", "--if-changed", "test/path"]) == 0
+
+            mock_instance.load.assert_called_once_with("test/path", if_changed=True)
+            assert capsys.readouterr().out == ""
+
+    def test_hook(self, capsys):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            assert _run_main(["hook", "bash"]) == 0
+
+            mock_passenv.assert_not_called()
+            assert "_passenv_hook()" in capsys.readouterr().out
+
+    def test_error(self, capsys):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            mock_passenv.return_value.unload.side_effect = Exception("Test error")
+
+            assert _run_main(["unload"]) == 1
+
+            assert capsys.readouterr().err == "Error: Test error\n"
+
+    def test_exec(self):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.environment.return_value = {"API_KEY": "secret"}
+            mock_instance.conflict_warnings.return_value = []
+
+            _run_main(["exec", "--clean-env", "api/keys", "--", "env", "--timings"])
+
+            mock_instance.environment.assert_called_once_with("api/keys", clean=True)
+            mock_instance.exec_command.assert_called_once_with(
+                ["env", "--timings"], {"API_KEY": "secret"}
+            )
+
+    def test_exec_command_not_found(self, capsys):
+        with patch("passenv.core.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.conflict_warnings.return_value = []
+            mock_instance.exec_command.side_effect = FileNotFoundError("Command 'x' not found")
+
+            assert _run_main(["exec", "api/keys", "--", "x"]) == 127
+
+            assert capsys.readouterr().err == "Error: Command 'x' not found\n"
+
+    def test_exec_keeps_exit_status_and_signals(self, tmp_path):
+        (tmp_path / "app").mkdir()
+        (tmp_path / "app" / "env.gpg").write_text("API_KEY=secret\n")
+        env = dict(os.environ, PYTHONPATH=SRC_DIR, PASSENV_BACKEND=f"dir:{tmp_path}")
+        command = [sys.executable, "-m", "passenv.cli", "exec", "app/env", "--", "sh", "-c"]
+
+        result = subprocess.run(
+            [*command, 'echo "$API_KEY"; exit 7'], capture_output=True, text=True, env=env
+        )
+        assert result.returncode == 7
+        assert result.stdout == "secret\n"
+
+        result = subprocess.run([*command, "kill -TERM $$"], env=env)
+        assert result.returncode == -signal.SIGTERM
+
+    def test_other_commands_use_typer(self):
+        with patch("passenv.main.app") as mock_app:
+            with patch.object(sys, "argv", ["passenv", "list"]):
+                main()
+
+            mock_app.assert_called_once_with()
+
+
+class TestImportTime:
+    def _importtime(self):
+        env = dict(os.environ, PYTHONPATH=SRC_DIR, PATH="")
+        code = "import sys; sys.argv = ['passenv', 'status']; from passenv.cli import main; main()"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+
+        imports = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                # Nested imports are indented below the module that triggered them
+                imports[name[1:]] = int(cumulative)
+        return imports
+
+    def test_fast_path_skips_heavy_modules(self):
+        imports = self._importtime()
+
+        names = {name.strip() for name in imports}
+
+        assert "passenv.core" in names
+        assert HEAVY_MODULES.isdisjoint(names)
+
+    def test_fast_path_import_budget(self):
+        # Best of a few runs, so a busy machine does not fail the budget
+        passenv_time = min(
+            sum(us for name, us in self._importtime().items() if name.split(".")[0] == "passenv")
+            for _ in range(3)
+        )
+
+        assert passenv_time < IMPORT_BUDGET_US
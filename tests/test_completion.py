@@ -1,5 +1,7 @@
 from unittest.mock import Mock, patch
 
+import pytest
+
 from passenv.completion import complete_pass_entries
 
 
@@ -16,7 +18,7 @@ class TestCompletion:
 
             result = complete_pass_entries("database/")
 
-            assert result == ["database/staging", "database/production"]
+            assert result == ["database/production", "database/staging"]
 
     def test_complete_pass_entries_error(self):
         with patch("passenv.completion.PassClient") as mock_client:
@@ -25,3 +27,58 @@ class TestCompletion:
             result = complete_pass_entries("database/")
 
             assert result == []
+
+    def test_complete_pass_entries_uses_index(self, password_store):
+        with patch("passenv.completion.PassClient") as mock_client:
+            result = complete_pass_entries("database/")
+
+            mock_client.assert_not_called()
+
+        assert result == ["database/production", "database/staging"]
+
+
+@pytest.fixture
+def nested_store(isolated_store):
+    for entry in [
+        "svc/api/prod",
+        "svc/api/staging",
+        "svc/db/prod",
+        "svc/db-legacy",
+        "tools/ci/deploy/token",
+        "root",
+    ]:
+        path = isolated_store / f"{entry}.gpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"encrypted")
+    (isolated_store / ".gpg-id").write_text("test@example.com\n")
+    return isolated_store
+
+
+class TestSegmentCompletion:
+    def test_one_segment_at_a_time(self, nested_store):
+        assert complete_pass_entries("") == ["root", "svc/", "tools/"]
+        assert complete_pass_entries("svc/") == ["svc/api/", "svc/db-legacy", "svc/db/"]
+        assert complete_pass_entries("svc/d") == ["svc/db-legacy", "svc/db/"]
+        assert complete_pass_entries("svc/api/") == ["svc/api/prod", "svc/api/staging"]
+
+    def test_lone_directory_is_entered(self, nested_store):
+        assert complete_pass_entries("svc/a") == ["svc/api/prod", "svc/api/staging"]
+        assert complete_pass_entries("t") == ["tools/ci/deploy/token"]
+
+    def test_full_paths(self, nested_store, monkeypatch):
+        monkeypatch.setenv("PASSENV_COMPLETION", "full")
+
+        assert complete_pass_entries("svc/d") == ["svc/db-legacy", "svc/db/prod"]
+
+    def test_fuzzy_fallback(self, nested_store, monkeypatch):
+        assert complete_pass_entries("apistg") == []
+        monkeypatch.setenv("PASSENV_COMPLETION", "fuzzy")
+
+        assert complete_pass_entries("apistg") == ["svc/api/staging"]
+        assert complete_pass_entries("svc/a") == ["svc/api/prod", "svc/api/staging"]
+
+    def test_segments_without_local_store(self):
+        with patch("passenv.completion.PassClient") as mock_client:
+            mock_client.return_value.list_entries.return_value = ["a/b/c", "a/d", "e"]
+
+            assert complete_pass_entries("a/") == ["a/b/", "a/d"]
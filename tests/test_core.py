@@ -1,15 +1,46 @@
+import json
 import os
+from unittest.mock import patch
 
 import pytest
 
+from passenv.backends import DirectoryBackend
 from passenv.core import PassEnv
+from passenv.pass_client import PassClient
+from passenv.session import Layer, state_path
+
+
+def apply_commands(output, monkeypatch):
+    """Apply load/unload output to os.environ the way the shell's eval would"""
+    for line in output.splitlines():
+        command, _, assignment = line.partition(" ")
+        if command == "unset":
+            monkeypatch.delenv(assignment, raising=False)
+        else:
+            key, _, value = assignment.partition("=")
+            value = value[1:-1].replace('\\"', '"').replace("\\$", "$").replace("\\`", "`")
+            value = value.replace("\\\\", "\\")
+            monkeypatch.setenv(key, value)
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "app").mkdir()
+    (tmp_path / "app" / "staging.gpg").write_text("API_KEY=staging\nDEBUG=1\n")
+    (tmp_path / "app" / "prod.gpg").write_text("API_KEY=prod\n")
+    return tmp_path
+
+
+@pytest.fixture
+def passenv(store, clean_env):
+    return PassEnv(PassClient(use_agent=False, backend=DirectoryBackend(str(store))))
 
 
 class TestPassEnv:
     def test_load_success(self, clean_env, mock_pass_client):
-        mock_pass_client.get_entry.return_value = (
+        mock_pass_client.get_entries.return_value = [
             "DATABASE_URL=postgres://localhost/test\nAPI_KEY=secret123"
-        )
+        ]
 
         passenv = PassEnv()
         result = passenv.load("test/path")
@@ -17,15 +48,16 @@ class TestPassEnv:
         expected_lines = [
             'export DATABASE_URL="postgres://localhost/test"',
             'export API_KEY="secret123"',
-            'export PASSENV_LOADED_VARS="DATABASE_URL,API_KEY"',
+            f'export PASSENV_SESSION="{passenv.state.session_id}"',
             'export PASSENV_SOURCE="test/path"',
         ]
 
         for line in expected_lines:
             assert line in result
+        assert passenv.loaded_vars() == ["DATABASE_URL", "API_KEY"]
 
     def test_load_with_existing_environment(self, clean_env, mock_pass_client):
-        mock_pass_client.get_entry.return_value = "NEW_VAR=value"
+        mock_pass_client.get_entries.return_value = ["NEW_VAR=value"]
 
         passenv = PassEnv()
         result = passenv.load("new/path")
@@ -33,6 +65,34 @@ class TestPassEnv:
         assert 'export NEW_VAR="value"' in result
         assert 'export PASSENV_SOURCE="new/path"' in result
 
+    def test_load_multiple_entries(self, clean_env, mock_pass_client):
+        mock_pass_client.get_entries.return_value = [
+            "DATABASE_URL=postgres://localhost/db\nAPI_KEY=first",
+            "API_KEY=second\nQUEUE_URL=amqp://localhost",
+            "QUEUE_URL=amqp://localhost",
+        ]
+        mock_pass_client.stat_entry.return_value = None
+
+        passenv = PassEnv()
+        result = passenv.load("db", "api", "queue")
+
+        mock_pass_client.get_entries.assert_called_once_with(
+            ["db", "api", "queue"], return_exceptions=True
+        )
+        assert result.splitlines() == [
+            'export DATABASE_URL="postgres://localhost/db"',
+            'export API_KEY="second"',
+            'export QUEUE_URL="amqp://localhost"',
+            f'export PASSENV_SESSION="{passenv.state.session_id}"',
+            'export PASSENV_SOURCE="db,api,queue"',
+        ]
+        assert passenv.state.layers == [Layer(["db", "api", "queue"], "-,-,-")]
+        # Identical values are not reported as conflicts
+        assert passenv.conflicts == [("API_KEY", "db", "api")]
+        assert passenv.conflict_warnings() == [
+            "Warning: API_KEY from 'api' overrides the value from 'db'"
+        ]
+
     def test_unload_success(self, clean_env):
         os.environ["PASSENV_LOADED_VARS"] = "DATABASE_URL,API_KEY"
         os.environ["PASSENV_SOURCE"] = "test/path"
@@ -91,3 +151,320 @@ class TestPassEnv:
             passenv._escape_value('with"quotes\\and\\backslash')
             == 'with\\"quotes\\\\and\\\\backslash'
         )
+        assert passenv._escape_value("$HOME $(id)") == "\\$HOME \\$(id)"
+        assert passenv._escape_value("`id`") == "\\`id\\`"
+
+    def test_environment(self, clean_env, mock_pass_client, monkeypatch):
+        monkeypatch.setenv("EXISTING", "kept")
+        mock_pass_client.get_entries.return_value = ["API_KEY=secret"]
+
+        env = PassEnv().environment("api/keys")
+
+        assert env["API_KEY"] == "secret"
+        assert env["EXISTING"] == "kept"
+
+    def test_environment_clean(self, clean_env, mock_pass_client, monkeypatch):
+        monkeypatch.setenv("EXISTING", "dropped")
+        mock_pass_client.get_entries.return_value = ["API_KEY=secret"]
+
+        assert PassEnv().environment("api/keys", clean=True) == {"API_KEY": "secret"}
+
+    def test_exec_command(self, mock_pass_client, monkeypatch):
+        monkeypatch.setenv("PATH", "/usr/bin:/bin")
+
+        with patch("os.execve") as mock_execve:
+            PassEnv().exec_command(["sh", "-c", "env"], {"API_KEY": "secret"})
+
+        executable, argv, env = mock_execve.call_args[0]
+        assert os.path.basename(executable) == "sh"
+        assert argv == ["sh", "-c", "env"]
+        assert env == {"API_KEY": "secret"}
+
+    def test_exec_command_not_found(self, mock_pass_client):
+        with patch("os.execve") as mock_execve:
+            with pytest.raises(FileNotFoundError, match="Command 'nonexistent' not found"):
+                PassEnv().exec_command(["nonexistent"], {"PATH": "/nonexistent"})
+
+        mock_execve.assert_not_called()
+
+
+class TestIfChanged:
+    def test_load_records_fingerprint(self, passenv, store):
+        passenv.load("app/staging")
+
+        stat = os.stat(store / "app" / "staging.gpg")
+        fingerprint = passenv.state.layers[0].fingerprint
+        assert fingerprint.startswith(f"{stat.st_mtime_ns}:{stat.st_size}:")
+
+    def test_if_changed_unchanged(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        with patch.object(passenv.pass_client, "get_entries") as mock_get_entries:
+            assert passenv.load("app/staging", if_changed=True) == ""
+            assert passenv.reload() == ""
+
+        mock_get_entries.assert_not_called()
+        assert "stale" not in passenv.status()
+
+    def test_if_changed_touched(self, passenv, store, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        os.utime(store / "app" / "staging.gpg", ns=(0, 0))
+
+        assert passenv.load("app/staging", if_changed=True) == ""
+
+    def test_if_changed_modified(self, passenv, store, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        (store / "app" / "staging.gpg").write_text("API_KEY=rotated\n")
+
+        assert passenv.status() == "Environment loaded from 'app/staging' (2 variables, stale)"
+        output = passenv.load("app/staging", if_changed=True)
+        assert 'export API_KEY="rotated"' in output
+        apply_commands(output, monkeypatch)
+        (store / "app" / "staging.gpg").write_text("API_KEY=rotated again\n")
+
+        assert 'export API_KEY="rotated again"' in passenv.reload()
+
+    def test_if_changed_other_entry(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        assert 'export API_KEY="prod"' in passenv.load("app/prod", if_changed=True)
+
+    def test_if_changed_without_fingerprint(self, passenv, monkeypatch):
+        monkeypatch.setenv("PASSENV_LOADED_VARS", "API_KEY,DEBUG")
+        monkeypatch.setenv("PASSENV_SOURCE", "app/staging")
+
+        assert passenv.load("app/staging", if_changed=True) != ""
+        assert "stale" not in passenv.status()
+
+    def test_if_changed_included_entry(self, passenv, store, monkeypatch):
+        (store / "common.gpg").write_text("REGION=eu\n")
+        (store / "app" / "staging.gpg").write_text("@include common\nAPI_KEY=staging\n")
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        assert passenv.state.layers[0].includes == ["common"]
+        assert passenv.load("app/staging", if_changed=True) == ""
+        (store / "common.gpg").write_text("REGION=us\n")
+
+        assert "stale" in passenv.status()
+        assert 'export REGION="us"' in passenv.reload()
+
+    def test_reload_nothing_loaded(self, passenv):
+        with pytest.raises(RuntimeError, match="No environment currently loaded"):
+            passenv.reload()
+
+
+class TestSwitching:
+    def test_switch_emits_only_the_difference(self, passenv, store, monkeypatch):
+        (store / "app" / "prod.gpg").write_text("API_KEY=prod\nDEBUG=1\nREGION=eu\n")
+        (store / "app" / "other.gpg").write_text("API_KEY=prod\n")
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        lines = passenv.load("app/prod").splitlines()
+
+        assert lines[:2] == ['export API_KEY="prod"', 'export REGION="eu"']
+        assert passenv.loaded_vars() == ["API_KEY", "DEBUG", "REGION"]
+        apply_commands("\n".join(lines), monkeypatch)
+
+        lines = passenv.load("app/other").splitlines()
+
+        assert lines[:2] == ["unset DEBUG", "unset REGION"]
+        assert passenv.loaded_vars() == ["API_KEY"]
+        assert not any(line.startswith("export API_KEY") for line in lines)
+
+    def test_switch_exports_values_changed_in_the_shell(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        monkeypatch.setenv("API_KEY", "edited")
+        monkeypatch.delenv("DEBUG")
+
+        lines = passenv.load("app/staging").splitlines()
+
+        assert lines[:2] == ['export API_KEY="staging"', 'export DEBUG="1"']
+
+    def test_switch_result_matches_a_fresh_load(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        apply_commands(passenv.load("app/prod"), monkeypatch)
+
+        assert os.environ["API_KEY"] == "prod"
+        assert "DEBUG" not in os.environ
+        assert passenv.status() == "Environment loaded from 'app/prod' (1 variables)"
+
+
+class TestSession:
+    def test_state_file(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        path = state_path(os.environ["PASSENV_SESSION"])
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        with open(path) as f:
+            content = f.read()
+        assert "API_KEY" in content
+        assert "staging" not in content.replace("app/staging", "")
+        assert "PASSENV_LOADED_VARS" not in os.environ
+
+    def test_status_from_state_file(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        with patch.object(passenv.pass_client, "get_entries") as mock_get_entries:
+            status = PassEnv(passenv.pass_client).status()
+
+        assert status == "Environment loaded from 'app/staging' (2 variables)"
+        mock_get_entries.assert_not_called()
+
+    def test_push_pop(self, passenv, store, monkeypatch):
+        (store / "app" / "debug.gpg").write_text("DEBUG=0\nTRACE=1\n")
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        output = passenv.push("app/debug")
+        assert output.splitlines()[:2] == ['export DEBUG="0"', 'export TRACE="1"']
+        apply_commands(output, monkeypatch)
+        assert (
+            passenv.status() == "Environment loaded from 'app/staging' + 'app/debug' (3 variables)"
+        )
+
+        output = passenv.pop()
+        assert output.splitlines()[:2] == ["unset TRACE", 'export DEBUG="1"']
+        apply_commands(output, monkeypatch)
+        assert passenv.status() == "Environment loaded from 'app/staging' (2 variables)"
+
+        apply_commands(passenv.pop(), monkeypatch)
+        assert not passenv.is_loaded()
+        assert "API_KEY" not in os.environ
+        assert "PASSENV_SESSION" not in os.environ
+
+        with pytest.raises(RuntimeError, match="No environment currently loaded"):
+            passenv.pop()
+
+    def test_unload_forgets_state(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        apply_commands(passenv.unload(), monkeypatch)
+
+        assert "PASSENV_SESSION" not in os.environ
+        assert not passenv.is_loaded()
+
+    def test_every_save_gets_a_new_session(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        first = os.environ["PASSENV_SESSION"]
+
+        apply_commands(passenv.load("app/prod"), monkeypatch)
+
+        assert os.environ["PASSENV_SESSION"] != first
+
+    def test_stale_state_files_are_removed(self, passenv, isolated_runtime, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        stale = state_path(os.environ["PASSENV_SESSION"])
+        os.utime(stale, (0, 0))
+        apply_commands(passenv.load("app/prod"), monkeypatch)
+        recent = state_path(os.environ["PASSENV_SESSION"])
+        apply_commands(passenv.push("app/staging"), monkeypatch)
+
+        assert not os.path.exists(stale)
+        assert os.path.exists(recent)
+        assert len(os.listdir(isolated_runtime)) == 2
+
+    def test_child_shell_leaves_parent_state_alone(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        parent_env = dict(os.environ)
+
+        # A child shell inherits the parent's environment, PASSENV_SESSION included
+        apply_commands(passenv.load("app/prod"), monkeypatch)
+        apply_commands(passenv.unload(), monkeypatch)
+        assert not passenv.is_loaded()
+
+        # Back in the parent, whose environment the child could not change
+        for key in set(os.environ) - set(parent_env):
+            monkeypatch.delenv(key)
+        for key, value in parent_env.items():
+            monkeypatch.setenv(key, value)
+        assert passenv.status() == "Environment loaded from 'app/staging' (2 variables)"
+        assert passenv.unload().splitlines()[:2] == ["unset API_KEY", "unset DEBUG"]
+
+    def test_legacy_variables_are_migrated(self, passenv, monkeypatch):
+        monkeypatch.setenv("PASSENV_LOADED_VARS", "API_KEY,OLD_VAR")
+        monkeypatch.setenv("PASSENV_SOURCE", "app/old")
+
+        lines = passenv.load("app/prod").splitlines()
+
+        assert "unset OLD_VAR" in lines
+        assert "unset PASSENV_LOADED_VARS" in lines
+        apply_commands("\n".join(lines), monkeypatch)
+        assert passenv.status() == "Environment loaded from 'app/prod' (1 variables)"
+
+    def test_state_with_invalid_names_is_ignored(self, passenv, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        path = state_path(os.environ["PASSENV_SESSION"])
+        with open(path) as f:
+            data = json.load(f)
+        data["variables"].append("FOO;echo INJECTED")
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+        assert not PassEnv(passenv.pass_client).is_loaded()
+        assert "INJECTED" not in passenv.load("app/prod")
+
+    def test_legacy_variables_with_invalid_names_are_ignored(self, passenv, monkeypatch):
+        monkeypatch.setenv("PASSENV_LOADED_VARS", "API_KEY,$(touch pwned)")
+
+        assert not passenv.is_loaded()
+        assert "pwned" not in passenv.load("app/prod")
+
+    def test_state_in_shared_runtime_dir_is_ignored(self, passenv, isolated_runtime, monkeypatch):
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+        isolated_runtime.chmod(0o777)
+
+        assert not PassEnv(passenv.pass_client).is_loaded()
+        with pytest.raises(RuntimeError, match="Refusing to use"):
+            passenv.load("app/prod")
+
+    def test_invalid_session_id_is_ignored(self, passenv, monkeypatch):
+        monkeypatch.setenv("PASSENV_SESSION", "../../etc/passwd")
+
+        assert not passenv.is_loaded()
+        assert "export PASSENV_SESSION" in passenv.load("app/prod")
+        assert passenv.state.session_id != "../../etc/passwd"
+
+
+class TestInterpolation:
+    def test_across_entries(self, passenv, store):
+        (store / "common.gpg").write_text("DB_HOST=db.internal\n")
+        (store / "app" / "prod.gpg").write_text("@include common\nURL=postgres://${DB_HOST}/app\n")
+
+        variables = passenv.get_variables("app/staging", "app/prod")
+
+        assert variables["URL"] == "postgres://db.internal/app"
+
+    def test_later_entry_overrides_referenced_value(self, passenv, store):
+        (store / "base.gpg").write_text("HOST=localhost\nURL=http://${HOST}/\n")
+
+        assert passenv.get_variables("base", "app/prod")["URL"] == "http://localhost/"
+        (store / "app" / "prod.gpg").write_text("HOST=example.com\n")
+        assert passenv.get_variables("base", "app/prod")["URL"] == "http://example.com/"
+
+    def test_raw(self, passenv, store):
+        (store / "app" / "prod.gpg").write_text("API_KEY=${MISSING:-none}\n")
+
+        assert passenv.get_variables("app/prod", raw=True) == {"API_KEY": "${MISSING:-none}"}
+        assert passenv.get_variables("app/prod") == {"API_KEY": "none"}
+
+    def test_host_environment_skips_loaded_variables(self, passenv, store, monkeypatch):
+        (store / "app" / "prod.gpg").write_text("URL=${API_KEY:-unset}/${USER}\n")
+        monkeypatch.setenv("USER", "alice")
+        apply_commands(passenv.load("app/staging"), monkeypatch)
+
+        # API_KEY in the environment is staging's, which loading prod replaces
+        assert passenv.get_variables("app/prod") == {"URL": "unset/alice"}
+
+    def test_load_escapes_expanded_dollars(self, passenv, store, monkeypatch):
+        (store / "app" / "prod.gpg").write_text("TEMPLATE=$${HOME}\n")
+
+        output = passenv.load("app/prod")
+
+        assert 'export TEMPLATE="\\${HOME}"' in output
+        apply_commands(output, monkeypatch)
+        assert os.environ["TEMPLATE"] == "${HOME}"
+
+    def test_cycle(self, passenv, store):
+        (store / "app" / "prod.gpg").write_text("A=${B}\nB=${A}\n")
+
+        with pytest.raises(ValueError, match="Reference cycle: A -> B -> A"):
+            passenv.get_variables("app/prod")
@@ -0,0 +1,236 @@
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from passenv.hook import (
+    allow,
+    deny,
+    find_marker,
+    hook_script,
+    marker_entries,
+    replace_shell_function,
+    shell_function,
+)
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent / "src")
+
+requires_bash = pytest.mark.skipif(shutil.which("bash") is None, reason="bash is not installed")
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """A store, a project directory with a marker and a passenv command logging its calls"""
+    store = tmp_path / "store"
+    (store / "app").mkdir(parents=True)
+    (store / "app" / "env.gpg").write_text("API_KEY=one\n")
+    (tmp_path / "proj" / "sub").mkdir(parents=True)
+    (tmp_path / "proj" / ".passenv").write_text("app/env\n")
+    allow(str(tmp_path / "proj" / ".passenv"))
+    (tmp_path / "other").mkdir()
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    passenv = bin_dir / "passenv"
+    passenv.write_text(
+        f'#!/bin/sh\necho "$@" >> {tmp_path}/calls\nexec {sys.executable} -m passenv.cli "$@"\n'
+    )
+    passenv.chmod(0o755)
+
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PYTHONPATH", SRC_DIR)
+    monkeypatch.setenv("PASSWORD_STORE_DIR", str(store))
+    monkeypatch.setenv("PASSENV_BACKEND", f"dir:{store}")
+    for key in ("PASSENV_SESSION", "PASSENV_SOURCE", "PASSENV_LOADED_VARS", "API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+    return tmp_path
+
+
+def run_bash(script):
+    result = subprocess.run(
+        ["bash", "-c", f'eval "$(command passenv hook bash)"\n{script}'],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.splitlines()
+
+
+class TestAllow:
+    def test_allowed_marker_entries(self, tmp_path):
+        marker = tmp_path / ".passenv"
+        marker.write_text("app/env\n  app/extra\n")
+
+        with pytest.raises(RuntimeError, match="is not allowed; run 'passenv allow'"):
+            marker_entries(str(marker))
+
+        assert allow(str(marker)) == ["app/env", "app/extra"]
+        assert marker_entries(str(marker)) == ["app/env", "app/extra"]
+
+    def test_changed_marker_has_to_be_allowed_again(self, tmp_path):
+        marker = tmp_path / ".passenv"
+        marker.write_text("app/env\n")
+        allow(str(marker))
+
+        marker.write_text("app/env other/secrets\n")
+
+        with pytest.raises(RuntimeError, match="is not allowed"):
+            marker_entries(str(marker))
+
+    def test_deny(self, tmp_path):
+        marker = tmp_path / ".passenv"
+        marker.write_text("app/env\n")
+        allow(str(marker))
+
+        assert deny(str(marker))
+        assert not deny(str(marker))
+        with pytest.raises(RuntimeError, match="is not allowed"):
+            marker_entries(str(marker))
+
+    def test_find_marker(self, tmp_path):
+        (tmp_path / "proj" / "sub").mkdir(parents=True)
+        marker = tmp_path / "proj" / ".passenv"
+        marker.write_text("app/env\n")
+
+        assert find_marker(str(tmp_path / "proj" / "sub")) == str(marker)
+        assert find_marker(str(marker)) == str(marker)
+        with pytest.raises(RuntimeError, match="No .passenv file"):
+            find_marker(str(tmp_path))
+
+
+class TestHookScript:
+    def test_shell_function(self):
+        assert 'load|reload|push|pop|unload)\n            eval "$(command passenv "$@")"' in (
+            shell_function("bash")
+        )
+        assert "case load reload push pop unload" in shell_function("fish")
+
+    def test_hook_script(self):
+        assert "PROMPT_COMMAND" in hook_script("bash")
+        assert "add-zsh-hook precmd _passenv_hook" in hook_script("zsh")
+        assert "${=_passenv_hook_entries}" in hook_script("zsh")
+        assert "--on-event fish_prompt" in hook_script("fish")
+
+    def test_unsupported_shell(self):
+        with pytest.raises(RuntimeError, match="Unsupported shell 'tcsh'"):
+            hook_script("tcsh")
+
+    def test_replace_shell_function(self):
+        old = "set -x EDITOR vi\n# Added by passenv\n\nfunction passenv\n    echo old\nend\n"
+
+        updated = replace_shell_function(old, shell_function("fish"))
+
+        assert updated == "set -x EDITOR vi\n# Added by passenv\n" + shell_function("fish")
+        assert replace_shell_function("function passenv\nend\n", shell_function("fish")) is None
+
+    @requires_bash
+    def test_bash_syntax(self):
+        subprocess.run(["bash", "-n"], input=hook_script("bash"), text=True, check=True)
+
+
+@requires_bash
+class TestBashHook:
+    def test_loads_and_unloads_with_the_directory(self, project):
+        lines = run_bash(f"""
+            cd {project}/proj/sub; _passenv_hook; echo "$API_KEY"
+            cd {project}/other; _passenv_hook; echo "${{API_KEY-unset}} ${{PASSENV_SESSION-unset}}"
+            """)
+
+        assert lines == ["one", "unset unset"]
+
+    def test_function_switches_between_entries(self, project):
+        (project / "store" / "app" / "env.gpg").write_text("API_KEY=one\nONLY_ONE=1\n")
+        (project / "store" / "app" / "two.gpg").write_text("API_KEY='two  *'\n")
+
+        lines = run_bash("""
+            passenv load app/env; first=$PASSENV_SESSION
+            passenv load app/two
+            echo "$API_KEY"; echo "${ONLY_ONE-unset}"
+            [ "$PASSENV_SESSION" != "$first" ] && passenv status
+            """)
+
+        assert lines == ["two  *", "unset", "Environment loaded from 'app/two' (1 variables)"]
+
+    def test_function_does_not_run_values(self, project):
+        value = f"`touch {project}/pwned` $(touch {project}/pwned) $HOME"
+        (project / "store" / "app" / "env.gpg").write_text(f"B={value}\n")
+
+        lines = run_bash('passenv load app/env; echo "$B"')
+
+        assert lines == [value]
+        assert not (project / "pwned").exists()
+
+    def test_unchanged_prompt_does_not_start_passenv(self, project):
+        run_bash(f"cd {project}/proj; _passenv_hook; _passenv_hook; _passenv_hook")
+
+        calls = (project / "calls").read_text().splitlines()
+        assert calls == ["hook bash", f"load --if-changed --marker {project}/proj/.passenv"]
+
+    def test_reloads_changed_entry(self, project):
+        lines = run_bash(f"""
+            cd {project}/proj; _passenv_hook
+            sleep 0.01; echo API_KEY=two > {project}/store/app/env.gpg
+            _passenv_hook; echo "$API_KEY"
+            """)
+
+        assert lines == ["two"]
+
+    def test_touched_entry_is_checked_once(self, project):
+        run_bash(f"""
+            cd {project}/proj; _passenv_hook
+            sleep 0.01; touch {project}/store/app/env.gpg
+            _passenv_hook; _passenv_hook
+            """)
+
+        calls = (project / "calls").read_text().splitlines()
+        assert calls.count(f"load --if-changed --marker {project}/proj/.passenv") == 2
+
+    def test_keeps_exit_status(self, project):
+        lines = run_bash(f"cd {project}/proj; false; _passenv_hook; echo $?")
+
+        assert lines == ["1"]
+
+    def test_unallowed_marker_is_not_loaded(self, project):
+        # Changed since the project fixture allowed it
+        (project / "proj" / ".passenv").write_text("app/env\n\n")
+
+        lines = run_bash(f"""
+            cd {project}/proj; _passenv_hook; _passenv_hook; echo "${{API_KEY-unset}}"
+            passenv allow > /dev/null; _passenv_hook; echo "$API_KEY"
+            passenv deny > /dev/null; _passenv_hook; echo "${{API_KEY-unset}}"
+            """)
+
+        assert lines == ["unset", "one", "unset"]
+        calls = (project / "calls").read_text().splitlines()
+        assert calls.count(f"load --if-changed --marker {project}/proj/.passenv") == 3
+
+    def test_entries_are_not_glob_expanded(self, project):
+        (project / "proj" / ".passenv").write_text("app/env *\n")
+        allow(str(project / "proj" / ".passenv"))
+
+        lines = run_bash(f"""
+            cd {project}/proj; _passenv_hook 2> /dev/null
+            printf '%s\\n' "${{_passenv_hook_entries[@]}}"
+            """)
+
+        assert lines == ["app/env", "*"]
+
+    def test_failed_load_is_not_retried_in_the_same_directory(self, project):
+        (project / "proj" / ".passenv").write_text("app/missing\n")
+        allow(str(project / "proj" / ".passenv"))
+
+        result = subprocess.run(
+            [
+                "bash",
+                "-c",
+                f'eval "$(command passenv hook bash)"\ncd {project}/proj\n'
+                "_passenv_hook; _passenv_hook",
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.stderr.count("Pass entry 'app/missing' not found") == 1
@@ -0,0 +1,139 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from passenv.backends import MemoryBackend
+from passenv.includes import IncludeResolver
+from passenv.pass_client import PassClient
+
+
+class CountingBackend(MemoryBackend):
+    """MemoryBackend recording every decryption and batch"""
+
+    def __init__(self, entries):
+        super().__init__(entries)
+        self.decrypted = []
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def get_entry(self, path):
+        with self.lock:
+            self.decrypted.append(path)
+        return super().get_entry(path)
+
+    def get_entries(self, paths, return_exceptions=False):
+        self.batches.append(list(paths))
+        return super().get_entries(paths, return_exceptions=return_exceptions)
+
+
+@pytest.fixture
+def backend():
+    return CountingBackend(
+        {
+            "svc/api": "@include common/logging\n@include common/region\nAPI_KEY=api\n",
+            "svc/worker": "@include common/region\nQUEUE=jobs\nREGION=override\n",
+            "common/logging": "LOG_LEVEL=info\n@include common/base\nLOG_FORMAT=json\n",
+            "common/region": "@include common/base\nREGION=eu-west-1\n",
+            "common/base": "ORG=acme\nLOG_LEVEL=warn\n",
+            "loop/a": "@include loop/b\nA=1\n",
+            "loop/b": "@include loop/a\nB=1\n",
+            "bad/parent": "@include bad/child\nP=1\n",
+            "bad/child": "not valid\n",
+            "missing/parent": "@include missing/child\nP=1\n",
+        }
+    )
+
+
+@pytest.fixture
+def resolver(backend):
+    return IncludeResolver(PassClient(use_agent=False, backend=backend))
+
+
+class TestIncludeResolver:
+    def test_includes_merge_in_place(self, resolver):
+        resolver.fetch(["svc/api", "svc/worker"])
+
+        # Later lines override earlier ones, including the variables an @include brings in
+        assert resolver.variables("svc/api") == {
+            "LOG_LEVEL": "warn",
+            "ORG": "acme",
+            "LOG_FORMAT": "json",
+            "REGION": "eu-west-1",
+            "API_KEY": "api",
+        }
+        assert resolver.variables("svc/worker")["REGION"] == "override"
+
+    def test_each_entry_decrypted_once(self, resolver, backend):
+        resolver.fetch(["svc/api", "svc/worker"])
+        resolver.variables("svc/api")
+        resolver.variables("svc/worker")
+
+        assert sorted(backend.decrypted) == sorted(
+            ["svc/api", "svc/worker", "common/logging", "common/region", "common/base"]
+        )
+
+    def test_independent_includes_fetched_together(self, resolver, backend):
+        resolver.fetch(["svc/api"])
+
+        assert backend.batches == [
+            ["svc/api"],
+            ["common/logging", "common/region"],
+            ["common/base"],
+        ]
+
+    def test_cycle(self, resolver):
+        resolver.fetch(["loop/a"])
+
+        with pytest.raises(ValueError, match="Include cycle: 'loop/a' -> 'loop/b' -> 'loop/a'"):
+            resolver.variables("loop/a")
+
+    def test_error_in_included_entry(self, resolver):
+        with pytest.raises(ValueError, match="In 'bad/child' included from 'bad/parent': Invalid"):
+            resolver.variables("bad/parent")
+
+    def test_missing_include(self, resolver):
+        resolver.fetch(["missing/parent"])
+
+        with pytest.raises(RuntimeError, match="Pass entry 'missing/child' not found"):
+            resolver.variables("missing/parent")
+
+    def test_failed_entry_keeps_the_other_entries(self, resolver, backend):
+        resolver.fetch(["common/base", "missing/child", "common/region"])
+
+        assert resolver.variables("common/base") == {"ORG": "acme", "LOG_LEVEL": "warn"}
+        with pytest.raises(RuntimeError, match="not found"):
+            resolver.content("missing/child")
+        # Nothing is decrypted a second time to find out which entry failed
+        assert sorted(backend.decrypted) == ["common/base", "common/region", "missing/child"]
+
+    def test_failed_batch_fails_its_entries(self, resolver, backend):
+        with patch.object(backend, "get_entries", side_effect=RuntimeError("gpg failed")):
+            resolver.fetch(["common/base", "common/region"])
+
+        for path in ("common/base", "common/region"):
+            with pytest.raises(RuntimeError, match="gpg failed"):
+                resolver.content(path)
+        assert backend.decrypted == []
+
+    def test_included(self, resolver):
+        resolver.fetch(["svc/api"])
+
+        assert resolver.included(["svc/api"]) == [
+            "common/base",
+            "common/logging",
+            "common/region",
+        ]
+        assert resolver.included(["common/base"]) == []
+
+    def test_shared_between_threads(self, resolver, backend):
+        threads = [
+            threading.Thread(target=resolver.fetch, args=(["svc/api", "svc/worker"],))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(backend.decrypted) == sorted(set(backend.decrypted))
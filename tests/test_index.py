@@ -0,0 +1,120 @@
+import os
+
+from passenv.index import EntryIndex, fuzzy_score, index_path
+from passenv.store import iter_store_entries
+
+
+class TestEntryIndex:
+    def test_prefix_lookup(self, password_store):
+        index = EntryIndex.load(str(password_store))
+
+        assert len(index) == 4
+        assert index.prefix("database/") == ["database/production", "database/staging"]
+        assert index.prefix("a") == ["api/keys"]
+        assert index.prefix("zzz") == []
+        assert index.prefix("") == list(index)
+
+    def test_index_is_persisted(self, password_store):
+        EntryIndex.load(str(password_store))
+
+        assert os.path.isfile(index_path(str(password_store)))
+
+    def test_cached_index_is_reused(self, password_store):
+        root = str(password_store)
+        EntryIndex.load(root)
+        # An entry added behind the store's back without touching directory mtimes
+        stat = os.stat(password_store / "api")
+        (password_store / "api" / "hidden.gpg").write_bytes(b"")
+        os.utime(password_store / "api", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert EntryIndex.load(root).prefix("api/") == ["api/keys"]
+
+    def test_directory_mtime_invalidates(self, password_store):
+        root = str(password_store)
+        EntryIndex.load(root)
+        (password_store / "api" / "new.gpg").write_bytes(b"")
+        stat = os.stat(password_store / "api")
+        os.utime(password_store / "api", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        assert EntryIndex.load(root).prefix("api/") == ["api/keys", "api/new"]
+
+    def test_git_head_invalidates(self, password_store):
+        root = str(password_store)
+        git_dir = password_store / ".git"
+        (git_dir / "refs" / "heads").mkdir(parents=True)
+        (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+        (git_dir / "refs" / "heads" / "main").write_text("a" * 40 + "\n")
+        assert EntryIndex.load(root).validator == "git " + "a" * 40
+
+        (password_store / "api" / "new.gpg").write_bytes(b"")
+        assert EntryIndex.load(root).prefix("api/") == ["api/keys"]
+
+        (git_dir / "refs" / "heads" / "main").write_text("b" * 40 + "\n")
+        assert EntryIndex.load(root).prefix("api/") == ["api/keys", "api/new"]
+
+    def test_symlink_loops_are_listed_once(self, password_store):
+        (password_store / "api" / "loop").symlink_to(password_store)
+        (password_store / "database" / "self").symlink_to("self")
+        (password_store / "shared").symlink_to(password_store / "api")
+
+        entries = sorted(iter_store_entries(str(password_store)))
+        index = EntryIndex.load(str(password_store))
+
+        assert len(entries) == 4
+        assert "database/staging" in entries
+        assert list(index) == entries
+
+    def test_corrupt_index_is_rebuilt(self, password_store):
+        root = str(password_store)
+        path = index_path(root)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"garbage")
+
+        assert EntryIndex.load(root).prefix("root") == ["root"]
+
+    def test_segments(self, password_store):
+        index = EntryIndex.load(str(password_store))
+
+        assert index.segments("") == ["api/", "database/", "root"]
+        assert index.segments("d") == ["database/"]
+        assert index.segments("database/p") == ["database/production"]
+        assert index.segments("zzz") == []
+
+    def test_segments_skip_whole_directories(self):
+        entries = [f"big/{i:05}" for i in range(10_000)] + ["big-file", "big0", "small/x"]
+        index = EntryIndex.from_entries(entries)
+        reads = 0
+        entry = index._entry
+
+        def counting_entry(i):
+            nonlocal reads
+            reads += 1
+            return entry(i)
+
+        index._entry = counting_entry
+
+        assert index.segments("") == ["big-file", "big/", "big0", "small/"]
+        # A few binary searches, not a pass over the 10,000 entries below big/
+        assert reads < 200
+
+    def test_from_entries(self):
+        index = EntryIndex.from_entries(["b", "a/c", "a/b"])
+
+        assert list(index) == ["a/b", "a/c", "b"]
+        assert index.validator == ""
+
+    def test_fuzzy(self):
+        index = EntryIndex.from_entries(
+            ["svc/api/staging", "svc/api/prod", "archive/pi-stage-notes", "tools/x"]
+        )
+
+        assert index.fuzzy("apistg") == ["svc/api/staging", "archive/pi-stage-notes"]
+        assert index.fuzzy("APIprod") == ["svc/api/prod"]
+        assert index.fuzzy("zzz") == []
+        assert index.fuzzy("s", limit=2) == ["svc/api/prod", "svc/api/staging"]
+
+    def test_fuzzy_score_prefers_consecutive_and_word_starts(self):
+        assert fuzzy_score("api", "svc/api") > fuzzy_score("api", "svc/a-p-i")
+        assert fuzzy_score("db", "svc/db") > fuzzy_score("db", "svc/odbc")
+        assert fuzzy_score("ba", "abc") is None
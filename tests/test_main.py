@@ -1,9 +1,12 @@
+import os
 import tempfile
 from pathlib import Path
 from unittest.mock import Mock, mock_open, patch
 
 from typer.testing import CliRunner
 
+from passenv.bulk import EntryExport
+from passenv.exporters import ExportFormat
 from passenv.main import app
 
 
@@ -14,13 +17,14 @@ class TestCLI:
         with patch("passenv.main.PassEnv") as mock_passenv:
             mock_instance = Mock()
             mock_instance.load.return_value = 'export TEST_VAR="value"'
+            mock_instance.conflict_warnings.return_value = []
             mock_passenv.return_value = mock_instance
 
             result = runner.invoke(app, ["load", "test/path"])
 
             assert result.exit_code == 0
             assert 'export TEST_VAR="value"' in result.stdout
-            mock_instance.load.assert_called_once_with("test/path")
+            mock_instance.load.assert_called_once_with("test/path", if_changed=False)
 
     def test_load_command_error(self):
         runner = CliRunner()
@@ -83,12 +87,11 @@ class TestCLI:
 
         with patch("passenv.main.PassEnv") as mock_passenv:
             mock_instance = Mock()
-            return_value = "DATABASE_URL=postgres://localhost\nAPI_KEY=secret"
-            mock_instance.pass_client.get_entry.return_value = return_value
-            mock_instance.parser.parse.return_value = {
+            mock_instance.get_variables.return_value = {
                 "DATABASE_URL": "postgres://localhost",
                 "API_KEY": "secret",
             }
+            mock_instance.conflict_warnings.return_value = []
             mock_passenv.return_value = mock_instance
 
             result = runner.invoke(app, ["export", "test/path"])
@@ -102,8 +105,8 @@ class TestCLI:
 
         with patch("passenv.main.PassEnv") as mock_passenv:
             mock_instance = Mock()
-            mock_instance.pass_client.get_entry.return_value = "DATABASE_URL=postgres://localhost"
-            mock_instance.parser.parse.return_value = {"DATABASE_URL": "postgres://localhost"}
+            mock_instance.get_variables.return_value = {"DATABASE_URL": "postgres://localhost"}
+            mock_instance.conflict_warnings.return_value = []
             mock_passenv.return_value = mock_instance
 
             result = runner.invoke(app, ["export", "test/path", "--format", "yaml"])
@@ -111,6 +114,21 @@ class TestCLI:
             assert result.exit_code == 0
             assert "DATABASE_URL:" in result.stdout
 
+    def test_export_command_raw(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = Mock()
+            mock_instance.get_variables.return_value = {"URL": "http://${HOST}/"}
+            mock_instance.conflict_warnings.return_value = []
+            mock_passenv.return_value = mock_instance
+
+            result = runner.invoke(app, ["export", "test/path", "--raw"])
+
+            assert result.exit_code == 0
+            mock_instance.get_variables.assert_called_once_with("test/path", raw=True)
+            assert "URL=http://${HOST}/" in result.stdout
+
     def test_export_command_to_file(self):
         runner = CliRunner()
 
@@ -119,10 +137,8 @@ class TestCLI:
 
             with patch("passenv.main.PassEnv") as mock_passenv:
                 mock_instance = Mock()
-                env = "DATABASE_URL"
-                address = "postgres://localhost"
-                mock_instance.pass_client.get_entry.return_value = f"{env}={address}"
-                mock_instance.parser.parse.return_value = {env: address}
+                mock_instance.get_variables.return_value = {"DATABASE_URL": "postgres://localhost"}
+                mock_instance.conflict_warnings.return_value = []
                 mock_passenv.return_value = mock_instance
 
                 result = runner.invoke(app, ["export", "test/path", "--output", str(output_file)])
@@ -132,12 +148,62 @@ class TestCLI:
                 assert output_file.exists()
                 assert "DATABASE_URL=postgres://localhost" in output_file.read_text()
 
+    def test_export_command_to_unchanged_file(self, tmp_path):
+        runner = CliRunner()
+        output_file = tmp_path / "test.env"
+        output_file.write_text("DATABASE_URL=postgres://localhost")
+        os.utime(output_file, ns=(1_000_000_000, 1_000_000_000))
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.get_variables.return_value = {"DATABASE_URL": "postgres://localhost"}
+            mock_instance.conflict_warnings.return_value = []
+
+            result = runner.invoke(app, ["export", "test/path", "--output", str(output_file)])
+
+        assert result.exit_code == 0
+        assert f"{output_file} is unchanged (1 variables)" in result.stdout
+        assert output_file.stat().st_mtime_ns == 1_000_000_000
+
+    def test_load_command_multiple_entries(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = Mock()
+            mock_instance.load.return_value = 'export API_KEY="second"'
+            mock_instance.conflict_warnings.return_value = [
+                "Warning: API_KEY from 'b' overrides the value from 'a'"
+            ]
+            mock_passenv.return_value = mock_instance
+
+            result = runner.invoke(app, ["load", "a", "b"])
+
+            assert result.exit_code == 0
+            assert result.stdout == 'export API_KEY="second"\n'
+            assert "API_KEY from 'b' overrides" in result.stderr
+            mock_instance.load.assert_called_once_with("a", "b", if_changed=False)
+
+    def test_export_command_multiple_entries(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = Mock()
+            mock_instance.get_variables.return_value = {"A": "1", "B": "2"}
+            mock_instance.conflict_warnings.return_value = []
+            mock_passenv.return_value = mock_instance
+
+            result = runner.invoke(app, ["export", "a", "b", "--format", "json"])
+
+            assert result.exit_code == 0
+            assert '"B": "2"' in result.stdout
+            mock_instance.get_variables.assert_called_once_with("a", "b", raw=False)
+
     def test_export_command_error(self):
         runner = CliRunner()
 
         with patch("passenv.main.PassEnv") as mock_passenv:
             mock_instance = Mock()
-            mock_instance.pass_client.get_entry.side_effect = Exception("Test error")
+            mock_instance.get_variables.side_effect = Exception("Test error")
             mock_passenv.return_value = mock_instance
 
             result = runner.invoke(app, ["export", "test/path"])
@@ -145,6 +211,178 @@ class TestCLI:
             assert result.exit_code == 1
             assert "Error: Test error" in result.stderr
 
+    def test_export_recursive(self, tmp_path):
+        runner = CliRunner()
+        results = [
+            EntryExport("services/api", str(tmp_path / "api.env"), 2, 0.0123),
+            EntryExport("services/bad", str(tmp_path / "bad.env"), 0, 0.001, "Invalid line 1"),
+            EntryExport("services/db", str(tmp_path / "db.env"), 1, 0.002, changed=False),
+        ]
+
+        with patch("passenv.main.PassClient"), patch(
+            "passenv.main.export_tree", return_value=results
+        ) as mock_export_tree:
+            result = runner.invoke(
+                app, ["export", "--recursive", "services/", "--output-dir", str(tmp_path)]
+            )
+
+        assert result.exit_code == 1
+        assert mock_export_tree.call_args[0][1:] == (
+            ["services/"],
+            str(tmp_path),
+            ExportFormat.ENV,
+        )
+        assert mock_export_tree.call_args[1] == {"raw": False}
+        assert "12.3ms  services/api" in result.stdout
+        assert "(2 variables)" in result.stdout
+        assert "Failed: services/bad: Invalid line 1" in result.stderr
+        assert "(1 variables, unchanged)" in result.stdout
+        assert "Exported 2 of 3 entries" in result.stderr
+        assert "1 unchanged, 1 failed" in result.stderr
+
+    def test_export_recursive_requires_output_dir(self):
+        runner = CliRunner()
+
+        result = runner.invoke(app, ["export", "--recursive", "services/"])
+
+        assert result.exit_code == 1
+        assert "--output-dir" in result.stderr
+
+    def test_export_output_dir_requires_recursive(self, tmp_path):
+        runner = CliRunner()
+
+        result = runner.invoke(app, ["export", "services/", "--output-dir", str(tmp_path)])
+
+        assert result.exit_code == 1
+        assert "--output-dir requires --recursive" in result.stderr
+
+    def test_serve_stdio(self):
+        runner = CliRunner()
+
+        with patch("passenv.serve.PassClient") as mock_client:
+            mock_client.return_value.list_entries.return_value = ["api/keys"]
+            result = runner.invoke(app, ["serve", "--stdio"], input='{"id": 7, "op": "list"}\n')
+
+        assert result.exit_code == 0
+        assert result.stdout == '{"id": 7, "ok": true, "entries": ["api/keys"]}\n'
+
+    def test_serve_needs_one_transport(self, tmp_path):
+        runner = CliRunner()
+
+        for args in ([], ["--stdio", "--socket", str(tmp_path / "serve.sock")]):
+            result = runner.invoke(app, ["serve", *args])
+
+            assert result.exit_code == 1
+            assert "serve needs either --stdio or --socket" in result.stderr
+
+    def test_reload_command(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.reload.return_value = ""
+            mock_instance.conflict_warnings.return_value = []
+
+            result = runner.invoke(app, ["reload"])
+
+            assert result.exit_code == 0
+            assert result.stdout == ""
+
+    def test_push_pop_commands(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.push.return_value = 'export DEBUG="1"'
+            mock_instance.pop.return_value = "unset DEBUG"
+            mock_instance.conflict_warnings.return_value = []
+
+            result = runner.invoke(app, ["push", "app/debug"])
+            assert result.exit_code == 0
+            assert result.stdout == 'export DEBUG="1"\n'
+            mock_instance.push.assert_called_once_with("app/debug")
+
+            result = runner.invoke(app, ["pop"])
+            assert result.exit_code == 0
+            assert result.stdout == "unset DEBUG\n"
+
+    def test_exec_command(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.environment.return_value = {"API_KEY": "secret"}
+            mock_instance.conflict_warnings.return_value = []
+
+            runner.invoke(app, ["exec", "--clean-env", "a", "b", "--", "env", "-i", "--help"])
+
+            mock_instance.environment.assert_called_once_with("a", "b", clean=True)
+            mock_instance.exec_command.assert_called_once_with(
+                ["env", "-i", "--help"], {"API_KEY": "secret"}
+            )
+
+    def test_exec_command_missing_command(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            result = runner.invoke(app, ["exec", "api/keys"])
+
+            assert result.exit_code == 2
+            assert "Missing command" in result.stderr
+            mock_passenv.assert_not_called()
+
+    def test_exec_command_not_executable(self):
+        runner = CliRunner()
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_instance = mock_passenv.return_value
+            mock_instance.conflict_warnings.return_value = []
+            mock_instance.exec_command.side_effect = PermissionError("Permission denied")
+
+            result = runner.invoke(app, ["exec", "api/keys", "--", "./script"])
+
+            assert result.exit_code == 126
+            assert "Error: Permission denied" in result.stderr
+
+    def test_hook_command(self):
+        runner = CliRunner()
+
+        result = runner.invoke(app, ["hook", "zsh"])
+        assert result.exit_code == 0
+        assert "add-zsh-hook precmd _passenv_hook" in result.stdout
+
+        result = runner.invoke(app, ["hook", "tcsh"])
+        assert result.exit_code == 1
+        assert "Unsupported shell 'tcsh'" in result.stderr
+
+    def test_load_marker_command(self, tmp_path):
+        runner = CliRunner()
+        marker = tmp_path / ".passenv"
+        marker.write_text("app/env app/extra\n")
+
+        result = runner.invoke(app, ["load", "--marker", str(marker)])
+        assert result.exit_code == 1
+        assert "is not allowed; run 'passenv allow'" in result.stderr
+
+        result = runner.invoke(app, ["allow", str(tmp_path)])
+        assert result.exit_code == 0
+        assert result.stdout == f"Allowed {marker}: app/env app/extra\n"
+
+        with patch("passenv.main.PassEnv") as mock_passenv:
+            mock_passenv.return_value.load.return_value = ""
+            mock_passenv.return_value.conflict_warnings.return_value = []
+            result = runner.invoke(app, ["load", "--marker", str(marker)])
+
+            assert result.exit_code == 0
+            mock_passenv.return_value.load.assert_called_once_with(
+                "app/env", "app/extra", if_changed=False
+            )
+
+        result = runner.invoke(app, ["deny", str(marker)])
+        assert result.stdout == f"Denied {marker}\n"
+        result = runner.invoke(app, ["load", "--marker", str(marker), "app/env"])
+        assert "Name either entries or --marker, not both" in result.stderr
+
     def test_install_command_basic(self):
         runner = CliRunner()
 
@@ -224,6 +462,53 @@ class TestCLI:
             assert result.exit_code == 0
             assert "Restart your shell or run 'source" in result.stdout
 
+    OLD_FUNCTION = """
+# Added by passenv
+
+passenv() {
+    case "$1" in
+        load|unload)
+            eval $(command passenv "$@")
+            ;;
+        *)
+            command passenv "$@"
+            ;;
+    esac
+}
+"""
+
+    def _install(self, rc_file):
+        with patch("passenv.main._detect_shell_and_rc", return_value=("bash", str(rc_file))):
+            return CliRunner().invoke(app, ["install", "--skip-completion"])
+
+    def test_install_replaces_old_function(self, tmp_path):
+        rc_file = tmp_path / ".bashrc"
+        rc_file.write_text(f"export EDITOR=vi\n{self.OLD_FUNCTION}alias ll='ls -l'\n")
+
+        result = self._install(rc_file)
+
+        assert result.exit_code == 0
+        assert "passenv function updated" in result.stdout
+        content = rc_file.read_text()
+        assert content.count("passenv() {") == 1
+        assert "load|reload|push|pop|unload)" in content
+        assert content.startswith("export EDITOR=vi\n")
+        assert content.endswith("}\nalias ll='ls -l'\n")
+
+        result = self._install(rc_file)
+        assert "passenv function already exists" in result.stdout
+        assert rc_file.read_text() == content
+
+    def test_install_warns_about_own_function(self, tmp_path):
+        rc_file = tmp_path / ".bashrc"
+        rc_file.write_text(self.OLD_FUNCTION.replace("# Added by passenv", "# mine"))
+
+        result = self._install(rc_file)
+
+        assert result.exit_code == 0
+        assert "passenv hook bash" in result.stdout
+        assert "load|unload)" in rc_file.read_text()
+
     def test_list_command_empty(self):
         runner = CliRunner()
 
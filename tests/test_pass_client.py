@@ -37,6 +37,37 @@ class TestPassClient:
                 with pytest.raises(RuntimeError, match="Pass entry 'test/path' not found"):
                     client.get_entry("test/path")
 
+    def test_get_entries_preserves_order(self):
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            def show(argv, **kwargs):
+                return Mock(stdout=f"NAME={argv[-1]}")
+
+            with patch("subprocess.run", side_effect=show) as mock_run:
+                result = client.get_entries(["a", "b", "c"])
+
+                assert result == ["NAME=a", "NAME=b", "NAME=c"]
+                assert mock_run.call_count == 3
+
+    def test_get_entries_error(self):
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            def show(argv, **kwargs):
+                if argv[-1] == "missing":
+                    raise subprocess.CalledProcessError(1, "pass")
+                return Mock(stdout="A=1")
+
+            with patch("subprocess.run", side_effect=show):
+                with pytest.raises(RuntimeError, match="Pass entry 'missing' not found"):
+                    client.get_entries(["a", "missing"])
+
+                result = client.get_entries(["a", "missing"], return_exceptions=True)
+
+                assert result[0] == "A=1"
+                assert isinstance(result[1], RuntimeError)
+
     def test_list_entries_success(self):
         with patch("shutil.which", return_value="/usr/bin/pass"):
             client = PassClient()
@@ -67,3 +98,43 @@ class TestPassClient:
 
                 with pytest.raises(RuntimeError, match="Pass store not initialized"):
                     client.list_entries()
+
+    def test_list_entries_reads_store_directory(self, password_store):
+        (password_store / ".git" / "objects").mkdir(parents=True)
+        (password_store / ".git" / "objects" / "stray.gpg").write_bytes(b"")
+        (password_store / "database" / "notes.txt").write_text("not an entry")
+        (password_store / "odd").mkdir()
+        (password_store / "odd" / "├── name with spaces.gpg").write_bytes(b"")
+
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            with patch("subprocess.run") as mock_run:
+                result = client.list_entries()
+
+                mock_run.assert_not_called()
+
+        assert result == [
+            "api/keys",
+            "database/production",
+            "database/staging",
+            "odd/├── name with spaces",
+            "root",
+        ]
+
+    def test_iter_entries_is_lazy(self, password_store):
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            entries = client.iter_entries()
+
+            assert next(entries) in {"root", "api/keys", "database/staging", "database/production"}
+
+    def test_list_entries_store_without_gpg_id(self, password_store):
+        (password_store / ".gpg-id").unlink()
+
+        with patch("shutil.which", return_value="/usr/bin/pass"):
+            client = PassClient()
+
+            with pytest.raises(RuntimeError, match="Pass store not initialized"):
+                client.list_entries()
@@ -0,0 +1,197 @@
+import io
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from passenv.backends import MemoryBackend
+from passenv.pass_client import PassClient
+from passenv.serve import Server
+
+
+class GatedBackend(MemoryBackend):
+    """Hold back "slow" until released, so later requests can finish first"""
+
+    def __init__(self, entries):
+        super().__init__(entries)
+        self.release = threading.Event()
+
+    def get_entry(self, path):
+        if path == "slow":
+            assert self.release.wait(5)
+        return super().get_entry(path)
+
+
+@pytest.fixture
+def backend():
+    return GatedBackend(
+        {
+            "app/prod": "API_KEY=prod\nURL=https://${HOST:-example.com}/\n",
+            "app/staging": "API_KEY=staging\n",
+            "slow": "SLOW=1\n",
+        }
+    )
+
+
+@pytest.fixture
+def server(backend):
+    return Server(PassClient(use_agent=False, backend=backend))
+
+
+def request(server, **message):
+    return json.loads(server.respond(json.dumps(message)))
+
+
+class TestServer:
+    def test_get(self, server):
+        assert request(server, id=1, op="get", paths=["app/prod"]) == {
+            "id": 1,
+            "ok": True,
+            "variables": {"API_KEY": "prod", "URL": "https://example.com/"},
+        }
+
+    def test_get_raw_with_warnings(self, server):
+        response = request(server, id="a", op="get", paths=["app/prod", "app/staging"], raw=True)
+
+        assert response["variables"]["URL"] == "https://${HOST:-example.com}/"
+        assert response["warnings"] == [
+            "Warning: API_KEY from 'app/staging' overrides the value from 'app/prod'"
+        ]
+
+    def test_list(self, server):
+        assert request(server, op="list") == {
+            "id": None,
+            "ok": True,
+            "entries": ["app/prod", "app/staging", "slow"],
+        }
+
+    def test_export(self, server):
+        response = request(server, id=2, op="export", paths=["app/staging"], format="json")
+
+        assert json.loads(response["content"]) == {"API_KEY": "staging"}
+
+    def test_export_defaults_to_env(self, server):
+        response = request(server, op="export", paths=["app/staging"])
+
+        assert response["content"] == "API_KEY=staging"
+
+    def test_export_to_file(self, server, tmp_path):
+        output = str(tmp_path / "staging.env")
+
+        response = request(server, op="export", paths=["app/staging"], output=output)
+        again = request(server, op="export", paths=["app/staging"], output=output)
+
+        assert response == {"id": None, "ok": True, "output": output, "changed": True}
+        assert again["changed"] is False
+        assert (tmp_path / "staging.env").read_text() == "API_KEY=staging"
+
+    @pytest.mark.parametrize(
+        "message, error",
+        [
+            ({"op": "get", "paths": ["app/missing"]}, "Pass entry 'app/missing' not found."),
+            ({"op": "get"}, "Request needs a non-empty list of entry paths in 'paths'"),
+            ({"op": "export", "paths": ["app/prod"], "format": "xml"}, "Unsupported format 'xml'"),
+            ({"op": "delete"}, "Unknown request: delete"),
+        ],
+    )
+    def test_errors(self, server, message, error):
+        response = request(server, id=3, **message)
+
+        assert response["id"] == 3
+        assert response["ok"] is False
+        assert response["error"].startswith(error)
+
+    @pytest.mark.parametrize("line", ["not json", "[1, 2]"])
+    def test_invalid_request(self, server, line):
+        response = json.loads(server.respond(line))
+
+        assert response["id"] is None
+        assert response["error"].startswith("Invalid request: ")
+
+    def test_serve_stdio_answers_as_requests_finish(self, server, backend):
+        lines = [
+            json.dumps({"id": "slow", "op": "get", "paths": ["slow"]}),
+            "",
+            json.dumps({"id": "fast", "op": "get", "paths": ["app/staging"]}),
+        ]
+        stdout = io.StringIO()
+
+        def release_after_fast():
+            # The slow request is only let through once the fast one was answered
+            while "fast" not in stdout.getvalue():
+                pass
+            backend.release.set()
+
+        threading.Thread(target=release_after_fast, daemon=True).start()
+        server.serve_stdio(io.StringIO("\n".join(lines) + "\n"), stdout)
+
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert [response["id"] for response in responses] == ["fast", "slow"]
+        assert responses[1]["variables"] == {"SLOW": "1"}
+
+    def test_serve_lines_bounds_requests_in_flight(self, backend):
+        server = Server(PassClient(use_agent=False, backend=backend), workers=2)
+        read = []
+
+        def lines():
+            for i in range(10):
+                read.append(i)
+                yield json.dumps({"id": i, "op": "get", "paths": ["slow"]})
+
+        responses = []
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            thread = threading.Thread(
+                target=server.serve_lines, args=(lines(), responses.append, executor)
+            )
+            thread.start()
+            while len(read) < 3:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            # Two requests wait on the gate, and the third line waits for one of them
+            assert len(read) == 3
+            backend.release.set()
+            thread.join(timeout=5)
+
+        assert sorted(json.loads(response)["id"] for response in responses) == list(range(10))
+
+    def test_serve_socket(self, server, tmp_path):
+        path = str(tmp_path / "serve.sock")
+        thread = threading.Thread(target=server.serve_socket, args=(path,), daemon=True)
+        thread.start()
+
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(b'{"id": 1, "op": "ping"}\n{"id": 2, "op": "list"}\n')
+            stream.flush()
+            responses = {
+                response["id"]: response
+                for response in (json.loads(stream.readline()) for _ in range(2))
+            }
+
+        assert responses[1] == {"id": 1, "ok": True}
+        assert responses[2]["entries"] == ["app/prod", "app/staging", "slow"]
+
+        with pytest.raises(RuntimeError, match="already listening"):
+            Server(server.pass_client).serve_socket(path)
+
+        server.shutdown()
+        thread.join(timeout=5)
+        assert not (tmp_path / "serve.sock").exists()
+
+    def test_serve_socket_keeps_other_files(self, server, tmp_path):
+        path = tmp_path / "important.txt"
+        path.write_text("keep me")
+
+        with pytest.raises(RuntimeError, match="is not a socket of yours"):
+            server.serve_socket(str(path))
+
+        assert path.read_text() == "keep me"
@@ -0,0 +1,150 @@
+import json
+import subprocess
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+from passenv import timings
+from passenv.timings import Tracer
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """Trace to stderr without registering an exit handler"""
+    tracer = Tracer("stderr")
+    monkeypatch.setattr(timings, "_tracer", tracer)
+    return tracer
+
+
+class TestTimings:
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.setattr(timings, "_tracer", None)
+
+        assert not timings.enabled()
+        assert timings.phase("fetch") is timings.phase("parse")
+
+    def test_phase(self, tracer):
+        with timings.phase("fetch"):
+            pass
+
+        record = tracer.records[-1]
+        assert record["type"] == "phase"
+        assert record["name"] == "fetch"
+        assert record["duration_ms"] >= 0
+        assert record["start_ms"] >= 0
+
+    def test_phase_records_on_error(self, tracer):
+        with pytest.raises(RuntimeError):
+            with timings.phase("fetch"):
+                raise RuntimeError("boom")
+
+        assert tracer.records[-1]["name"] == "fetch"
+
+    @patch("subprocess.run")
+    def test_run_records_subprocess(self, mock_run, tracer):
+        mock_run.return_value = Mock(returncode=0)
+
+        timings.run(["gpg", "--decrypt", "--passphrase", "hunter2", "a.gpg"], text=True)
+
+        mock_run.assert_called_once_with(
+            ["gpg", "--decrypt", "--passphrase", "hunter2", "a.gpg"], text=True
+        )
+        record = tracer.records[-1]
+        assert record["type"] == "subprocess"
+        assert record["argv"] == ["gpg", "--decrypt", "--passphrase", "***", "a.gpg"]
+        assert record["returncode"] == 0
+
+    @patch("subprocess.run")
+    def test_run_records_failed_subprocess(self, mock_run, tracer):
+        mock_run.side_effect = subprocess.CalledProcessError(1, ["pass", "show", "x"])
+
+        with pytest.raises(subprocess.CalledProcessError):
+            timings.run(["pass", "show", "x"], check=True)
+
+        assert tracer.records[-1]["returncode"] == 1
+
+    def test_redact_inline_value(self):
+        assert timings._redact(["gpg", "--passphrase=hunter2"]) == ["gpg", "--passphrase=***"]
+
+    def test_flush_stderr(self, tracer, capsys):
+        with timings.phase("parse"):
+            pass
+
+        tracer.flush()
+
+        err = capsys.readouterr().err
+        assert "[passenv]" in err
+        assert "parse" in err
+        assert tracer.records == []
+
+    def test_flush_json_lines(self, tracer, tmp_path):
+        tracer.target = str(tmp_path / "trace.jsonl")
+        with timings.phase("parse"):
+            pass
+
+        tracer.flush()
+        tracer.flush()
+
+        records = [json.loads(line) for line in open(tracer.target)]
+        assert "parse" in [record["name"] for record in records]
+        assert all("pid" in record for record in records)
+
+    def test_enable_from_environment(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(timings, "_tracer", None)
+        monkeypatch.setenv("PASSENV_TRACE", str(tmp_path / "trace.jsonl"))
+
+        with patch("atexit.register") as mock_register:
+            timings._enable_from_environment()
+
+        assert timings.enabled()
+        assert timings._tracer is not None
+        assert timings._tracer.target == str(tmp_path / "trace.jsonl")
+        mock_register.assert_called_once_with(timings._tracer.flush)
+
+    def test_trace_disabled_with_zero(self, monkeypatch):
+        monkeypatch.setattr(timings, "_tracer", None)
+        monkeypatch.setenv("PASSENV_TRACE", "0")
+
+        timings._enable_from_environment()
+
+        assert not timings.enabled()
+
+    def test_cli_timings_flag(self, monkeypatch, mock_pass_client, capsys):
+        monkeypatch.setattr(timings, "_tracer", None)
+        mock_pass_client.get_entries.return_value = ["API_KEY=secret\n"]
+
+        from passenv.cli import main
+
+        with patch("atexit.register"):
+            with patch.object(sys, "argv", ["passenv", "--timings", "load", "api/keys"]):
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+            assert exc_info.value.code == 0
+            assert timings._tracer is not None
+            timings._tracer.flush()
+
+        captured = capsys.readouterr()
+        assert 'export API_KEY="secret"' in captured.out
+        for name in ("import core", "command load", "fetch", "parse", "emit"):
+            assert name in captured.err
+
+    def test_cli_timings_flag_after_command(self, monkeypatch, mock_pass_client, capsys):
+        monkeypatch.setattr(timings, "_tracer", None)
+        mock_pass_client.get_entries.return_value = ["API_KEY=secret\n"]
+
+        from passenv.cli import main
+
+        for argv in (["load", "api/keys", "--timings"], ["export", "--timings", "api/keys"]):
+            with patch("atexit.register"):
+                with patch.object(sys, "argv", ["passenv", *argv]):
+                    with pytest.raises(SystemExit) as exc_info:
+                        main()
+                    assert "--timings" not in sys.argv
+                assert exc_info.value.code in (0, None)
+                assert timings._tracer is not None
+                timings._tracer.flush()
+
+            captured = capsys.readouterr()
+            assert "API_KEY" in captured.out
+            assert f"command {argv[0]}" in captured.err